@@ -1,37 +1,79 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-from models import db, Game, Player, Round, Score, ContractConfig
+from flask import (Blueprint, Flask, Response, current_app, make_response, render_template, request, redirect, url_for,
+                   jsonify, stream_with_context)
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from models import db, Game, MiserieParticipation, Player, Round, Score, ContractConfig, PlayerStanding
+from migrations import init_schema
+from sqlite_config import install_pragmas
+from metrics import Metrics
+from live import RETRY_MS, Broadcaster, MAX_STREAMS, StreamLimitReached
+from fragments import FragmentCache
+from scoring import (RoundRecord, CONTRACTS, MISERIE_CONTRACTS, score_round, record_from_round, compile_config,
+                     validate_round, get_contract_points, get_trick_limits)
+from importer import FORMATS, ScoreSheetError, detect_format, import_games
+from exporter import EXPORT_FORMATS, archived_game_ids, export_lines
+from archive import ArchiveError, archive_games, archived_games, restore_game
+from people import person_ids, player_key, suggest as suggest_people
+from round_log import (config_payload, game_events, log_event, replay, round_entered_seq, round_payload,
+                       stored_round_payload)
+from stats import (apply_round_change, person_keys, player_stats, rebuild as rebuild_stats, round_contribution,
+                   stored_round_contribution)
+from collections import Counter
+from datetime import date, datetime, timedelta
+import click
+import io
 import os
+import time
+
+# Routes and CLI commands; create_app() registers them on an app
+bp = Blueprint('main', __name__, cli_group=None)
 
-app = Flask(__name__)
 # Use an absolute path for the database file to avoid issues
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'wiezen.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-db.init_app(app)
 
-# Use an absolute path for the database file to avoid issues
-# Note: basedir is already defined above
-db_path = os.path.join(basedir, 'wiezen.db')
+def create_app(config=None):
+    """Build the Flask app; ``config`` overrides the defaults (e.g. for tests).
 
-def init_db():
-    with app.app_context():
-        db.create_all()
-        # Optional: Add initial data or logging here
+    Creating the app touches neither the database nor the filesystem. The
+    schema is created or migrated once by ``flask --app app init-db`` (or
+    ``init_db(app)``), not on import or per request.
+    """
+    flask_app = Flask(__name__)
+    # WAL keeps -wal/-shm files next to the database, so mount its directory (not just the file) in Docker
+    db_path = os.path.abspath(os.environ.get('WIEZEN_DB_PATH', os.path.join(basedir, 'wiezen.db')))
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    flask_app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    # Season archives of finished games (see archive.py); created on the first archive run
+    flask_app.config['ARCHIVE_DIR'] = os.path.abspath(
+        os.environ.get('WIEZEN_ARCHIVE_DIR', os.path.join(os.path.dirname(db_path), 'archive'))
+    )
+    # Open /game/<id>/live streams at most; each holds a thread unless served by a gevent worker (see live.py)
+    flask_app.config['LIVE_MAX_STREAMS'] = int(os.environ.get('WIEZEN_LIVE_MAX_STREAMS', MAX_STREAMS))
+    flask_app.config.update(config or {})
 
-# Ensure DB exists on startup
-if not os.path.exists(db_path):
-    init_db()
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        install_pragmas(db.engine)
+        Metrics().init_app(flask_app, db.engine)
+    Broadcaster().init_app(flask_app)
+    FragmentCache().init_app(flask_app)
+    flask_app.extensions['rules'] = {}
+    flask_app.register_blueprint(bp)
+    return flask_app
 
-@app.before_request
-def ensure_db_exists():
-    # Check if DB file was deleted while running
-    if not os.path.exists(db_path):
-        init_db()
+def init_db(flask_app):
+    """Create missing tables and apply pending migrations; returns the versions applied."""
+    with flask_app.app_context():
+        return init_schema()
 
-with app.app_context():
-    db.create_all()
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create the database or migrate it to the latest schema."""
+    applied = init_schema()
+    click.echo(f"Schema bijgewerkt naar versie {applied[-1]}." if applied else 'Schema is al up-to-date.')
 
 def get_contract_config(game_id):
     """Get contract config for game, with fallback to defaults for backwards compatibility."""
@@ -57,96 +99,342 @@ def get_contract_config(game_id):
         return DefaultConfig()
     return config
 
-def get_contract_points(config, contract_type, has_partner=False):
-    """Get points for a specific contract type."""
-    if contract_type == 'Vraag':
-        return config.vraag_partner_points if has_partner else config.vraag_solo_points
-    elif contract_type == 'Troel':
-        return config.troel_points
-    elif contract_type == 'Abondance':
-        return config.abondance_points
-    elif contract_type == 'Solo':
-        return config.solo_points
-    elif contract_type == 'Miserie':
-        return config.miserie_points
-    elif contract_type == 'Grote Miserie':
-        return config.grote_miserie_points
-    return 0
-
-def get_trick_limits(config, contract_type, result, has_partner=False):
-    """Get trick limits for a specific contract type and result."""
-    if contract_type == 'Vraag':
-        if has_partner:
-            return config.vraag_partner_tricks_won_max if result == 'Gewonnen' else config.vraag_partner_tricks_lost_max
-        else:
-            return config.vraag_solo_tricks_won_max if result == 'Gewonnen' else config.vraag_solo_tricks_lost_max
-    elif contract_type == 'Troel':
-        return config.troel_tricks_won_max if result == 'Gewonnen' else config.troel_tricks_lost_max
-    elif contract_type == 'Abondance':
-        return config.abondance_tricks_won_max if result == 'Gewonnen' else config.abondance_tricks_lost_max
-    return 0
-
-@app.route('/')
-def index():
-    # Check if there is an active game
-    active_game = Game.query.filter_by(is_active=True).first()
+# Compiled rule tables per game id, one dict per app in ``extensions['rules']``.
+# ContractConfig rows are written before a game is played and rarely
+# afterwards, so entries live until a config write. ORM writes drop them
+# below; Core writes (import, archive restore) drop their games themselves.
+def get_rules(game_id):
+    """Return the compiled rule table for a game, querying the config only on a cache miss."""
+    cache = current_app.extensions['rules']
+    rules = cache.get(game_id)
+    if rules is None:
+        rules = cache[game_id] = compile_config(get_contract_config(game_id))
+    return rules
+
+@event.listens_for(ContractConfig, 'after_insert')
+@event.listens_for(ContractConfig, 'after_update')
+@event.listens_for(ContractConfig, 'after_delete')
+def _invalidate_config_rules(mapper, connection, target):
+    current_app.extensions['rules'].pop(target.game_id, None)
+
+def get_current_totals(player_ids):
+    """Return ``{player_id: current_total}`` from the standings table (primary-key reads)."""
+    totals = {pid: 0 for pid in player_ids}
+    rows = db.session.query(PlayerStanding.player_id, PlayerStanding.total).filter(
+        PlayerStanding.player_id.in_(player_ids)
+    )
+    for player_id, total in rows:
+        totals[player_id] = total
+    return totals
+
+def apply_standing_changes(score_changes):
+    """Add ``{player_id: points_change}`` to the standings; commit is left to the caller."""
+    if not score_changes:
+        return
+    stmt = sqlite_insert(PlayerStanding)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[PlayerStanding.player_id],
+            set_={'total': PlayerStanding.total + stmt.excluded.total}
+        ),
+        [{'player_id': pid, 'total': change} for pid, change in score_changes.items()]
+    )
+
+def set_standings(totals):
+    """Overwrite the standings with ``{player_id: total}``; commit is left to the caller."""
+    if not totals:
+        return
+    stmt = sqlite_insert(PlayerStanding)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[PlayerStanding.player_id],
+            set_={'total': stmt.excluded.total}
+        ),
+        [{'player_id': pid, 'total': total} for pid, total in totals.items()]
+    )
+
+def bump_version(game_id):
+    """Mark a round change of ``game_id``; commit is left to the caller."""
+    db.session.execute(
+        db.update(Game).where(Game.id == game_id).values(version=Game.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+# Tags from before a restart (possibly with other templates) never match
+_ETAG_EPOCH = format(time.time_ns(), 'x')
+
+def game_etag(game, *parts):
+    """Strong ETag of a response that only changes with the game's rounds."""
+    return '-'.join(str(part) for part in (_ETAG_EPOCH, game.id, game.version) + parts)
+
+def conditional(etag, build):
+    """Answer ``If-None-Match: <etag>`` with 304 before ``build()`` runs its queries.
+
+    Other requests get ``build()``'s response, tagged when successful.
+    ``no-cache`` makes browsers revalidate instead of guessing freshness.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def parse_player_id(value):
+    """Convert a player id from a form field to an int (empty means no player)."""
+    return int(value) if value else None
+
+# Rounds rendered with the scoreboard; older pages are fetched on scroll
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+def get_history_page(game_id, players, before=None, limit=HISTORY_PAGE_SIZE):
+    """Rounds of a game newest first, keyset-paginated on ``round_number``.
+
+    Returns ``(rounds, next_before)``; pass ``next_before`` back as ``before``
+    for the next (older) page, it is None on the last page. Every round dict
+    has its rendered row in ``html``; unchanged rows come from the fragment
+    cache without querying their scores or rendering them again. The dicts
+    may be shared with the cache: do not modify them.
+    """
+    # Only the keys of the page; full rounds are loaded for uncached rows
+    query = db.session.query(Round.id, Round.version, Round.round_number).filter(Round.game_id == game_id)
+    if before is not None:
+        query = query.filter(Round.round_number < before)
+    page = query.order_by(Round.round_number.desc()).limit(limit + 1).all()
+    next_before = page[limit - 1].round_number if len(page) > limit else None
+    page = page[:limit]
+
+    fragments = current_app.extensions['fragments']
+    cached = {r.id: fragments.get(r.id, r.version) for r in page}
+    missing = [r.id for r in page if cached[r.id] is None]
+
+    # Rounds and score changes of the uncached rows in two queries, instead of lazy-loading r.scores per round
+    round_scores = {}
+    if missing:
+        missing = Round.query.filter(Round.id.in_(missing)).all()
+        score_rows = db.session.query(Score.round_id, Score.player_id, Score.points_change).filter(
+            Score.round_id.in_([r.id for r in missing])
+        )
+        for round_id, player_id, points_change in score_rows:
+            round_scores.setdefault(round_id, {})[player_id] = points_change
+
+    num_players = len(players)
+    for r in missing:
+        # Calculate dealer for this round
+        round_dealer_index = (r.round_number - 1) % num_players
+        round_dealer_id = players[round_dealer_index].id # Assuming players order is static/sorted by ID
+        round_sitter_id = round_dealer_id if num_players == 5 else None
+        row = {
+            'id': r.id,
+            'round_number': r.round_number,
+            'contract_type': r.contract_type,
+            'result': r.result,
+            'tricks': r.tricks,
+            'trump_suit': r.trump_suit,
+            'scores': round_scores.get(r.id, {}),
+            'dealer_id': round_dealer_id,
+            'sitter_id': round_sitter_id
+        }
+        row['html'] = render_template('_round_row.html', round=row, players=players)
+        fragments.put(r.id, r.version, row)
+        cached[r.id] = row
+    return [cached[r.id] for r in page], next_before
+
+def get_table(game_id=None):
+    """The active game at table ``game_id``; without an id, the most recently started one.
+
+    The un-prefixed routes (``/``, ``/round/add``, ...) act on that latest table,
+    so single-table setups and old bookmarks keep working.
+    """
+    query = Game.query.filter_by(is_active=True)
+    if game_id is not None:
+        query = query.filter_by(id=game_id)
+    return query.order_by(Game.id.desc()).first()
+
+def table_url(game):
+    return url_for('main.index', game_id=game.id)
+
+def next_dealer(game_id, players):
+    """``(dealer_id, sitter_id)`` of the next round; in a 5-player game the dealer sits out."""
+    last_round_number = db.session.query(db.func.max(Round.round_number)).filter(
+        Round.game_id == game_id
+    ).scalar() or 0
+    dealer_id = players[last_round_number % len(players)].id
+    return dealer_id, dealer_id if len(players) == 5 else None
+
+def wants_json():
+    """True when the client asked for a JSON reply (``Accept: application/json``) instead of a redirect."""
+    return request.accept_mimetypes.best == 'application/json'
+
+def round_change(game, round_obj=None, removed=None):
+    """What a committed round mutation changed: new totals, next dealer/sitter and the round itself.
+
+    ``round_obj`` is an added or updated round, returned with its per-player
+    deltas and rendered history row; ``removed`` is ``[(round_id, round_number)]``
+    of deleted ones, lowest first. Their ids are returned as ``round_ids``, and
+    the first one as ``round_id`` and ``round_number``.
+    """
+    players = sorted(game.players, key=lambda p: p.id)
+    dealer_id, sitter_id = next_dealer(game.id, players)
+    data = {
+        'totals': get_current_totals([p.id for p in players]),
+        'dealer_id': dealer_id,
+        'sitter_id': sitter_id,
+    }
+    if round_obj is not None:
+        row = get_history_page(game.id, players, before=round_obj.round_number + 1, limit=1)[0][0]
+        data['round'] = {
+            'id': row['id'],
+            'round_number': row['round_number'],
+            'scores': row['scores'],
+            'html': row['html'],
+        }
+    if removed:
+        data['round_id'], data['round_number'] = removed[0]
+        data['round_ids'] = [round_id for round_id, _ in removed]
+    return data
+
+def finish_round_change(game, event_name, round_obj=None, removed=None):
+    """Push a committed change to the game's live streams and answer the request.
+
+    JSON clients get the change itself (plus the ``event_id`` their own
+    stream will echo); form posts are redirected to the table.
+    """
+    live = current_app.extensions['live']
+    if wants_json():
+        data = round_change(game, round_obj, removed)
+        data['event_id'] = live.publish(game.id, event_name, lambda: data)
+        return jsonify(data)
+    live.publish(game.id, event_name, lambda: round_change(game, round_obj, removed))
+    return redirect(table_url(game))
+
+def round_not_found():
+    if wants_json():
+        return jsonify({'error': 'Error: Tafel of ronde niet gevonden.'}), 404
+    return redirect(url_for('main.index'))
+
+@bp.route('/tables')
+def tables():
+    """Lobby: every active table plus the form to start a new one."""
+    active_games = Game.query.filter_by(is_active=True).order_by(Game.id).all()
+    players = Player.query.filter(Player.game_id.in_([g.id for g in active_games])).order_by(Player.id)
+    names = {}
+    for player in players:
+        names.setdefault(player.game_id, []).append(player.name)
+    return render_template('setup.html', tables=[(g, names.get(g.id, [])) for g in active_games])
+
+@bp.route('/')
+@bp.route('/table/<int:game_id>')
+def index(game_id=None):
+    # With several tables running, the bare URL shows the lobby
+    if game_id is None and Game.query.filter_by(is_active=True).limit(2).count() > 1:
+        return tables()
+    active_game = get_table(game_id)
+    if game_id is not None and not active_game:
+        return redirect(url_for('main.index'))
     if active_game:
-        players = sorted(active_game.players, key=lambda p: p.id)
-        
-        # Safety check: if no players, redirect to setup
-        if not players:
-            active_game.is_active = False
-            db.session.commit()
-            return render_template('setup.html')
-        
-        # Get latest scores for each player
-        current_scores = {}
-        for player in players:
-            last_score = Score.query.filter_by(player_id=player.id).order_by(Score.id.desc()).first()
-            current_scores[player.id] = last_score.current_total if last_score else 0
-        
-        # Prepare history and current dealer
-        raw_rounds = Round.query.filter_by(game_id=active_game.id).order_by(Round.id.desc()).all()
-        history = []
-        
-        # Calculate current dealer (based on next round number)
-        num_players = len(players)
-        next_round_num = len(active_game.rounds) + 1
-        current_dealer_index = (next_round_num - 1) % num_players
-        current_dealer_id = players[current_dealer_index].id
-        
-        # In 5-player game, dealer sits out
-        current_sitter_id = current_dealer_id if num_players == 5 else None
-        
-        for r in raw_rounds:
-            # Calculate dealer for this round
-            round_dealer_index = (r.round_number - 1) % num_players
-            round_dealer_id = players[round_dealer_index].id # Assuming players order is static/sorted by ID
-            round_sitter_id = round_dealer_id if num_players == 5 else None
-            
-            
-            round_data = {
-                'id': r.id,
-                'round_number': r.round_number,
-                'contract_type': r.contract_type,
-                'result': r.result,
-                'tricks': r.tricks,
-                'trump_suit': r.trump_suit,
-                'scores': {},
-                'dealer_id': round_dealer_id,
-                'sitter_id': round_sitter_id
-            }
-            # Efficiently map scores for this round
-            for s in r.scores:
-                round_data['scores'][s.player_id] = s.points_change
-            history.append(round_data)
-
-        return render_template('index.html', game=active_game, players=players, scores=current_scores, rounds=history, current_dealer_id=current_dealer_id, current_sitter_id=current_sitter_id)
+        # Read before the queries: the stream replays anything committed after this
+        last_event_id = current_app.extensions['live'].last_id(active_game.id)
+        # An unchanged scoreboard is answered with 304 before any player or score query
+        return conditional(game_etag(active_game, last_event_id), lambda: scoreboard(active_game, last_event_id))
     
     return render_template('setup.html')
 
-@app.route('/game/start', methods=['POST'])
-@app.route('/game/start', methods=['POST'])
+def scoreboard(active_game, last_event_id):
+    """Render the scoreboard of a table."""
+    players = sorted(active_game.players, key=lambda p: p.id)
+    
+    # Safety check: if no players, redirect to setup
+    if not players:
+        active_game.is_active = False
+        db.session.commit()
+        return render_template('setup.html')
+    
+    # Totals and the latest page of history come from a fixed number of queries
+    current_scores = get_current_totals([p.id for p in players])
+    history, next_before = get_history_page(active_game.id, players)
+    
+    # Current dealer (based on next round number); in 5-player game, dealer sits out
+    current_dealer_id, current_sitter_id = next_dealer(active_game.id, players)
+
+    return render_template('index.html', game=active_game, players=players, scores=current_scores, rounds=history, next_before=next_before, current_dealer_id=current_dealer_id, current_sitter_id=current_sitter_id, last_event_id=last_event_id, live_retry_ms=RETRY_MS)
+
+@bp.route('/game/<int:game_id>/rounds')
+def round_history(game_id):
+    """JSON page of older history rows: ``?before=<round_number>&limit=<n>``."""
+    game = db.get_or_404(Game, game_id)
+    try:
+        before = request.args.get('before', type=int)
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Error: Ongeldige limiet.'}), 400
+
+    def page():
+        players = sorted(game.players, key=lambda p: p.id)
+        history, next_before = get_history_page(game.id, players, before, limit)
+        return jsonify({'rounds': history, 'next_before': next_before})
+    return conditional(game_etag(game, 'rounds'), page)
+
+@bp.route('/game/<int:game_id>/live')
+def live_scoreboard(game_id):
+    """Server-Sent Events stream of a game's round changes (see ``live.py``)."""
+    db.get_or_404(Game, game_id)
+    # EventSource sends Last-Event-ID when it reconnects; the page passes its first cursor
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+    try:
+        stream = current_app.extensions['live'].stream(game_id, last_event_id)
+    except StreamLimitReached:
+        # EventSource reconnects after its retry delay
+        return Response('Error: Te veel live verbindingen.', 503, {'Retry-After': str(RETRY_MS // 1000)})
+    # The stream outlives the request: give the database connection back now
+    db.session.remove()
+    return Response(
+        stream,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@bp.route('/game/<int:game_id>/events')
+def round_events(game_id):
+    """The game's event log, oldest first; page with ``after`` (the last ``seq`` seen)."""
+    game = db.get_or_404(Game, game_id)
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', MAX_HISTORY_PAGE_SIZE, type=int), MAX_HISTORY_PAGE_SIZE)
+    return conditional(game_etag(game, 'events'), lambda: jsonify({'events': game_events(game_id, after, limit)}))
+
+@bp.route('/game/<int:game_id>/standings')
+def standings_as_of(game_id):
+    """Totals as the game stood after event ``event``, or right after round ``round`` was entered.
+
+    Replays from the nearest snapshot; without either parameter, the latest.
+    """
+    not_found = {'error': 'Error: Tafel of ronde niet gevonden.'}
+    game = db.session.get(Game, game_id)
+    if game is None:
+        return jsonify(not_found), 404
+
+    def standings():
+        seq = request.args.get('event', type=int)
+        if 'round' in request.args:
+            seq = round_entered_seq(game_id, request.args.get('round', type=int))
+            if seq is None:
+                return jsonify(not_found), 404
+        state = replay(game_id, seq)
+        if not state.seq:
+            return jsonify(not_found), 404
+        return jsonify({'event': state.seq, 'rounds': state.rounds, 'totals': state.totals})
+    return conditional(game_etag(game, 'standings'), standings)
+
+@bp.route('/game/start', methods=['POST'])
+@bp.route('/game/start', methods=['POST'])
 def start_game():
     player_names = [name for name in request.form.getlist('player_name') if name.strip()]
     if not player_names:
@@ -155,11 +443,7 @@ def start_game():
     if len(player_names) < 4 or len(player_names) > 5:
         return "Error: 4 or 5 players are required", 400
     
-    # Deactivate any existing active games
-    active_games = Game.query.filter_by(is_active=True).all()
-    for g in active_games:
-        g.is_active = False
-    
+    # Other tables keep playing; every game is its own table
     new_game = Game()
     db.session.add(new_game)
     db.session.commit()
@@ -196,8 +480,9 @@ def start_game():
     db.session.add(game_config)
     db.session.commit()
     
+    people = person_ids(player_names)
     for name in player_names:
-        player = Player(name=name, game_id=new_game.id)
+        player = Player(name=name, game_id=new_game.id, person_id=people[player_key(name)])
         db.session.add(player)
         db.session.commit() # Commit each to get ID
         
@@ -207,13 +492,20 @@ def start_game():
         # Actually, let's just use 0 as base and no specific round entry needed for init if we handle it in logic
         # But for consistency, let's just say we don't add a score entry yet, 0 is implied.
     
-    return redirect(url_for('index'))
+    # Every player starts at 0 in the standings
+    set_standings({p.id: 0 for p in new_game.players})
+    log_event(new_game.id, 'config_applied', config_payload(game_config, sorted(p.id for p in new_game.players)))
+    db.session.commit()
+    
+    return redirect(table_url(new_game))
 
-@app.route('/round/add', methods=['POST'])
-def add_round():
-    active_game = Game.query.filter_by(is_active=True).first()
+@bp.route('/round/add', methods=['POST'])
+@bp.route('/table/<int:game_id>/round/add', methods=['POST'])
+def add_round(game_id=None):
+    """Add a round; with ``Accept: application/json`` the reply is the change instead of a redirect."""
+    active_game = get_table(game_id)
     if not active_game:
-        return redirect(url_for('index'))
+        return round_not_found()
 
     # Helper to find player by name or ID from form
     # Assuming form sends player IDs
@@ -227,50 +519,46 @@ def add_round():
     # Basic Wiezen scoring rules (simplified for now, can be expanded)
     # This is a placeholder for the actual complex logic of Wiezen
     
-    # Validation: Partner cannot be Main Player
-    if partner_id and partner_id == main_player_id:
-        return "Error: Speler en partner mogen niet dezelfde persoon zijn.", 400
-    # Get contract configuration for this game
-    config = get_contract_config(active_game.id)
-    has_partner = bool(partner_id)
-    
-    # Validation: Extra Tricks Limit (using configurable limits)
-    if contract in ['Vraag', 'Troel']:
-        limit = get_trick_limits(config, contract, result, has_partner)
-        if tricks > limit:
-             return f"Error: Maximaal {limit} extra slagen bij {contract} ({result}).", 400
-    
-    if contract == 'Abondance':
-        limit = get_trick_limits(config, contract, result)
-        if tricks > limit:
-            return f"Error: Maximaal {limit} extra slagen bij Abondance ({result}).", 400
-
-    if contract in ['Miserie', 'Grote Miserie', 'Solo'] and tricks > 0:
-        return f"Error: Geen extra slagen toegestaan bij {contract}.", 400
-    
-    # Validation: Troel must have a partner
-    if contract == 'Troel' and not partner_id:
-        return "Error: Bij Troel moet er altijd een partner gekozen worden.", 400
-
-    # Validation: Trump is mandatory for non-Miserie contracts
-    # Trump is fetched later, so get it here or move fetch up.
+    # Validation rules are shared with the bulk importer
     trump_suit = request.form.get('trump_suit')
-    if contract in ['Vraag', 'Troel', 'Abondance', 'Solo'] and not trump_suit:
-        return "Error: Kies een troefkleur (Harten, Ruiten, Klaveren of Schoppen).", 400
+    error = validate_round(get_rules(active_game.id), contract, result, tricks, main_player_id, partner_id, trump_suit)
+    if error:
+        return (jsonify({'error': error}), 400) if wants_json() else (error, 400)
 
-    # Get base points from configuration (supports Vraag with/without partner)
-    base_points = get_contract_points(config, contract, has_partner)
-    
-    points = base_points + tricks # Simplified
-    
     # Determine sitter (dealer of this round)
     players = active_game.players
     num_players = len(players)
-    new_round_num = len(active_game.rounds) + 1
+    # Indexed (game_id, round_number) lookup instead of loading every round of the table
+    new_round_num = (db.session.query(db.func.max(Round.round_number)).filter(
+        Round.game_id == active_game.id
+    ).scalar() or 0) + 1
     round_dealer_index = (new_round_num - 1) % num_players
     round_dealer_id = players[round_dealer_index].id
     sitter_id = round_dealer_id if num_players == 5 else None
 
+    # Collect Miserie participants
+    # Expecting input name="miserie_play_{player.id}" (checkbox)
+    # and name="miserie_result_{player.id}" (value 'Gewonnen' or 'Verloren')
+    miserie = None
+    if contract in MISERIE_CONTRACTS:
+        miserie = {}
+        for player in players:
+            if player.id != sitter_id and request.form.get(f'miserie_play_{player.id}'):
+                # Without a result the participant scores as lost; store it that way
+                miserie[player.id] = request.form.get(f'miserie_result_{player.id}') or 'Verloren'
+
+    # Calculate scores in memory before touching the database
+    record = RoundRecord(
+        contract=contract,
+        result=result,
+        tricks=tricks,
+        main_player_id=parse_player_id(main_player_id),
+        partner_id=parse_player_id(partner_id),
+        sitter_id=sitter_id,
+        miserie=miserie
+    )
+    score_changes = score_round(record, get_rules(active_game.id), [p.id for p in players])
+
     # Create new round
     trump_suit = request.form.get('trump_suit') if contract in ['Vraag', 'Abondance', 'Troel', 'Solo'] else None
     
@@ -284,112 +572,34 @@ def add_round():
         partner_id=partner_id if partner_id else None,
         result=result,
         trump_suit=trump_suit,
-        tricks=tricks
+        tricks=tricks,
+        # Store participant data in round for recalculation
+        miserie_participations=[
+            MiserieParticipation(player_id=pid, result=r) for pid, r in (miserie or {}).items()
+        ]
     )
     db.session.add(new_round)
-    db.session.commit()
-    
-    # Calculate scores for each player
-    num_players = len(players)
-    
-    # Determine sitter (dealer of this round)
-    # round_number is already active_game.rounds length + 1, so new_round.round_number
-    round_dealer_index = (new_round.round_number - 1) % num_players
-    round_dealer_id = players[round_dealer_index].id
-    sitter_id = round_dealer_id if num_players == 5 else None
+    db.session.flush()
 
-    total_change = points if result == 'Gewonnen' else -points
-    
-    # Calculate scores
-    score_changes = {p.id: 0 for p in players}
-
-    if contract in ['Miserie', 'Grote Miserie']:
-        # Use configurable base value
-        base_val = get_contract_points(config, contract)
-        
-        # Store participant data for future recalculation
-        participants_data = {}
-        
-        # Check for each player if they played
-        for player in players:
-            if player.id == sitter_id:
-                continue
-                
-            # Check form for this player's involvement
-            # Expecting input name="miserie_play_{player.id}" (checkbox)
-            # and name="miserie_result_{player.id}" (value 'Gewonnen' or 'Verloren')
-            if request.form.get(f'miserie_play_{player.id}'):
-                p_result = request.form.get(f'miserie_result_{player.id}')
-                participants_data[str(player.id)] = p_result
-                
-                p_points = base_val # Fixed points for Miserie
-                
-                if p_result == 'Gewonnen':
-                    # Player wins: receives base_val from each opponent
-                    # Opponents count = num_active_players - 1
-                    num_active = num_players - (1 if sitter_id else 0)
-                    win_amount = p_points * (num_active - 1)
-                    
-                    score_changes[player.id] += win_amount
-                    # Each opponent loses p_points
-                    for opponent in players:
-                        if opponent.id != player.id and opponent.id != sitter_id:
-                            score_changes[opponent.id] -= p_points
-                else: # lost
-                    # Player loses: pays base_val to each opponent
-                    num_active = num_players - (1 if sitter_id else 0)
-                    loss_amount = p_points * (num_active - 1)
-                    
-                    score_changes[player.id] -= loss_amount
-                    # Each opponent wins p_points
-                    for opponent in players:
-                        if opponent.id != player.id and opponent.id != sitter_id:
-                            score_changes[opponent.id] += p_points
-        
-        # Store participant data in round for recalculation
-        import json
-        new_round.miserie_participants = json.dumps(participants_data)
-        db.session.commit()
-
-    else: # Standard contracts
-        for player in players:
-            change = 0
-            is_sitter = (player.id == sitter_id)
-            
-            if is_sitter:
-                change = 0 # Sitter doesn't play
-            else:
-                is_main = str(player.id) == main_player_id
-                is_partner = str(player.id) == partner_id if partner_id else False
-
-                if partner_id: 
-                    if is_main or is_partner:
-                        change = total_change # Winners get points
-                    else:
-                        change = -total_change # Losers lose points
-                else: # 1 vs 3
-                    if is_main:
-                        change = total_change * 3 # Winner gets from all 3
-                    else:
-                        change = -total_change # Losers pay winner
-            score_changes[player.id] = change
-
-    for player in players:
-        change = score_changes[player.id]
-        last_score = Score.query.filter_by(player_id=player.id).order_by(Score.id.desc()).first()
-        current_total = (last_score.current_total if last_score else 0) + change
-        
-        new_score = Score(
-            round_id=new_round.id,
-            player_id=player.id,
-            points_change=change,
-            current_total=current_total
-        )
-        db.session.add(new_score)
-        
+    totals = get_current_totals(list(score_changes))
+    db.session.execute(db.insert(Score), [
+        {
+            'round_id': new_round.id,
+            'player_id': player_id,
+            'points_change': change,
+            'current_total': totals[player_id] + change
+        }
+        for player_id, change in score_changes.items()
+    ])
+    apply_standing_changes(score_changes)
+    apply_round_change(None, round_contribution(record, trump_suit, score_changes, person_keys(players)))
+    log_event(active_game.id, 'round_added', {
+        'round': round_payload(new_round.id, new_round_num, record, trump_suit, round_dealer_id)
+    })
+    bump_version(active_game.id)
     db.session.commit()
     
-    return redirect(url_for('index'))
+    return finish_round_change(active_game, 'round_added', new_round)
 
 def recalculate_scores_from_round(game_id, start_round_number=1):
     """
@@ -403,13 +613,17 @@ def recalculate_scores_from_round(game_id, start_round_number=1):
     players = sorted(game.players, key=lambda p: p.id)
     
     # Delete all scores for rounds >= start_round_number
-    rounds_to_recalc = Round.query.filter(
+    rounds_query = Round.query.filter(
         Round.game_id == game_id,
         Round.round_number >= start_round_number
+    )
+    # Miserie participations of all these rounds in one query, not one per round
+    rounds_to_recalc = rounds_query.options(
+        selectinload(Round.miserie_participations)
     ).order_by(Round.round_number).all()
-    
-    for round_obj in rounds_to_recalc:
-        Score.query.filter_by(round_id=round_obj.id).delete()
+    Score.query.filter(
+        Score.round_id.in_(rounds_query.with_entities(Round.id))
+    ).delete(synchronize_session=False)
     
     # Get baseline scores from previous round
     baseline_scores = {}
@@ -427,182 +641,231 @@ def recalculate_scores_from_round(game_id, start_round_number=1):
         if player.id not in baseline_scores:
             baseline_scores[player.id] = 0
     
-    # Recalculate scores for each round
+    # Recalculate scores for each round and write them in one bulk insert
+    rules = get_rules(game_id)
+    score_rows = []
     for round_obj in rounds_to_recalc:
-        calculate_and_save_scores(round_obj, players, baseline_scores)
+        score_rows.extend(calculate_round_scores(round_obj, players, baseline_scores, rules))
+    if score_rows:
+        db.session.execute(db.insert(Score), score_rows)
     
+    # The rewritten totals show in the history rows of these rounds
+    rounds_query.update({Round.version: Round.version + 1}, synchronize_session=False)
+
+    # baseline_scores now holds the totals after the last round
+    set_standings(baseline_scores)
     db.session.commit()
+    current_app.extensions['fragments'].invalidate([r.id for r in rounds_to_recalc])
 
-def calculate_and_save_scores(round_obj, players, baseline_scores):
-    """Calculate and save scores for a specific round."""
-    num_players = len(players)
-    sitter_id = round_obj.sitter_id
-    
-    # Calculate score changes based on contract type
-    score_changes = {p.id: 0 for p in players}
-    
-    contract = round_obj.contract_type
-    result = round_obj.result
-    tricks = round_obj.tricks or 0
-    main_player_id = str(round_obj.main_player_id) if round_obj.main_player_id else None
-    partner_id = str(round_obj.partner_id) if round_obj.partner_id else None
-    
-    # Get contract configuration for this game
-    config = get_contract_config(round_obj.game_id)
-    has_partner = bool(partner_id)
-    
-    # Calculate base points using configuration
-    base_points = get_contract_points(config, contract, has_partner)
-    
-    points = base_points + tricks
-    total_change = points if result == 'Gewonnen' else -points
-    
-    if contract in ['Miserie', 'Grote Miserie']:
-        # Use stored participant data if available
-        if round_obj.miserie_participants:
-            import json
-            participants_data = json.loads(round_obj.miserie_participants)
-            # Use configurable points for Miserie
-            base_val = get_contract_points(config, contract)
-            
-            # Recalculate scores based on stored participant data
-            for player_id_str, p_result in participants_data.items():
-                player_id = int(player_id_str)
-                p_points = base_val
-                
-                if p_result == 'Gewonnen':
-                    # Player wins: receives base_val from each opponent
-                    num_active = num_players - (1 if sitter_id else 0)
-                    win_amount = p_points * (num_active - 1)
-                    
-                    score_changes[player_id] += win_amount
-                    # Each opponent loses p_points
-                    for player in players:
-                        if player.id != player_id and player.id != sitter_id:
-                            score_changes[player.id] -= p_points
-                else:  # Verloren
-                    # Player loses: pays base_val to each opponent
-                    num_active = num_players - (1 if sitter_id else 0)
-                    loss_amount = p_points * (num_active - 1)
-                    
-                    score_changes[player_id] -= loss_amount
-                    # Each opponent wins p_points
-                    for player in players:
-                        if player.id != player_id and player.id != sitter_id:
-                            score_changes[player.id] += p_points
-        else:
-            # Fallback for old rounds without participant data
-            # Set all scores to 0 - cannot recalculate without data
-            pass
-    else:
-        for player in players:
-            change = 0
-            is_sitter = (player.id == sitter_id)
-            
-            if is_sitter:
-                change = 0
-            else:
-                is_main = str(player.id) == main_player_id
-                is_partner = str(player.id) == partner_id if partner_id else False
-                
-                if partner_id:
-                    if is_main or is_partner:
-                        change = total_change
-                    else:
-                        change = -total_change
-                else:  # 1 vs 3
-                    if is_main:
-                        change = total_change * 3
-                    else:
-                        change = -total_change
-            score_changes[player.id] = change
-    
-    # Save scores
+def calculate_round_scores(round_obj, players, baseline_scores, rules):
+    """Calculate score rows for a specific round, advancing ``baseline_scores`` in place.
+
+    Old Miserie rounds without participant data score 0 for everyone.
+    """
+    score_changes = score_round(record_from_round(round_obj), rules, [p.id for p in players])
+    
+    score_rows = []
     for player in players:
         change = score_changes[player.id]
         current_total = baseline_scores.get(player.id, 0) + change
-        
-        new_score = Score(
-            round_id=round_obj.id,
-            player_id=player.id,
-            points_change=change,
-            current_total=current_total
-        )
-        db.session.add(new_score)
+        score_rows.append({
+            'round_id': round_obj.id,
+            'player_id': player.id,
+            'points_change': change,
+            'current_total': current_total
+        })
         baseline_scores[player.id] = current_total
+    return score_rows
 
-@app.route('/round/undo', methods=['POST'])
-def undo_round():
-    """Undo (delete) the last round."""
-    active_game = Game.query.filter_by(is_active=True).first()
-    if not active_game:
-        return redirect(url_for('index'))
-    
-    # Get the last round
-    last_round = Round.query.filter_by(game_id=active_game.id).order_by(Round.round_number.desc()).first()
-    if not last_round:
-        return redirect(url_for('index'))
-    
-    # Delete scores for this round
-    Score.query.filter_by(round_id=last_round.id).delete()
-    
-    # Delete the round
-    db.session.delete(last_round)
-    db.session.commit()
-    
-    return redirect(url_for('index'))
+def shift_totals_after_round(game_id, round_number, total_shifts, until=None):
+    """Add ``{player_id: delta}`` to every running total after ``round_number`` (and before round ``until``).
 
-@app.route('/round/delete/<int:round_id>', methods=['POST'])
-def delete_round(round_id):
-    """Delete a specific round and recalculate all subsequent scores."""
-    round_obj = Round.query.get(round_id)
-    if not round_obj:
-        return redirect(url_for('index'))
-    
-    active_game = Game.query.filter_by(is_active=True).first()
-    if not active_game or round_obj.game_id != active_game.id:
-        return redirect(url_for('index'))
-    
-    deleted_round_number = round_obj.round_number
+    One set-based UPDATE per player; later rounds' own points do not change.
+    """
+    later_rounds = db.select(Round.id).where(
+        Round.game_id == game_id,
+        Round.round_number > round_number
+    )
+    if until is not None:
+        later_rounds = later_rounds.where(Round.round_number < until)
+    for player_id, delta in total_shifts.items():
+        if delta:
+            db.session.execute(
+                db.update(Score).where(
+                    Score.player_id == player_id,
+                    Score.round_id.in_(later_rounds)
+                ).values(current_total=Score.current_total + delta),
+                execution_options={'synchronize_session': False}
+            )
+
+def rescore_round_incrementally(round_obj, players, previous_stats):
+    """Rewrite the scores of one edited round and shift later running totals.
+
+    ``previous_stats`` is the round's statistics contribution before the
+    edit. An edit cannot change the rotation: the dealer and sitter are
+    stored with the round and the form does not touch them, so later rounds
+    keep their own points. Falls back to a full replay from this round only
+    when the round's stored scores are incomplete.
+    """
+    old_scores = {s.player_id: s for s in Score.query.filter_by(round_id=round_obj.id)}
+    rules = get_rules(round_obj.game_id)
+    new_changes = score_round(record_from_round(round_obj), rules, [p.id for p in players])
+    apply_round_change(previous_stats, stored_round_contribution(round_obj, new_changes, players))
+    if set(old_scores) != {p.id for p in players}:
+        # The replay commits the edit and the statistics with it
+        recalculate_scores_from_round(round_obj.game_id, round_obj.round_number)
+        return
     
-    # Delete scores for this round
-    Score.query.filter_by(round_id=round_obj.id).delete()
+    differences = {}
+    for player_id, score in old_scores.items():
+        difference = new_changes[player_id] - score.points_change
+        if difference:
+            score.points_change = new_changes[player_id]
+            score.current_total += difference
+            differences[player_id] = difference
     
-    # Delete the round
-    db.session.delete(round_obj)
+    shift_totals_after_round(round_obj.game_id, round_obj.round_number, differences)
+    apply_standing_changes(differences)
     db.session.commit()
-    
-    # Renumber subsequent rounds
-    subsequent_rounds = Round.query.filter(
-        Round.game_id == active_game.id,
-        Round.round_number > deleted_round_number
+
+def remove_rounds(game, round_ids):
+    """Delete rounds of ``game`` in one transaction and commit; returns ``[(round_id, round_number)]``.
+
+    Later rounds keep their own points: each stretch between deleted rounds
+    has its running totals shifted by what was deleted before it, and all
+    later rounds are renumbered with one set-based UPDATE. When a deleted
+    round's scores are incomplete the game is instead recalculated once, from
+    the earliest deleted round.
+    """
+    doomed = Round.query.options(selectinload(Round.miserie_participations)).filter(
+        Round.game_id == game.id, Round.id.in_(round_ids)
     ).order_by(Round.round_number).all()
-    
-    for r in subsequent_rounds:
-        r.round_number -= 1
-    
+    removed = [(r.id, r.round_number) for r in doomed]
+    ids, numbers = [r.id for r in doomed], [r.round_number for r in doomed]
+    players = game.players
+
+    points = {round_id: {} for round_id in ids}
+    for round_id, player_id, change in db.session.query(Score.round_id, Score.player_id, Score.points_change).filter(
+        Score.round_id.in_(ids)
+    ):
+        points[round_id][player_id] = change
+    complete = all(set(changes) == {p.id for p in players} for changes in points.values())
+
+    # Statistics and the event log see one deletion per round, in playing order
+    contribution = Counter()
+    for r in doomed:
+        contribution.update(stored_round_contribution(r, points[r.id], players))
+        log_event(game.id, 'round_deleted', {'round': stored_round_payload(r)})
+    apply_round_change(contribution, None)
+
+    if complete:
+        shifts = Counter()
+        for number, until, round_id in zip(numbers, numbers[1:] + [None], ids):
+            shifts.subtract(points[round_id])
+            shift_totals_after_round(game.id, number, shifts, until)
+        apply_standing_changes(shifts)
+
+    later_ids = [round_id for round_id, in db.session.query(Round.id).filter(
+        Round.game_id == game.id, Round.round_number > numbers[0], Round.id.notin_(ids)
+    )]
+    for model, column in ((Score, Score.round_id), (MiserieParticipation, MiserieParticipation.round_id),
+                          (Round, Round.id)):
+        db.session.query(model).filter(column.in_(ids)).delete(synchronize_session=False)
+
+    # Every later round moves up by the number of deleted rounds before it
+    gap = db.case(*[(Round.round_number > number, count)
+                    for count, number in reversed(list(enumerate(numbers, 1)))], else_=0)
+    db.session.execute(
+        db.update(Round).where(Round.game_id == game.id, Round.round_number > numbers[0])
+        .values(round_number=Round.round_number - gap, version=Round.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    bump_version(game.id)
     db.session.commit()
+    current_app.extensions['fragments'].invalidate(ids + later_ids)
+
+    # Scores were incomplete: recalculate from the earliest deleted round onwards
+    if not complete:
+        recalculate_scores_from_round(game.id, numbers[0])
+    return removed
+
+def round_error(error):
+    return (jsonify({'error': error}), 400) if wants_json() else (error, 400)
+
+@bp.route('/round/undo', methods=['POST'])
+@bp.route('/table/<int:game_id>/round/undo', methods=['POST'])
+def undo_round(game_id=None):
+    """Undo (delete) the last round, or the last ``count`` rounds."""
+    active_game = get_table(game_id)
+    if not active_game:
+        return round_not_found()
+
+    count = request.form.get('count', 1, type=int)
+    if count is None or count < 1:
+        return round_error('Error: Ongeldig aantal rondes.')
+    last_rounds = [round_id for round_id, in db.session.query(Round.id).filter(
+        Round.game_id == active_game.id
+    ).order_by(Round.round_number.desc()).limit(count)]
+    if not last_rounds:
+        if wants_json():
+            return jsonify({'error': 'Error: Er is geen ronde om ongedaan te maken.'}), 400
+        return redirect(table_url(active_game))
+
+    removed = remove_rounds(active_game, last_rounds)
+    return finish_round_change(active_game, 'round_deleted', removed=removed)
+
+@bp.route('/round/delete/<int:round_id>', methods=['POST'])
+@bp.route('/table/<int:game_id>/round/delete/<int:round_id>', methods=['POST'])
+def delete_round(round_id, game_id=None):
+    """Delete a specific round; later rounds are renumbered and their totals shifted."""
+    round_obj = Round.query.get(round_id)
+    if not round_obj:
+        return round_not_found()
     
-    # Recalculate scores from the deleted round onwards
-    recalculate_scores_from_round(active_game.id, deleted_round_number)
-    
-    return redirect(url_for('index'))
+    active_game = get_table(round_obj.game_id)
+    if not active_game or game_id not in (None, active_game.id):
+        return round_not_found()
+
+    removed = remove_rounds(active_game, [round_id])
+    return finish_round_change(active_game, 'round_deleted', removed=removed)
+
+@bp.route('/rounds/delete', methods=['POST'])
+@bp.route('/table/<int:game_id>/rounds/delete', methods=['POST'])
+def delete_rounds(game_id=None):
+    """Delete the rounds posted as ``round_id`` (repeated) in one transaction."""
+    active_game = get_table(game_id)
+    if not active_game:
+        return round_not_found()
+
+    try:
+        round_ids = {int(value) for value in request.form.getlist('round_id')}
+    except ValueError:
+        return round_error('Error: Ongeldige ronde.')
+    if not round_ids:
+        return round_error('Error: Geen rondes geselecteerd.')
+    found = db.session.query(db.func.count(Round.id)).filter(
+        Round.game_id == active_game.id, Round.id.in_(round_ids)
+    ).scalar()
+    if found != len(round_ids):
+        return round_not_found()
 
-@app.route('/round/edit/<int:round_id>', methods=['GET'])
-def edit_round(round_id):
+    removed = remove_rounds(active_game, round_ids)
+    return finish_round_change(active_game, 'round_deleted', removed=removed)
+
+@bp.route('/round/edit/<int:round_id>', methods=['GET'])
+@bp.route('/table/<int:game_id>/round/edit/<int:round_id>', methods=['GET'])
+def edit_round(round_id, game_id=None):
     """Display edit form for a specific round."""
     round_obj = Round.query.get(round_id)
     if not round_obj:
-        return redirect(url_for('index'))
-    
-    active_game = Game.query.filter_by(is_active=True).first()
-    if not active_game or round_obj.game_id != active_game.id:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    players = sorted(active_game.players, key=lambda p: p.id)
+    active_game = get_table(round_obj.game_id)
+    if not active_game or game_id not in (None, active_game.id):
+        return redirect(url_for('main.index'))
     
     # Return JSON for AJAX or render template
-    return jsonify({
+    return conditional(game_etag(active_game, 'round', round_obj.id), lambda: jsonify({
         'id': round_obj.id,
         'round_number': round_obj.round_number,
         'contract': round_obj.contract_type,
@@ -611,51 +874,195 @@ def edit_round(round_id):
         'result': round_obj.result,
         'trump_suit': round_obj.trump_suit,
         'tricks': round_obj.tricks
-    })
+    }))
 
-@app.route('/round/update/<int:round_id>', methods=['POST'])
-def update_round(round_id):
+@bp.route('/round/update/<int:round_id>', methods=['POST'])
+@bp.route('/table/<int:game_id>/round/update/<int:round_id>', methods=['POST'])
+def update_round(round_id, game_id=None):
     """Update an existing round and recalculate scores."""
     round_obj = Round.query.get(round_id)
     if not round_obj:
-        return redirect(url_for('index'))
+        return round_not_found()
+    
+    active_game = get_table(round_obj.game_id)
+    if not active_game or game_id not in (None, active_game.id):
+        return round_not_found()
     
-    active_game = Game.query.filter_by(is_active=True).first()
-    if not active_game or round_obj.game_id != active_game.id:
-        return redirect(url_for('index'))
+    before = stored_round_payload(round_obj)
+    previous_stats = stored_round_contribution(round_obj, {
+        s.player_id: s.points_change for s in Score.query.filter_by(round_id=round_obj.id)
+    }, active_game.players)
     
     # Update round data
     round_obj.contract_type = request.form.get('contract')
-    round_obj.main_player_id = request.form.get('main_player')
-    round_obj.partner_id = request.form.get('partner_id') if request.form.get('partner_id') else None
+    round_obj.main_player_id = parse_player_id(request.form.get('main_player'))
+    round_obj.partner_id = parse_player_id(request.form.get('partner_id'))
     round_obj.result = request.form.get('result')
     round_obj.tricks = int(request.form.get('tricks', 0))
     round_obj.trump_suit = request.form.get('trump_suit') if round_obj.contract_type in ['Vraag', 'Abondance', 'Troel', 'Solo'] else None
+    round_obj.version += 1
+    log_event(active_game.id, 'round_edited', {'before': before, 'round': stored_round_payload(round_obj)})
+    bump_version(active_game.id)
     
-    db.session.commit()
-    
-    # Recalculate scores from this round onwards
-    recalculate_scores_from_round(active_game.id, round_obj.round_number)
+    # Rewrite this round and shift the running totals of later rounds
+    rescore_round_incrementally(round_obj, active_game.players, previous_stats)
+    current_app.extensions['fragments'].invalidate([round_obj.id])
     
-    return redirect(url_for('index'))
+    return finish_round_change(active_game, 'round_updated', round_obj)
 
-@app.route('/game/end', methods=['POST'])
-def end_game():
-    active_game = Game.query.filter_by(is_active=True).first()
+@bp.route('/game/end', methods=['POST'])
+@bp.route('/table/<int:game_id>/end', methods=['POST'])
+def end_game(game_id=None):
+    active_game = get_table(game_id)
     if active_game:
         active_game.is_active = False
         db.session.commit()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+@bp.route('/import', methods=['POST'])
+def import_score_sheet():
+    """Bulk import finished games from an uploaded CSV or JSONL score sheet."""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'Error: Kies een CSV of JSONL bestand.'}), 400
+    try:
+        fmt = request.form.get('format') or detect_format(upload.filename)
+        summary = import_games(io.TextIOWrapper(upload.stream, encoding='utf-8', newline=''), fmt)
+    except ScoreSheetError as exc:
+        return jsonify({'error': f'Error: {exc}', **getattr(exc, 'summary', {})}), 400
+    except ValueError as exc:
+        return jsonify({'error': f'Error: {exc}'}), 400
+    return jsonify(summary)
+
+@bp.cli.command('import-games')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Default: from the file extension.')
+def import_games_command(path, fmt):
+    """Bulk import finished games from a CSV or JSONL score sheet."""
+    with open(path, encoding='utf-8', newline='') as stream:
+        try:
+            summary = import_games(stream, fmt or detect_format(path))
+        except ScoreSheetError as exc:
+            imported = getattr(exc, 'summary', {}).get('games', [])
+            raise click.ClickException(f'{exc} ({len(imported)} spellen wel geïmporteerd)')
+    click.echo(f"{len(summary['games'])} spellen en {summary['rounds']} rondes geïmporteerd.")
+
+@bp.route('/people/suggest')
+def people_suggest():
+    """Known player names starting with ``q``, for the setup screen."""
+    return jsonify({'people': [{'id': person.id, 'name': person.name}
+                               for person in suggest_people(request.args.get('q', ''))]})
+
+@bp.route('/stats')
+def stats_page():
+    """Cross-game statistics per player, read from the aggregate tables."""
+    return render_template('stats.html', players=player_stats(), contracts=CONTRACTS)
+
+@bp.route('/stats.json')
+def stats_json():
+    return jsonify({'players': player_stats()})
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the cross-game player statistics from all rounds."""
+    count = rebuild_stats()
+    db.session.commit()
+    click.echo(f'Statistieken herberekend voor {count} spelers.')
+
+@bp.route('/archive')
+def archive_index():
+    """Games moved to the season archives, optionally of one ``season``."""
+    return jsonify({'games': archived_games(request.args.get('season'))})
 
-@app.route('/config')
+@bp.route('/archive/<int:game_id>/restore', methods=['POST'])
+def restore_archived_game(game_id):
+    """Move an archived game back into the database."""
+    try:
+        restore_game(game_id, current_app.config['ARCHIVE_DIR'])
+    except ArchiveError as exc:
+        return jsonify({'error': f'Error: {exc}'}), 404
+    return jsonify({'game_id': game_id})
+
+@bp.cli.command('archive-games')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Archive finished games started before this date. Default: one year ago.')
+@click.option('--vacuum', is_flag=True, help='Shrink the database file afterwards.')
+def archive_games_command(before, vacuum):
+    """Move finished games into the compressed season archives."""
+    archived = archive_games(before or datetime.utcnow() - timedelta(days=365), current_app.config['ARCHIVE_DIR'])
+    click.echo(f'{len(archived)} spellen gearchiveerd in {current_app.config["ARCHIVE_DIR"]}.')
+    if vacuum:
+        db.session.remove()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM')
+
+@bp.cli.command('restore-game')
+@click.argument('game_id', type=int)
+def restore_game_command(game_id):
+    """Move an archived game back into the database."""
+    try:
+        restore_game(game_id, current_app.config['ARCHIVE_DIR'])
+    except ArchiveError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Spel {game_id} teruggezet.')
+
+@bp.route('/metrics')
+def metrics():
+    """Request latency and SQL counters per endpoint, in Prometheus text format."""
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+@bp.route('/export')
+def export_games():
+    """Stream every round of the matching games as NDJSON or CSV; archived games only with ``archived=1``."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return "Error: Formaat moet ndjson of csv zijn.", 400
+    try:
+        date_from, date_to = (
+            date.fromisoformat(request.args[name]) if request.args.get(name) else None
+            for name in ('from', 'to')
+        )
+    except ValueError:
+        return "Error: Ongeldige datum, gebruik JJJJ-MM-DD.", 400
+    archive_dir = current_app.config['ARCHIVE_DIR'] if request.args.get('archived') == '1' else None
+    lines = export_lines(fmt, date_from=date_from, date_to=date_to, player=request.args.get('player'),
+                         archive_dir=archive_dir)
+    return Response(
+        stream_with_context(lines),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename=wiezen.{fmt}'},
+    )
+
+@bp.cli.command('export-games')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson', show_default=True)
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First game date.')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last game date.')
+@click.option('--player', help='Only games with this player.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Default: stdout.')
+@click.option('--include-archived', is_flag=True, help='Also export archived games, from the season files.')
+def export_games_command(fmt, date_from, date_to, player, output, include_archived):
+    """Stream all rounds of the matching games as NDJSON or CSV."""
+    archive_dir = current_app.config['ARCHIVE_DIR'] if include_archived else None
+    try:
+        for line in export_lines(fmt, date_from=date_from, date_to=date_to, player=player, archive_dir=archive_dir):
+            output.write(line)
+    except ArchiveError as exc:
+        raise click.ClickException(str(exc))
+    if not include_archived:
+        skipped = archived_game_ids(date_from, date_to, player)
+        if skipped:
+            click.echo(f'{len(skipped)} gearchiveerde spellen overgeslagen: {", ".join(map(str, skipped))} '
+                       f'(gebruik --include-archived).', err=True)
+
+@bp.route('/config')
 def config():
-    """Display configuration page for contract points - only accessible before game starts."""
-    active_game = Game.query.filter_by(is_active=True).first()
-    
-    # Config is only accessible when there's NO active game
-    if active_game:
-        return redirect(url_for('index'))
-    
+    """Display configuration page for contract points of the next table.
+
+    Running tables keep the config stored with their game, so it stays locked
+    for them while other tables are playing.
+    """
     # Get the most recent game to use its config, or create a new default config
     latest_game = Game.query.order_by(Game.id.desc()).first()
     
@@ -683,15 +1090,9 @@ def config():
     
     return render_template('config.html', config=game_config, game=None)
 
-@app.route('/config/update', methods=['POST'])
+@bp.route('/config/update', methods=['POST'])
 def update_config():
     """Update contract configuration - saves to session for next game."""
-    active_game = Game.query.filter_by(is_active=True).first()
-    
-    # Prevent config changes during active game
-    if active_game:
-        return "Error: Configuratie kan niet gewijzigd worden tijdens een actief spel.", 403
-    
     # Store config values in session to apply to next game
     try:
         from flask import session
@@ -718,24 +1119,21 @@ def update_config():
             if value < 0:
                 return "Error: Alle waarden moeten positief zijn.", 400
         
-        return redirect(url_for('index'))
+        return redirect(url_for('main.tables'))
     except ValueError:
         return "Error: Ongeldige invoer. Gebruik alleen gehele getallen.", 400
 
-@app.route('/config/reset', methods=['POST'])
+@bp.route('/config/reset', methods=['POST'])
 def reset_config():
     """Reset configuration to default values."""
-    active_game = Game.query.filter_by(is_active=True).first()
-    
-    # Prevent config changes during active game
-    if active_game:
-        return "Error: Configuratie kan niet gewijzigd worden tijdens een actief spel.", 403
-    
     # Clear pending config from session
     from flask import session
     session.pop('pending_config', None)
     
-    return redirect(url_for('config'))
+    return redirect(url_for('main.config'))
+
+app = create_app()
 
 if __name__ == '__main__':
+    init_db(app)
     app.run(debug=True, host='0.0.0.0', port=8080)
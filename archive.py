@@ -0,0 +1,280 @@
+"""Cold storage for finished games.
+
+Rounds, scores, Miserie participations and the event log make up nearly
+all of a game's rows. ``archive_games()`` moves them for inactive games
+started before a cutoff into one gzip-compressed NDJSON file per season
+(the calendar year the game was played in)::
+
+    archive/2023.ndjson.gz    one line per game, its rows per table
+
+    flask --app app archive-games --before 2024-01-01 --vacuum
+    flask --app app restore-game 42
+
+The ``Game``, ``Player``, ``ContractConfig`` and ``PlayerStanding`` rows
+stay: they are a handful per game, keep the ids taken and keep the game's
+people and final standings. ``ArchivedGame`` is the index of what was moved
+(date, players, number of rounds, season). ``restore_game()`` puts the rows
+back under their original ids. If new rows took some of those ids in the
+meantime, that table's rows get new ids; a round's new id is also written
+into its scores and events. Statistics were counted when the rounds were
+played and are left alone in both directions.
+
+Each archive run appends a gzip member per season file. A game that is
+archived again after a failed run uses its last line.
+"""
+import gzip
+import json
+import os
+from itertools import groupby
+
+from flask import current_app
+
+from models import db, ArchivedGame, Game, Player
+
+BATCH_SIZE = 100
+# Level 9 is 4x slower for about 3% smaller files; restores rewrite a whole season file
+COMPRESS_LEVEL = 6
+
+# Tables whose rows move with a game: name and the SQL selecting (game_id, row...) for a list of games
+_TABLES = (
+    ('round', 'SELECT game_id, * FROM round WHERE game_id IN ({games}) ORDER BY game_id, id'),
+    ('score', 'SELECT r.game_id, s.* FROM score s JOIN round r ON r.id = s.round_id '
+              'WHERE r.game_id IN ({games}) ORDER BY r.game_id, s.id'),
+    ('miserie_participation', 'SELECT r.game_id, m.* FROM miserie_participation m JOIN round r ON r.id = m.round_id '
+                              'WHERE r.game_id IN ({games}) ORDER BY r.game_id, m.round_id, m.player_id'),
+    ('round_event', 'SELECT game_id, * FROM round_event WHERE game_id IN ({games}) ORDER BY game_id, seq'),
+    ('game_snapshot', 'SELECT game_id, * FROM game_snapshot WHERE game_id IN ({games}) ORDER BY game_id, seq'),
+)
+
+# Deleted children first: scores and participations reference their round
+_DELETES = (
+    'DELETE FROM score WHERE round_id IN (SELECT id FROM round WHERE game_id IN ({games}))',
+    'DELETE FROM miserie_participation WHERE round_id IN (SELECT id FROM round WHERE game_id IN ({games}))',
+    'DELETE FROM round WHERE game_id IN ({games})',
+    'DELETE FROM round_event WHERE game_id IN ({games})',
+    'DELETE FROM game_snapshot WHERE game_id IN ({games})',
+)
+
+
+class ArchiveError(Exception):
+    """An archived game that cannot be restored."""
+
+
+def season_of(date):
+    return str(date.year)
+
+
+def archive_path(directory, season):
+    return os.path.join(directory, f'{season}.ndjson.gz')
+
+
+def _rows_by_game(connection, games):
+    """``{table: {game_id: (columns, rows)}}`` of every table in ``_TABLES``."""
+    placeholders = ', '.join('?' * len(games))
+    tables = {}
+    for table, sql in _TABLES:
+        result = connection.exec_driver_sql(sql.format(games=placeholders), tuple(games))
+        columns = list(result.keys())[1:]
+        tables[table] = {
+            game_id: (columns, [list(row[1:]) for row in rows])
+            for game_id, rows in groupby(result, key=lambda row: row[0])
+        }
+    return tables
+
+
+def archive_games(before, directory):
+    """Move inactive games started before ``before`` into the season archives.
+
+    Works in batches of ``BATCH_SIZE`` games, one transaction each; the
+    archive lines are written before the rows are deleted. Returns the
+    archived game ids. Needs an app context.
+    """
+    archived = db.select(ArchivedGame.game_id)
+    candidates = [game_id for game_id, in db.session.query(Game.id).filter(
+        Game.is_active.is_(False), Game.date < before, Game.id.notin_(archived)
+    ).order_by(Game.id)]
+    os.makedirs(directory, exist_ok=True)
+
+    for start in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[start:start + BATCH_SIZE]
+        connection = db.session.connection()
+        tables = _rows_by_game(connection, batch)
+        names = {}
+        for game_id, name in db.session.query(Player.game_id, Player.name).filter(
+            Player.game_id.in_(batch)
+        ).order_by(Player.game_id, Player.id):
+            names.setdefault(game_id, []).append(name)
+
+        entries, lines = [], {}
+        for game_id, date in db.session.query(Game.id, Game.date).filter(Game.id.in_(batch)).order_by(Game.id):
+            rows = {table: by_game.get(game_id) for table, by_game in tables.items()}
+            entries.append({
+                'game_id': game_id,
+                'season': season_of(date),
+                'date': date,
+                'players': json.dumps(names.get(game_id, [])),
+                'rounds': len(rows['round'][1]) if rows['round'] else 0,
+            })
+            record = {'game_id': game_id, 'tables': {
+                table: {'columns': found[0], 'rows': found[1]} for table, found in rows.items() if found
+            }}
+            lines.setdefault(season_of(date), []).append(json.dumps(record, ensure_ascii=False) + '\n')
+
+        for season, season_lines in lines.items():
+            path = archive_path(directory, season)
+            with gzip.open(path, 'at', compresslevel=COMPRESS_LEVEL, encoding='utf-8') as archive:
+                archive.writelines(season_lines)
+
+        placeholders = ', '.join('?' * len(batch))
+        for sql in _DELETES:
+            connection.exec_driver_sql(sql.format(games=placeholders), tuple(batch))
+        db.session.execute(db.insert(ArchivedGame), entries)
+        _bump_versions(batch)
+        db.session.commit()
+        round_ids = [row[columns.index('id')] for columns, rows in tables['round'].values() for row in rows]
+        current_app.extensions['fragments'].invalidate(round_ids)
+    return candidates
+
+
+def _bump_versions(game_ids):
+    """Retire the ETags of games whose rounds moved (see ``bump_version`` in app.py)."""
+    db.session.execute(
+        db.update(Game).where(Game.id.in_(game_ids)).values(version=Game.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def archived_games(season=None):
+    """The archive index, oldest game first, as dicts."""
+    query = ArchivedGame.query
+    if season is not None:
+        query = query.filter(ArchivedGame.season == season)
+    return [{
+        'game_id': entry.game_id,
+        'season': entry.season,
+        'date': entry.date.isoformat() if entry.date else None,
+        'players': json.loads(entry.players),
+        'rounds': entry.rounds,
+    } for entry in query.order_by(ArchivedGame.date, ArchivedGame.game_id)]
+
+
+def read_records(path, game_ids):
+    """``{game_id: record}`` of the last archive line of each of ``game_ids`` in ``path``, in one pass."""
+    if not os.path.exists(path):
+        return {}
+    found = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            # Lines start with '{"game_id": <id>,'; only the wanted ones are parsed
+            game_id = int(line[len('{"game_id": '):line.index(',')])
+            if game_id in game_ids:
+                found[game_id] = line
+    return {game_id: json.loads(line) for game_id, line in found.items()}
+
+
+def _read_record(path, game_id):
+    """The last archive line of ``game_id`` in ``path``, or None."""
+    return read_records(path, {game_id}).get(game_id)
+
+
+def _drop_record(path, game_id):
+    """Rewrite ``path`` without the lines of ``game_id``; removes the file once it is empty."""
+    prefix = f'{{"game_id": {game_id},'
+    kept = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as archive, \
+            gzip.open(path + '.tmp', 'wt', compresslevel=COMPRESS_LEVEL, encoding='utf-8') as rewritten:
+        for line in archive:
+            if not line.startswith(prefix):
+                rewritten.write(line)
+                kept += 1
+    if kept:
+        os.replace(path + '.tmp', path)
+    else:
+        os.remove(path + '.tmp')
+        os.remove(path)
+
+
+def _taken(connection, table, ids):
+    """True if any of ``ids`` is in use in ``table`` again; in chunks to stay under SQLite's parameter limit."""
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        if connection.exec_driver_sql(
+            f"SELECT 1 FROM {table} WHERE id IN ({', '.join('?' * len(chunk))}) LIMIT 1", tuple(chunk)
+        ).first():
+            return True
+    return False
+
+
+def _move_round(table, columns, row, new_round_ids):
+    """``row`` of ``table`` with its round references moved to the round's new id."""
+    index = columns.index('round_id')
+    if row[index] in new_round_ids:
+        row[index] = new_round_ids[row[index]]
+    if table == 'round_event':
+        payload_index = columns.index('payload')
+        payload = json.loads(row[payload_index])
+        for key in ('round', 'before'):
+            if key in payload and payload[key]['id'] in new_round_ids:
+                payload[key]['id'] = new_round_ids[payload[key]['id']]
+        row[payload_index] = json.dumps(payload)
+    return row
+
+
+def restore_game(game_id, directory):
+    """Move an archived game's rows back into the database and out of its archive file.
+
+    Raises ``ArchiveError`` when the game is not archived or its line is
+    missing. Needs an app context.
+    """
+    entry = db.session.get(ArchivedGame, game_id)
+    if entry is None:
+        raise ArchiveError(f'Spel {game_id} is niet gearchiveerd.')
+    path = archive_path(directory, entry.season)
+    record = _read_record(path, game_id)
+    if record is None:
+        raise ArchiveError(f'Spel {game_id} ontbreekt in {path}.')
+    tables = record['tables']
+
+    # Taking the game out of the index first holds SQLite's write lock while ids are handed out
+    db.session.delete(entry)
+    db.session.flush()
+    connection = db.session.connection()
+
+    # Rounds that lost their id move to new ones, and their scores, participations and events with them
+    new_round_ids = {}
+    rounds = tables.get('round')
+    if rounds:
+        index = rounds['columns'].index('id')
+        ids = [row[index] for row in rounds['rows']]
+        if _taken(connection, 'round', ids):
+            first = (connection.exec_driver_sql('SELECT max(id) FROM round').scalar() or 0) + 1
+            new_round_ids = {round_id: first + offset for offset, round_id in enumerate(ids)}
+            for row in rounds['rows']:
+                row[index] = new_round_ids[row[index]]
+
+    for table, _ in _TABLES:
+        if table not in tables:
+            continue
+        columns, rows = tables[table]['columns'], tables[table]['rows']
+        if table != 'round':
+            if new_round_ids:
+                rows = [_move_round(table, columns, row, new_round_ids) for row in rows]
+            if 'id' in columns and _taken(connection, table, [row[columns.index('id')] for row in rows]):
+                # Nothing refers to score or event ids: SQLite hands out new ones, in the original order
+                index = columns.index('id')
+                columns = columns[:index] + columns[index + 1:]
+                rows = [row[:index] + row[index + 1:] for row in rows]
+        connection.exec_driver_sql(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row) for row in rows]
+        )
+    _bump_versions([game_id])
+    db.session.commit()
+    # Core inserts bypass the ORM events that keep the rules cache current
+    current_app.extensions['rules'].pop(game_id, None)
+    if rounds:
+        # A cached row of an earlier round under the same id and version must not be served
+        index = rounds['columns'].index('id')
+        current_app.extensions['fragments'].invalidate([row[index] for row in rounds['rows']])
+    _drop_record(path, game_id)
+    return game_id
@@ -0,0 +1,106 @@
+"""Before/after latency of the hot lookup queries around the index migration.
+
+Builds a synthetic database without the lookup indexes, times the queries,
+applies ``migrations.upgrade`` and times them again::
+
+    python -m benchmarks.bench_indexes --games 500 --rounds 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+
+from migrations import upgrade
+from models import db, Game, Player, Round, Score
+
+
+def build_database(engine, num_games, num_rounds, seed=0):
+    """Fill ``engine`` with finished 4-player games and one active game."""
+    rng = random.Random(seed)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # Start from the pre-migration schema
+        for model in (Game, Round, Score):
+            for index in model.__table__.indexes:
+                index.drop(bind=connection)
+        connection.exec_driver_sql('PRAGMA user_version = 0')
+
+        games, players, rounds, scores = [], [], [], []
+        round_id = 0
+        for game_id in range(1, num_games + 1):
+            games.append({'id': game_id, 'is_active': game_id == num_games})
+            ids = [(game_id - 1) * 4 + seat + 1 for seat in range(4)]
+            players.extend({'id': pid, 'name': f'Speler {pid}', 'game_id': game_id} for pid in ids)
+            totals = dict.fromkeys(ids, 0)
+            for number in range(1, num_rounds + 1):
+                round_id += 1
+                main_id = rng.choice(ids)
+                rounds.append({
+                    'id': round_id, 'game_id': game_id, 'round_number': number, 'contract_type': 'Solo',
+                    'result': 'Gewonnen', 'tricks': 0, 'dealer_id': ids[(number - 1) % 4],
+                    'main_player_id': main_id,
+                })
+                for pid in ids:
+                    change = 39 if pid == main_id else -13
+                    totals[pid] += change
+                    scores.append({
+                        'round_id': round_id, 'player_id': pid,
+                        'points_change': change, 'current_total': totals[pid],
+                    })
+        connection.execute(Game.__table__.insert(), games)
+        connection.execute(Player.__table__.insert(), players)
+        connection.execute(Round.__table__.insert(), rounds)
+        connection.execute(Score.__table__.insert(), scores)
+
+
+def _timeit(connection, statement_for, samples):
+    start = time.perf_counter()
+    for i in range(samples):
+        connection.execute(statement_for(i)).all()
+    return (time.perf_counter() - start) / samples * 1000
+
+
+def time_queries(engine, num_games, num_rounds, samples):
+    """Return ``{query name: mean milliseconds}`` for the hot lookups."""
+    rng = random.Random(1)
+    player_ids = [rng.randint(1, num_games * 4) for _ in range(samples)]
+    game_ids = [rng.randint(1, num_games) for _ in range(samples)]
+    round_ids = [rng.randint(1, num_games * num_rounds) for _ in range(samples)]
+    queries = {
+        'latest score per player': lambda i: select(Score).where(
+            Score.player_id == player_ids[i]).order_by(Score.id.desc()).limit(1),
+        'rounds of a game': lambda i: select(Round).where(
+            Round.game_id == game_ids[i]).order_by(Round.round_number),
+        'scores of a round': lambda i: select(Score).where(Score.round_id == round_ids[i]),
+        'active game': lambda i: select(Game).where(Game.is_active == True).limit(1),  # noqa: E712
+    }
+    with engine.connect() as connection:
+        return {name: _timeit(connection, statement_for, samples) for name, statement_for in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        build_database(engine, args.games, args.rounds)
+        before = time_queries(engine, args.games, args.rounds, args.samples)
+        upgrade(engine)
+        after = time_queries(engine, args.games, args.rounds, args.samples)
+        engine.dispose()
+
+    print(f'{args.games} games x {args.rounds} rounds ({args.games * args.rounds * 4} scores)')
+    print(f'{"query":<26}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+    for name in before:
+        print(f'{name:<26}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Latency of the round operations on games of 10 to 10,000 rounds.
+
+For every size a seeded game is bulk imported as the active table, then
+``add_round`` (form post, and ``add_round_json`` with its JSON reply),
+``index``, ``update_round``, ``delete_round`` and
+``recalculate_scores_from_round`` are timed through the app. Medians go to a
+JSON file; ``--compare`` checks them against an earlier run::
+
+    python -m benchmarks.bench_rounds --output before.json
+    python -m benchmarks.bench_rounds --output after.json --compare before.json
+
+The comparison exits with status 1 when an operation is slower than the
+baseline by more than its threshold in ``THRESHOLDS``.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app import create_app, db, init_db, recalculate_scores_from_round
+from benchmarks.generator import NAMES, edit_session, generate_games, random_round, to_form, to_jsonl
+from importer import import_games
+from models import Game, Player, Round
+
+SIZES = [10, 100, 1000, 10000]
+OPERATIONS = ['add_round', 'add_round_json', 'index', 'update_round', 'delete_round', 'recalculate']
+
+# Allowed slowdown against the baseline: ratio, plus an absolute margin in ms
+# so sub-millisecond noise on small games never counts as a regression
+THRESHOLDS = {
+    'add_round': (1.25, 1.0),
+    'add_round_json': (1.25, 1.0),
+    'index': (1.25, 1.0),
+    'update_round': (1.25, 1.0),
+    'delete_round': (1.25, 1.0),
+    'recalculate': (1.25, 5.0),
+}
+
+
+def _timed(action, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        action(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+
+def bench_size(flask_app, num_rounds, num_players, seed, repeat):
+    """Return ``{operation: median ms}`` for one game of ``num_rounds`` rounds."""
+    client = flask_app.test_client()
+    rng = random.Random(seed + num_rounds)
+    with flask_app.app_context():
+        rows = generate_games(seed + num_rounds, 1, num_rounds, num_players)
+        game_id = import_games(io.StringIO(to_jsonl(rows)), 'jsonl')['games'][0]
+        db.session.get(Game, game_id).is_active = True
+        db.session.commit()
+        player_ids = {p.name: p.id for p in Player.query.filter_by(game_id=game_id)}
+    names = NAMES[:num_players]
+    table = f'/table/{game_id}'
+
+    def round_ids():
+        with flask_app.app_context():
+            return [r.id for r in Round.query.filter_by(game_id=game_id).order_by(Round.round_number)]
+
+    def round_count():
+        with flask_app.app_context():
+            return Round.query.filter_by(game_id=game_id).count()
+
+    results = {}
+    results['index'] = _timed(lambda i: _check(client.get(table)), repeat)
+
+    def add(i, headers=None):
+        form = to_form(random_round(rng, names, round_count() + 1), player_ids)
+        start = time.perf_counter()
+        _check(client.post(f'{table}/round/add', data=form, headers=headers))
+        return time.perf_counter() - start
+
+    results['add_round'] = statistics.median(add(i) * 1000 for i in range(repeat))
+    # The whole submit-to-display cost: the reply carries everything the page needs
+    results['add_round_json'] = statistics.median(
+        add(i, {'Accept': 'application/json'}) * 1000 for i in range(repeat)
+    )
+
+    # Edits and deletes hit early rounds, so every later running total moves
+    ids = round_ids()
+
+    def update(i):
+        number = 1 + i % max(1, len(ids) // 10)
+        form = to_form(random_round(rng, names, number), player_ids)
+        _check(client.post(f'{table}/round/update/{ids[number - 1]}', data=form))
+
+    results['update_round'] = _timed(update, repeat)
+    results['delete_round'] = _timed(lambda i: _check(client.post(f'{table}/round/delete/{ids[i]}')), repeat)
+
+    def recalculate(i):
+        with flask_app.app_context():
+            recalculate_scores_from_round(game_id, 1)
+
+    results['recalculate'] = _timed(recalculate, max(1, repeat // 3))
+    return results
+
+
+def replay_session(flask_app, seed, num_rounds, num_players):
+    """Play a full seeded night (adds, edits, deletes) through the routes; returns elapsed ms."""
+    client = flask_app.test_client()
+    names = NAMES[:num_players]
+    client.post('/game/start', data={'player_name': names})
+    with flask_app.app_context():
+        game = Game.query.order_by(Game.id.desc()).first()
+        game_id, player_ids = game.id, {p.name: p.id for p in game.players}
+    table = f'/table/{game_id}'
+    start = time.perf_counter()
+    for operation in edit_session(seed, num_rounds, names):
+        if operation[0] == 'add':
+            _check(client.post(f'{table}/round/add', data=to_form(operation[1], player_ids)))
+            continue
+        with flask_app.app_context():
+            round_id = Round.query.filter_by(game_id=game_id, round_number=operation[1]).one().id
+        if operation[0] == 'edit':
+            _check(client.post(f'{table}/round/update/{round_id}', data=to_form(operation[2], player_ids)))
+        else:
+            _check(client.post(f'{table}/round/delete/{round_id}'))
+    return (time.perf_counter() - start) * 1000
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    """Return ``[(operation, size, baseline ms, ms)]`` for every regression beyond its threshold."""
+    regressions = []
+    for operation, by_size in results.items():
+        ratio, margin = THRESHOLDS.get(operation, (1.25, 1.0))
+        for size, ms in by_size.items():
+            before = baseline.get(operation, {}).get(size)
+            if before is not None and ms > before * ratio + margin:
+                regressions.append((operation, size, before, ms))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--players', type=int, choices=[4, 5], default=4)
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--session', type=int, default=200, help='Also replay a night of this many operations (0: skip).')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='Earlier JSON output to check for regressions.')
+    args = parser.parse_args()
+
+    results = {operation: {} for operation in OPERATIONS}
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+        init_db(flask_app)
+        print(f'{"rounds":>7}' + ''.join(f'{operation:>16}' for operation in OPERATIONS) + '  (median ms)')
+        for size in args.sizes:
+            timings = bench_size(flask_app, size, args.players, args.seed, args.repeat)
+            for operation, ms in timings.items():
+                results[operation][str(size)] = round(ms, 3)
+            print(f'{size:>7}' + ''.join(f'{timings[operation]:>16.2f}' for operation in OPERATIONS))
+        if args.session:
+            results['session'] = {str(args.session): round(replay_session(flask_app, args.seed, args.session, args.players), 3)}
+            print(f'night of {args.session} operations: {results["session"][str(args.session)]:.0f} ms')
+        with flask_app.app_context():
+            db.engine.dispose()
+
+    report = {
+        'meta': {
+            'commit': _commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'seed': args.seed,
+            'players': args.players,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f'Wrote {args.output}')
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline)
+        for operation, size, before, ms in regressions:
+            print(f'REGRESSION {operation} @ {size}: {before:.2f} -> {ms:.2f} ms')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Cold-start cost: time to import ``app`` and to serve the first request.
+
+Every sample runs in a fresh interpreter against an already initialised
+database, like a container restart::
+
+    python -m benchmarks.bench_startup --samples 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': (imported - start) * 1000, 'first request': (served - imported) * 1000}))
+"""
+
+
+def run_sample(env):
+    output = subprocess.run([sys.executable, '-c', SAMPLE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WIEZEN_DB_PATH=os.path.join(tmp, 'bench.db'))
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=ROOT, env=env, check=True,
+                       capture_output=True)
+        samples = [run_sample(env) for _ in range(args.samples)]
+
+    print(f'{"phase":<16}{"median ms":>12}{"max ms":>10}')
+    for phase in samples[0]:
+        values = [sample[phase] for sample in samples]
+        print(f'{phase:<16}{statistics.median(values):>12.1f}{max(values):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
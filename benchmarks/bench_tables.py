@@ -0,0 +1,97 @@
+"""Request latency with 1 to 50 tables playing at the same time.
+
+Starts the tables through the app, gives each the same round history, then
+sends a fixed number of concurrent clients round-robin across the tables:
+each request adds a round to a table and reloads its scoreboard::
+
+    python -m benchmarks.bench_tables --tables 1 10 50 --rounds 30 --workers 4
+
+The per-request latency should not depend on how many tables are running.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from app import create_app, db, init_db
+from models import Game
+
+SOLO = {'contract': 'Solo', 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+
+
+def start_tables(client, flask_app, count, rounds):
+    """Start ``count`` tables with ``rounds`` rounds each; returns ``[(game id, player ids)]``."""
+    tables = []
+    for _ in range(count):
+        client.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel']})
+        with flask_app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            player_ids = sorted(p.id for p in game.players)
+        for number in range(rounds):
+            client.post(f'/table/{game.id}/round/add', data=dict(SOLO, main_player=player_ids[number % 4]))
+        tables.append((game.id, player_ids))
+    return tables
+
+
+def measure(flask_app, tables, requests, workers):
+    """Send ``requests`` add-round + scoreboard pairs from ``workers`` threads; returns latencies in ms."""
+    latencies = {'add round': [], 'scoreboard': []}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def work():
+        client = flask_app.test_client()
+        for i in counter:
+            game_id, player_ids = tables[i % len(tables)]
+            start = time.perf_counter()
+            client.post(f'/table/{game_id}/round/add', data=dict(SOLO, main_player=player_ids[i % 4]))
+            added = time.perf_counter()
+            client.get(f'/table/{game_id}')
+            done = time.perf_counter()
+            with lock:
+                latencies['add round'].append((added - start) * 1000)
+                latencies['scoreboard'].append((done - added) * 1000)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def _p95(values):
+    return statistics.quantiles(values, n=20)[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, nargs='+', default=[1, 5, 10, 25, 50])
+    parser.add_argument('--rounds', type=int, default=30, help='History per table before measuring.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flask_app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+        init_db(flask_app)
+
+        client = flask_app.test_client()
+        tables = start_tables(client, flask_app, max(args.tables), args.rounds)
+
+        print(f'{args.requests} requests from {args.workers} clients, {args.rounds} rounds of history per table')
+        print(f'{"tables":>6}{"add p50":>10}{"add p95":>10}{"board p50":>11}{"board p95":>11}  (ms)')
+        for count in sorted(args.tables):
+            latencies = measure(flask_app, tables[:count], args.requests, args.workers)
+            add, board = latencies['add round'], latencies['scoreboard']
+            print(f'{count:>6}{statistics.median(add):>10.2f}{_p95(add):>10.2f}'
+                  f'{statistics.median(board):>11.2f}{_p95(board):>11.2f}')
+
+        with flask_app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
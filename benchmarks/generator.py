@@ -0,0 +1,127 @@
+"""Seeded generator of realistic Wiezen games.
+
+Rounds follow a rough club-night contract mix (mostly Vraag, some Abondance
+and Miserie, the odd Solo), stay within the default trick limits and leave
+the sitter of 5-player tables out of Miserie. The same seed always produces
+the same games, so timings can be compared between commits.
+
+Rounds are produced in the score-sheet shape of ``importer.py`` (player
+names), so a history of any length can be bulk imported and then extended
+through the app with :func:`to_form`.
+"""
+import json
+import random
+
+from importer import DEFAULT_CONFIG
+from scoring import MISERIE_CONTRACTS, TRUMP_CONTRACTS, compile_config, lookup_rule
+
+NAMES = ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']
+SUITS = ['harten', 'ruiten', 'klaveren', 'schoppen']
+
+# (contract, weight, chance to win)
+CONTRACT_MIX = [
+    ('Vraag', 50, 0.65),
+    ('Troel', 5, 0.7),
+    ('Abondance', 12, 0.55),
+    ('Solo', 3, 0.5),
+    ('Miserie', 22, 0.6),
+    ('Grote Miserie', 8, 0.5),
+]
+
+_RULES = compile_config(DEFAULT_CONFIG)
+
+
+def sitter_for(names, round_number):
+    """The dealer sits out at 5-player tables."""
+    return names[(round_number - 1) % len(names)] if len(names) == 5 else None
+
+
+def random_round(rng, names, round_number):
+    """Return one valid round as ``{contract, result, tricks, trump_suit, main_player, partner, miserie}``."""
+    contracts, weights, win_rates = zip(*CONTRACT_MIX)
+    index = rng.choices(range(len(contracts)), weights)[0]
+    contract = contracts[index]
+    won = rng.random() < win_rates[index]
+    playing = [name for name in names if name != sitter_for(names, round_number)]
+
+    if contract in MISERIE_CONTRACTS:
+        # Usually one player, sometimes two or three at once
+        count = rng.choices([1, 2, 3], [70, 25, 5])[0]
+        return {
+            'contract': contract, 'result': 'Gewonnen', 'tricks': 0, 'trump_suit': None,
+            'main_player': None, 'partner': None,
+            'miserie': {
+                name: 'Gewonnen' if rng.random() < win_rates[index] else 'Verloren'
+                for name in rng.sample(playing, count)
+            },
+        }
+
+    main, partner = rng.sample(playing, 2)
+    if contract == 'Vraag' and rng.random() < 0.3:
+        partner = None  # Vraag alone
+    elif contract in ('Abondance', 'Solo'):
+        partner = None
+    limit = lookup_rule(_RULES, contract, won, partner is not None).trick_limit or 0
+    return {
+        'contract': contract,
+        'result': 'Gewonnen' if won else 'Verloren',
+        'tricks': min(int(rng.expovariate(0.8)), limit),
+        'trump_suit': rng.choice(SUITS) if contract in TRUMP_CONTRACTS else None,
+        'main_player': main,
+        'partner': partner,
+        'miserie': {},
+    }
+
+
+def generate_games(seed, num_games, num_rounds, num_players=None):
+    """Yield score-sheet rows for ``num_games`` games of ``num_rounds`` rounds.
+
+    ``num_players`` of None mixes 4- and 5-player tables.
+    """
+    rng = random.Random(seed)
+    for game in range(num_games):
+        names = NAMES[:num_players or rng.choice([4, 5])]
+        for number in range(1, num_rounds + 1):
+            yield dict(random_round(rng, names, number), game=game, players=names)
+
+
+def to_jsonl(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def to_form(round_data, player_ids):
+    """Form fields for ``/round/add`` and ``/round/update`` from a generated round."""
+    form = {
+        'contract': round_data['contract'],
+        'result': round_data['result'],
+        'tricks': str(round_data['tricks']),
+        'main_player': str(player_ids[round_data['main_player']]) if round_data['main_player'] else '',
+        'partner_id': str(player_ids[round_data['partner']]) if round_data['partner'] else '',
+    }
+    if round_data['trump_suit']:
+        form['trump_suit'] = round_data['trump_suit']
+    for name, result in round_data['miserie'].items():
+        form[f'miserie_play_{player_ids[name]}'] = 'on'
+        form[f'miserie_result_{player_ids[name]}'] = result
+    return form
+
+
+def edit_session(seed, num_rounds, names, edit_rate=0.03, delete_rate=0.01):
+    """Yield ``('add', round)``, ``('edit', round_number, round)`` and ``('delete', round_number)`` operations.
+
+    Models a night at one table: mostly new rounds, with the occasional
+    correction or removal of an earlier round.
+    """
+    rng = random.Random(seed)
+    played = 0
+    for _ in range(num_rounds):
+        roll = rng.random()
+        if played and roll < delete_rate:
+            yield ('delete', rng.randint(1, played))
+            played -= 1
+        elif played and roll < delete_rate + edit_rate:
+            number = rng.randint(1, played)
+            yield ('edit', number, random_round(rng, names, number))
+        else:
+            played += 1
+            yield ('add', random_round(rng, names, played))
@@ -0,0 +1,243 @@
+"""Streaming export of complete game histories as NDJSON or CSV.
+
+One record per round, in the shape ``importer.py`` reads (so an export can be
+imported again), plus the round number, dealer, sitter and the score change
+and running total of every player. Points and totals are keyed by player id,
+so two seats with the same name stay apart; ``player_ids`` lists the ids in
+the seat order of ``players``::
+
+    {"game": 3, "date": "2024-01-05T20:00:00", "players": ["Jan", "Piet", ...], "player_ids": [9, 10, ...],
+     "round_number": 1, "contract": "Vraag", "result": "Gewonnen", "tricks": 2,
+     "trump_suit": "harten", "main_player": "Jan", "partner": "Piet", "miserie": {},
+     "dealer": "Jan", "sitter": null, "points": {"9": 4, ...}, "totals": {"9": 4, ...}}
+
+Rounds, players and scores are read as three ``yield_per`` result streams in
+the same order and merged per round, so memory stays flat no matter how many
+games the database holds. Archived games (see ``archive.py``) are only
+exported when asked for, from their season files after the other games.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from archive import ArchiveError, archive_path, read_records
+from models import db, ArchivedGame, Game, MiserieParticipation, Person, Player, Round, Score
+from people import player_key
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CSV_COLUMNS = ['game', 'date', 'players', 'player_ids', 'round_number', 'contract', 'result', 'tricks', 'trump_suit',
+               'main_player', 'partner', 'miserie', 'dealer', 'sitter', 'points', 'totals']
+BATCH_SIZE = 1000
+
+
+def _day_start(day):
+    return datetime.combine(day, time()) if not isinstance(day, datetime) else day
+
+
+def game_ids(date_from=None, date_to=None, player=None):
+    """Select the ids of the games played between two dates (inclusive) with ``player``.
+
+    ``player`` is matched as a person (any spelling of the name), through the
+    indexed ``Person.name_key`` and ``Player.person_id``.
+    """
+    games = db.select(Game.id)
+    if date_from is not None:
+        games = games.where(Game.date >= _day_start(date_from))
+    if date_to is not None:
+        games = games.where(Game.date < _day_start(date_to) + timedelta(days=1))
+    if player:
+        games = games.where(Game.id.in_(
+            db.select(Player.game_id).join(Person).where(Person.name_key == player_key(player))
+        ))
+    return games
+
+
+def _stream(statement, batch_size):
+    return db.session.execute(statement.execution_options(yield_per=batch_size))
+
+
+def _aligned(rows, key):
+    """Return ``take(wanted)``: the rows of the next group with key ``wanted`` from an ordered stream."""
+    groups = groupby(rows, key)
+    pending = next(groups, None)
+
+    def take(wanted):
+        nonlocal pending
+        while pending is not None and pending[0] < wanted:
+            pending = next(groups, None)
+        if pending is None or pending[0] != wanted:
+            return []
+        found = list(pending[1])
+        pending = next(groups, None)
+        return found
+
+    return take
+
+
+def _record(game_id, date, names, number, contract, result, tricks, trump_suit, main_id, partner_id, dealer_id,
+            sitter_id, miserie, scores):
+    """One export record; ``names`` maps the game's player ids to names in seat order."""
+    return {
+        'game': game_id,
+        'date': date.isoformat() if date else None,
+        'players': list(names.values()),
+        'player_ids': list(names),
+        'round_number': number,
+        'contract': contract,
+        'result': result,
+        'tricks': tricks or 0,
+        'trump_suit': trump_suit,
+        'main_player': names.get(main_id),
+        'partner': names.get(partner_id),
+        'miserie': {names.get(player_id, player_id): p_result for player_id, p_result in miserie},
+        'dealer': names.get(dealer_id),
+        'sitter': names.get(sitter_id),
+        'points': {player_id: change for player_id, change, _ in scores},
+        'totals': {player_id: total for player_id, _, total in scores},
+    }
+
+
+def archived_game_ids(date_from=None, date_to=None, player=None):
+    """Ids of the matching games whose rounds are in the season archives (see ``archive.py``)."""
+    games = game_ids(date_from, date_to, player)
+    return [game_id for game_id, in db.session.query(ArchivedGame.game_id).filter(
+        ArchivedGame.game_id.in_(games)
+    ).order_by(ArchivedGame.game_id)]
+
+
+def _archived_rounds(games, directory):
+    """Export records of the archived games among ``games``, read from their season files.
+
+    Each season file is read once, keeping the matching games of that season
+    in memory. Raises ``ArchiveError`` when a game's line is missing.
+    """
+    entries = db.session.query(ArchivedGame.season, ArchivedGame.game_id, Game.date).join(
+        Game, Game.id == ArchivedGame.game_id
+    ).filter(ArchivedGame.game_id.in_(games)).order_by(ArchivedGame.season, ArchivedGame.game_id).all()
+    for season, group in groupby(entries, key=lambda entry: entry.season):
+        dates = {entry.game_id: entry.date for entry in group}
+        path = archive_path(directory, season)
+        records = read_records(path, set(dates))
+        names = {}
+        for game_id, player_id, name in db.session.query(Player.game_id, Player.id, Player.name).filter(
+            Player.game_id.in_(list(dates))
+        ).order_by(Player.game_id, Player.id):
+            names.setdefault(game_id, {})[player_id] = name
+
+        for game_id, date in dates.items():
+            if game_id not in records:
+                raise ArchiveError(f'Spel {game_id} ontbreekt in {path}.')
+            tables = {table: [dict(zip(found['columns'], row)) for row in found['rows']]
+                      for table, found in records[game_id]['tables'].items()}
+            scores, miserie = {}, {}
+            for row in sorted(tables.get('score', []), key=lambda row: row['player_id']):
+                scores.setdefault(row['round_id'], []).append(
+                    (row['player_id'], row['points_change'], row['current_total'])
+                )
+            for row in sorted(tables.get('miserie_participation', []), key=lambda row: row['player_id']):
+                miserie.setdefault(row['round_id'], []).append((row['player_id'], row['result']))
+            for row in sorted(tables.get('round', []), key=lambda row: (row['round_number'], row['id'])):
+                yield _record(
+                    game_id, date, names.get(game_id, {}), row['round_number'], row['contract_type'],
+                    row['result'], row['tricks'], row['trump_suit'], row['main_player_id'], row['partner_id'],
+                    row['dealer_id'], row['sitter_id'], miserie.get(row['id'], []), scores.get(row['id'], []),
+                )
+
+
+def iter_rounds(date_from=None, date_to=None, player=None, batch_size=BATCH_SIZE, archive_dir=None):
+    """Yield one export record per round of the matching games. Needs an app context.
+
+    Archived games have no rounds in the database and are left out, unless
+    ``archive_dir`` is given: then they follow the other games, read from
+    their season files.
+    """
+    games = game_ids(date_from, date_to, player)
+    rounds = _stream(
+        db.select(
+            Round.game_id, Game.date, Round.id, Round.round_number, Round.contract_type, Round.result,
+            Round.tricks, Round.trump_suit, Round.main_player_id, Round.partner_id, Round.dealer_id,
+            Round.sitter_id,
+        )
+        .join(Game, Game.id == Round.game_id)
+        .where(Round.game_id.in_(games))
+        .order_by(Round.game_id, Round.round_number, Round.id),
+        batch_size,
+    )
+    players_of = _aligned(_stream(
+        db.select(Player.game_id, Player.id, Player.name)
+        .where(Player.game_id.in_(games))
+        .order_by(Player.game_id, Player.id),
+        batch_size,
+    ), key=lambda row: row.game_id)
+    scores_of = _aligned(_stream(
+        db.select(Round.game_id, Round.round_number, Round.id, Score.player_id, Score.points_change,
+                  Score.current_total)
+        .join(Round, Round.id == Score.round_id)
+        .where(Round.game_id.in_(games))
+        .order_by(Round.game_id, Round.round_number, Round.id, Score.player_id),
+        batch_size,
+    ), key=lambda row: (row.game_id, row.round_number, row.id))
+    miserie_of = _aligned(_stream(
+        db.select(Round.game_id, Round.round_number, Round.id, MiserieParticipation.player_id,
+                  MiserieParticipation.result)
+        .join(Round, Round.id == MiserieParticipation.round_id)
+        .where(Round.game_id.in_(games))
+        .order_by(Round.game_id, Round.round_number, Round.id, MiserieParticipation.player_id),
+        batch_size,
+    ), key=lambda row: (row.game_id, row.round_number, row.id))
+
+    game_id, names = None, {}
+    for (r_game_id, date, round_id, number, contract, result, tricks, trump_suit,
+         main_id, partner_id, dealer_id, sitter_id) in rounds:
+        if r_game_id != game_id:
+            game_id = r_game_id
+            names = {row.id: row.name for row in players_of(game_id)}
+        yield _record(
+            game_id, date, names, number, contract, result, tricks, trump_suit, main_id, partner_id, dealer_id,
+            sitter_id,
+            [(m.player_id, m.result) for m in miserie_of((game_id, number, round_id))],
+            [(s.player_id, s.points_change, s.current_total) for s in scores_of((game_id, number, round_id))],
+        )
+
+    if archive_dir is not None:
+        yield from _archived_rounds(games, archive_dir)
+
+
+def _pairs(mapping):
+    return ';'.join(f'{key}:{value}' for key, value in mapping.items())
+
+
+def to_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def to_csv(records):
+    """Yield CSV text line by line; lists and mappings use the importer's ``;``/``:`` notation."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(dict(
+            record,
+            players=';'.join(record['players']),
+            player_ids=';'.join(map(str, record['player_ids'])),
+            miserie=_pairs(record['miserie']),
+            points=_pairs(record['points']),
+            totals=_pairs(record['totals']),
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def export_lines(fmt, **filters):
+    """Lazily render the matching rounds as lines of ``fmt``."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Onbekend formaat: {fmt}')
+    records = iter_rounds(**filters)
+    return to_ndjson(records) if fmt == 'ndjson' else to_csv(records)
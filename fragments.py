@@ -0,0 +1,95 @@
+"""LRU cache of rendered round history rows.
+
+A committed round's row only changes when the round is edited or
+renumbered, and both bump ``Round.version``. Entries are stored per round
+id and only served for the version they were rendered from, so a stale row
+is never served. Edits and deletes also drop their rows right away: that
+frees the memory at once, and SQLite may hand a deleted round's id to the
+next round.
+
+The cache holds at most ``FRAGMENT_CACHE_BYTES`` (estimated) and evicts
+the least recently used rows first.
+"""
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from models import Round
+
+DEFAULT_BUDGET = 8 * 1024 * 1024
+
+
+def _size(row):
+    """Estimated bytes held by a cached row (its dict, scores and HTML)."""
+    return sys.getsizeof(row) + sys.getsizeof(row['scores']) + sys.getsizeof(row['html'])
+
+
+# Every app's cache; a weak set so a dropped app takes its cache with it
+_caches = weakref.WeakSet()
+
+
+@event.listens_for(Round.__table__, 'after_create')
+def _clear_all(*args, **kwargs):
+    # A recreated round table (tests, a restored database) hands out the same ids again
+    for cache in list(_caches):
+        cache.clear()
+
+
+class FragmentCache:
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # round_id: (version, row, size), least recently used first
+
+    def init_app(self, flask_app):
+        self.budget = flask_app.config.get('FRAGMENT_CACHE_BYTES', self.budget)
+        flask_app.extensions['fragments'] = self
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, round_id, version):
+        """The cached row of ``round_id`` if it was rendered from ``version``, else None."""
+        with self._lock:
+            entry = self._entries.get(round_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(round_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, round_id, version, row):
+        """Cache a row dict with its ``html``; the caller must not change it afterwards."""
+        size = _size(row)
+        if size > self.budget:
+            return
+        with self._lock:
+            self._discard(round_id)
+            self._entries[round_id] = (version, row, size)
+            self.size += size
+            while self.size > self.budget:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def invalidate(self, round_ids):
+        """Drop the rows of ``round_ids`` (edited, renumbered or deleted rounds)."""
+        with self._lock:
+            for round_id in round_ids:
+                self._discard(round_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _discard(self, round_id):
+        entry = self._entries.pop(round_id, None)
+        if entry is not None:
+            self.size -= entry[2]
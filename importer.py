@@ -0,0 +1,283 @@
+"""Bulk import of finished games from CSV or JSONL score sheets.
+
+Every row is one round; consecutive rows with the same ``game`` key form one
+game, in seat and round order. Columns (CSV header / JSONL keys):
+
+``game``         any key that groups the rounds of one game
+``date``         ISO date of the game (read from its first row, optional)
+``players``      4 or 5 names in seat order; ``;``-separated in CSV
+``contract``     Vraag, Troel, Abondance, Solo, Miserie or Grote Miserie
+``result``       Gewonnen or Verloren (not needed for Miserie)
+``tricks``       extra tricks (optional)
+``trump_suit``   harten, ruiten, klaveren or schoppen
+``main_player``  name of the player (not needed for Miserie)
+``partner``      name of the partner (optional)
+``miserie``      Miserie results per player; ``Jan:Gewonnen;Piet:Verloren``
+                 in CSV, ``{"Jan": "Gewonnen", ...}`` in JSONL
+
+Rows are validated with the same rules as ``POST /round/add`` and scored in
+memory with the default ``ContractConfig``. Each game is written with bulk
+inserts in its own transaction, so a bad row only stops the games after it.
+"""
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+from types import SimpleNamespace
+
+from flask import current_app
+
+from models import db, ContractConfig, Game, MiserieParticipation, Player, PlayerStanding, Round, Score
+from scoring import CONTRACTS, MISERIE_CONTRACTS, TRUMP_CONTRACTS, RoundRecord, compile_config, score_round, validate_round
+from people import person_ids, player_key
+from round_log import config_payload, log_game, round_payload
+from stats import apply_changes as apply_stat_changes, round_contribution
+
+FORMATS = ('csv', 'jsonl')
+RESULTS = ('Gewonnen', 'Verloren')
+TRUMP_SUITS = ('harten', 'ruiten', 'klaveren', 'schoppen')
+
+# Column defaults of ContractConfig, usable before any row is flushed
+DEFAULT_CONFIG = SimpleNamespace(**{
+    column.name: column.default.arg
+    for column in ContractConfig.__table__.columns
+    if column.default is not None
+})
+
+
+class ScoreSheetError(ValueError):
+    """A score sheet row that cannot be imported."""
+
+    def __init__(self, line, message):
+        super().__init__(f'Regel {line}: {message}')
+        self.line = line
+
+
+def detect_format(filename):
+    """Guess the score sheet format from a file name."""
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ValueError(f'Onbekend bestandsformaat: {filename} (gebruik .csv of .jsonl)')
+
+
+def _split(value, separator=';'):
+    return [part.strip() for part in (value or '').split(separator) if part.strip()]
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row)`` from a text stream, with CSV rows in the JSONL shape."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            row['players'] = _split(row.get('players'))
+            row['miserie'] = dict(
+                _split(entry, ':')[:2] for entry in _split(row.get('miserie')) if ':' in entry
+            )
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as exc:
+                raise ScoreSheetError(line, f'ongeldige JSON ({exc.msg})')
+    else:
+        raise ValueError(f'Onbekend formaat: {fmt}')
+
+
+def _build_game(rows):
+    """Validate and score the rows of one game without touching the database."""
+    first_line, first = rows[0]
+    names = list(first.get('players') or [])
+    if not 4 <= len(names) <= 5 or len(set(names)) != len(names):
+        raise ScoreSheetError(first_line, 'een spel heeft 4 of 5 verschillende spelers nodig')
+    try:
+        date = datetime.fromisoformat(first['date']) if first.get('date') else datetime.utcnow()
+    except (TypeError, ValueError):
+        raise ScoreSheetError(first_line, f"ongeldige datum '{first.get('date')}'")
+
+    # Seats are numbered from 1 so that every seat key is truthy for the scorer
+    seat_of = {name: seat for seat, name in enumerate(names, 1)}
+    seats = list(seat_of.values())
+    rules = compile_config(DEFAULT_CONFIG)
+    totals = dict.fromkeys(seats, 0)
+    rounds = []
+
+    for number, (line, row) in enumerate(rows, 1):
+        if list(row.get('players') or names) != names:
+            raise ScoreSheetError(line, 'spelers verschillen van de eerste rij van dit spel')
+        contract = row.get('contract')
+        if contract not in CONTRACTS:
+            raise ScoreSheetError(line, f"onbekend contract '{contract}'")
+        result = row.get('result') or ('Gewonnen' if contract in MISERIE_CONTRACTS else None)
+        if result not in RESULTS:
+            raise ScoreSheetError(line, f"resultaat moet Gewonnen of Verloren zijn, niet '{result}'")
+        try:
+            tricks = int(row.get('tricks') or 0)
+        except (TypeError, ValueError):
+            raise ScoreSheetError(line, f"ongeldig aantal slagen '{row.get('tricks')}'")
+        trump_suit = (row.get('trump_suit') or '').strip().lower() or None
+        if trump_suit and trump_suit not in TRUMP_SUITS:
+            raise ScoreSheetError(line, f"onbekende troef '{trump_suit}'")
+        main_player = row.get('main_player') or None
+        partner = row.get('partner') or None
+        for name in (main_player, partner):
+            if name is not None and name not in seat_of:
+                raise ScoreSheetError(line, f"'{name}' speelt niet mee in dit spel")
+        if contract not in MISERIE_CONTRACTS and main_player is None:
+            raise ScoreSheetError(line, 'speler ontbreekt')
+
+        error = validate_round(rules, contract, result, tricks, main_player, partner, trump_suit)
+        if error:
+            raise ScoreSheetError(line, error)
+
+        dealer = seats[(number - 1) % len(seats)]
+        sitter = dealer if len(seats) == 5 else None
+        miserie = None
+        if contract in MISERIE_CONTRACTS:
+            miserie = {}
+            for name, p_result in (row.get('miserie') or {}).items():
+                if seat_of.get(name) in (None, sitter) or p_result not in RESULTS:
+                    raise ScoreSheetError(line, f"ongeldige Miserie deelname '{name}: {p_result}'")
+                miserie[seat_of[name]] = p_result
+
+        record = RoundRecord(
+            contract, result, tricks,
+            main_player_id=seat_of.get(main_player),
+            partner_id=seat_of.get(partner),
+            sitter_id=sitter,
+            miserie=miserie,
+        )
+        changes = score_round(record, rules, seats)
+        for seat, change in changes.items():
+            totals[seat] += change
+        rounds.append((number, record, dealer, trump_suit if contract in TRUMP_CONTRACTS else None,
+                       changes, dict(totals)))
+
+    return date, names, rounds
+
+
+def _insert_rows(table, rows):
+    """executemany on the driver connection; skips SQLAlchemy's per-row parameter handling."""
+    if rows:
+        columns = list(rows[0])
+        db.session.connection().exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row[column] for column in columns) for row in rows]
+        )
+
+
+def _write_game(date, names, rounds):
+    """Insert one scored game with bulk inserts; the caller commits.
+
+    Only the game and its config go through the ORM; the players, rounds and
+    scores are bulk inserted.
+    """
+    game = Game(date=date, is_active=False, config=ContractConfig())
+    db.session.add(game)
+    db.session.flush()
+
+    # The flush above holds SQLite's write lock until commit, so ids can be
+    # handed out here instead of read back row by row with RETURNING
+    connection = db.session.connection()
+    first_player_id, first_round_id = (
+        (connection.exec_driver_sql(f'SELECT max(id) FROM {table.name}').scalar() or 0) + 1
+        for table in (Player.__table__, Round.__table__)
+    )
+    player_of = {seat: first_player_id + seat - 1 for seat in range(1, len(names) + 1)}
+    player_of[None] = None
+    round_ids = range(first_round_id, first_round_id + len(rounds))
+
+    person_of = person_ids(names)
+    _insert_rows(Player.__table__, [
+        {'id': player_of[seat], 'name': name, 'game_id': game.id, 'person_id': person_of[player_key(name)]}
+        for seat, name in enumerate(names, 1)
+    ])
+    _insert_rows(Round.__table__, [
+        {
+            'id': round_id,
+            'game_id': game.id,
+            'round_number': number,
+            'contract_type': record.contract,
+            'result': record.result,
+            'trump_suit': trump_suit,
+            'tricks': record.tricks,
+            'dealer_id': player_of[dealer],
+            'sitter_id': player_of[record.sitter_id],
+            'main_player_id': player_of[record.main_player_id],
+            'partner_id': player_of[record.partner_id],
+            'timestamp': date.isoformat(sep=' '),
+        }
+        for round_id, (number, record, dealer, trump_suit, _, _) in zip(round_ids, rounds)
+    ])
+    _insert_rows(MiserieParticipation.__table__, [
+        {'round_id': round_id, 'player_id': player_of[seat], 'result': p_result}
+        for round_id, (_, record, _, _, _, _) in zip(round_ids, rounds)
+        for seat, p_result in (record.miserie or {}).items()
+    ])
+    _insert_rows(Score.__table__, [
+        {
+            'round_id': round_id,
+            'player_id': player_of[seat],
+            'points_change': change,
+            'current_total': totals[seat],
+        }
+        for round_id, (_, _, _, _, changes, totals) in zip(round_ids, rounds)
+        for seat, change in changes.items()
+    ])
+
+    final_totals = rounds[-1][5] if rounds else {}
+    _insert_rows(PlayerStanding.__table__, [
+        {'player_id': player_of[seat], 'total': final_totals.get(seat, 0)}
+        for seat in range(1, len(names) + 1)
+    ])
+
+    # One upsert per statistics table for the whole game
+    key_of = {seat: person_of[player_key(name)] for seat, name in enumerate(names, 1)}
+    contribution = Counter()
+    for _, record, _, trump_suit, changes, _ in rounds:
+        round_contribution(record, trump_suit, changes, key_of, contribution)
+    apply_stat_changes(contribution)
+
+    # The event log gets the game as if it had been entered round by round
+    log_game(connection, game.id, config_payload(DEFAULT_CONFIG, [player_of[seat] for seat in range(1, len(names) + 1)]), [
+        round_payload(round_id, number, record._replace(
+            main_player_id=player_of[record.main_player_id],
+            partner_id=player_of[record.partner_id],
+            sitter_id=player_of[record.sitter_id],
+            miserie={player_of[seat]: p_result for seat, p_result in record.miserie.items()}
+            if record.miserie is not None else None,
+        ), trump_suit, player_of[dealer])
+        for round_id, (number, record, dealer, trump_suit, _, _) in zip(round_ids, rounds)
+    ], game.date)
+    return game.id
+
+
+def import_games(stream, fmt):
+    """Import every game in ``stream``. Needs an app context.
+
+    Returns ``{'games': [new game ids], 'rounds': count}``. On a ``ScoreSheetError``
+    the games before the bad one stay imported and are listed in ``exc.summary``.
+    """
+    summary = {'games': [], 'rounds': 0}
+    try:
+        for _, group in groupby(read_rows(stream, fmt), key=lambda item: str(item[1].get('game', ''))):
+            date, names, rounds = _build_game(list(group))
+            try:
+                game_id = _write_game(date, names, rounds)
+                db.session.commit()
+                # SQLite may hand out the id of a deleted game again
+                current_app.extensions['rules'].pop(game_id, None)
+                summary['games'].append(game_id)
+            except Exception:
+                db.session.rollback()
+                raise
+            summary['rounds'] += len(rounds)
+    except ScoreSheetError as exc:
+        exc.summary = summary
+        raise
+    return summary
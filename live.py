@@ -0,0 +1,157 @@
+"""Live scoreboard updates per game as Server-Sent Events.
+
+Every game has one channel: a short backlog of events plus a condition
+variable. Publishing appends one pre-serialized event and wakes the
+waiting streams; it does not loop over subscribers. An idle stream holds
+only its cursor (the last event id it sent) and sleeps on the condition,
+waking every ``heartbeat`` seconds to send a comment line so proxies keep
+the connection open.
+
+Events get increasing ids per game. A client reconnecting with
+``Last-Event-ID`` is sent the events it missed. If those are no longer in
+the backlog, or the id comes from before a restart, the client gets a
+``reset`` event and reloads the page.
+
+Channels live in process memory, so this assumes one app process, as
+``python3 app.py`` and the Docker image run it.
+
+A stream waits in ``Condition.wait``. Under a thread per connection
+(``python3 app.py``, gunicorn's sync or gthread workers) every open stream
+holds a thread. The Docker image therefore runs one gunicorn gevent worker,
+where a waiting stream is a parked greenlet of a few KB. Either way at most
+``LIVE_MAX_STREAMS`` streams are open at once. Above that ``stream()``
+raises ``StreamLimitReached`` and the route answers 503, so spectator
+screens cannot take every worker away from the routes that enter rounds.
+"""
+import json
+import threading
+from collections import deque
+
+BACKLOG_SIZE = 100
+MAX_STREAMS = 100
+HEARTBEAT_SECONDS = 15.0
+# Client reconnect delay sent in the stream's ``retry:`` field
+RETRY_MS = 3000
+
+
+class StreamLimitReached(Exception):
+    """Every stream slot is taken; the client should retry later."""
+
+
+class _Channel:
+    def __init__(self, backlog_size):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=backlog_size)  # (id, formatted event)
+        self.last_id = 0
+        self.subscribers = 0
+
+    def since(self, cursor):
+        """Formatted events after ``cursor``, or None when some were dropped."""
+        first_id = self.events[0][0] if self.events else self.last_id + 1
+        if cursor > self.last_id or cursor < first_id - 1:
+            return None
+        return [event for event_id, event in self.events if event_id > cursor]
+
+
+class _Stream:
+    """A stream's chunks; closing it frees its slot, also before the first chunk was sent."""
+
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        self._release()
+
+
+class Broadcaster:
+    def __init__(self, backlog_size=BACKLOG_SIZE, heartbeat=HEARTBEAT_SECONDS, max_streams=MAX_STREAMS):
+        self.backlog_size = backlog_size
+        self.heartbeat = heartbeat
+        self.max_streams = max_streams
+        self.open_streams = 0
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def init_app(self, flask_app):
+        self.max_streams = flask_app.config.get('LIVE_MAX_STREAMS', self.max_streams)
+        flask_app.extensions['live'] = self
+
+    def _channel(self, game_id):
+        with self._lock:
+            channel = self._channels.get(game_id)
+            if channel is None:
+                channel = self._channels[game_id] = _Channel(self.backlog_size)
+            return channel
+
+    def last_id(self, game_id):
+        """Id of the latest event of a game; pages pass it to the stream they open."""
+        return self._channel(game_id).last_id
+
+    def publish(self, game_id, name, build):
+        """Send event ``name`` with the JSON of ``build()`` to every stream of the game.
+
+        ``build`` only runs when someone is listening. Otherwise the event
+        id is still used up and the backlog emptied, so a page rendered
+        before this change gets a ``reset`` when its stream connects.
+        """
+        channel = self._channel(game_id)
+        data = json.dumps(build()) if channel.subscribers else None
+        with channel.condition:
+            channel.last_id += 1
+            if data is None:
+                channel.events.clear()
+            else:
+                channel.events.append((channel.last_id, f'id: {channel.last_id}\nevent: {name}\ndata: {data}\n\n'))
+            channel.condition.notify_all()
+        return channel.last_id
+
+    def stream(self, game_id, last_event_id=None):
+        """The SSE text of a game's events after ``last_event_id``, forever, as an iterator.
+
+        Takes a slot right away; raises ``StreamLimitReached`` when all
+        ``max_streams`` slots are taken. Closing the iterator frees it.
+        """
+        with self._lock:
+            if self.max_streams is not None and self.open_streams >= self.max_streams:
+                raise StreamLimitReached(f'{self.open_streams} streams open')
+            self.open_streams += 1
+        channel = self._channel(game_id)
+        with channel.condition:
+            channel.subscribers += 1
+            cursor = channel.last_id if last_event_id is None else last_event_id
+
+        released = []
+
+        def release():
+            if released:
+                return
+            released.append(True)
+            with channel.condition:
+                channel.subscribers -= 1
+            with self._lock:
+                self.open_streams -= 1
+        return _Stream(self._chunks(channel, cursor, release), release)
+
+    def _chunks(self, channel, cursor, release):
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                with channel.condition:
+                    if cursor == channel.last_id:
+                        channel.condition.wait(self.heartbeat)
+                    events = channel.since(cursor)
+                    cursor = channel.last_id
+                if events is None:
+                    yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+                    return
+                yield ''.join(events) if events else ': keepalive\n\n'
+        finally:
+            release()
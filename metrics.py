@@ -0,0 +1,176 @@
+"""Per-endpoint request latency and SQL metrics in Prometheus text format.
+
+``Metrics.init_app`` times every request and, through SQLAlchemy engine
+events, counts the statements each request runs and the time spent in
+them. Event streams (``/game/<id>/live``) stay open for minutes, so they
+are left out of the latency histogram and timed until they close under
+their own metric instead. ``render()`` produces the text served at
+``/metrics``::
+
+    curl -s localhost:8080/metrics | grep add_round
+
+Everything lives in process memory and resets on restart, as Prometheus
+counters are expected to.
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Upper bounds in seconds of the request latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def endpoint_name():
+    """The view name without its blueprint (``index``, ``add_round``, ...)."""
+    return (request.endpoint or 'unmatched').rpartition('.')[2]
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._latency = {}  # endpoint: [bucket counts..., +Inf count, sum]
+        self._requests = {}  # (endpoint, method, status): count
+        self._sql = {}  # endpoint: [statements, seconds]
+        self._streams = {}  # endpoint: [open, closed, seconds open]
+
+    def init_app(self, flask_app, engine):
+        flask_app.extensions['metrics'] = self
+        flask_app.before_request(self._start_request)
+        flask_app.after_request(self._record_status)
+        # Teardown also covers streamed responses, which run SQL after after_request
+        flask_app.teardown_request(self._finish_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql = [0, 0.0]
+
+    def _record_status(self, response):
+        g.metrics_status = response.status_code
+        if response.mimetype == 'text/event-stream' and 'metrics_start' in g:
+            g.metrics_stream = True
+            endpoint, start = endpoint_name(), g.metrics_start
+            self._open_stream(endpoint)
+            response.call_on_close(lambda: self._close_stream(endpoint, time.perf_counter() - start))
+        return response
+
+    def _finish_request(self, exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        self.observe(
+            endpoint_name(), request.method, g.pop('metrics_status', 500),
+            time.perf_counter() - start, *g.pop('metrics_sql'), stream=g.pop('metrics_stream', False),
+        )
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        if has_request_context() and 'metrics_sql' in g:
+            g.metrics_sql[0] += 1
+            g.metrics_sql[1] += elapsed
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('metrics_query_start'):
+            connection.info['metrics_query_start'].pop()
+
+    def observe(self, endpoint, method, status, seconds, statements=0, sql_seconds=0.0, stream=False):
+        """Record one finished request; a ``stream`` is counted but not timed here."""
+        with self._lock:
+            if not stream:
+                histogram = self._latency.setdefault(endpoint, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        histogram[i] += 1
+                histogram[-2] += 1
+                histogram[-1] += seconds
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            sql = self._sql.setdefault(endpoint, [0, 0.0])
+            sql[0] += statements
+            sql[1] += sql_seconds
+
+    def _open_stream(self, endpoint):
+        with self._lock:
+            self._streams.setdefault(endpoint, [0, 0, 0.0])[0] += 1
+
+    def _close_stream(self, endpoint, seconds):
+        """Record an event stream that was open for ``seconds``."""
+        with self._lock:
+            streams = self._streams.setdefault(endpoint, [0, 0, 0.0])
+            streams[0] -= 1
+            streams[1] += 1
+            streams[2] += seconds
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            latency = {endpoint: list(values) for endpoint, values in self._latency.items()}
+            requests = dict(self._requests)
+            sql = {endpoint: list(values) for endpoint, values in self._sql.items()}
+            streams = {endpoint: list(values) for endpoint, values in self._streams.items()}
+
+        lines = [
+            '# HELP wiezen_request_duration_seconds Request latency per endpoint.',
+            '# TYPE wiezen_request_duration_seconds histogram',
+        ]
+        for endpoint, values in sorted(latency.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'wiezen_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+            lines.append(f'wiezen_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {values[-2]}')
+            lines.append(f'wiezen_request_duration_seconds_sum{_labels(endpoint=endpoint)} {values[-1]:.6f}')
+            lines.append(f'wiezen_request_duration_seconds_count{_labels(endpoint=endpoint)} {values[-2]}')
+
+        lines += [
+            '# HELP wiezen_requests_total Finished requests per endpoint, method and status.',
+            '# TYPE wiezen_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'wiezen_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP wiezen_sql_statements_total SQL statements executed while serving an endpoint.',
+            '# TYPE wiezen_sql_statements_total counter',
+        ]
+        for endpoint, (statements, _) in sorted(sql.items()):
+            lines.append(f'wiezen_sql_statements_total{_labels(endpoint=endpoint)} {statements}')
+
+        lines += [
+            '# HELP wiezen_sql_duration_seconds_total Time spent executing SQL while serving an endpoint.',
+            '# TYPE wiezen_sql_duration_seconds_total counter',
+        ]
+        for endpoint, (_, seconds) in sorted(sql.items()):
+            lines.append(f'wiezen_sql_duration_seconds_total{_labels(endpoint=endpoint)} {seconds:.6f}')
+
+        # Without a gevent worker each open stream holds a thread (see live.py)
+        lines += [
+            '# HELP wiezen_streams_open Event streams open per endpoint.',
+            '# TYPE wiezen_streams_open gauge',
+        ]
+        for endpoint, (open_now, _, _) in sorted(streams.items()):
+            lines.append(f'wiezen_streams_open{_labels(endpoint=endpoint)} {open_now}')
+        lines += [
+            '# HELP wiezen_stream_duration_seconds How long closed event streams stayed open.',
+            '# TYPE wiezen_stream_duration_seconds summary',
+        ]
+        for endpoint, (_, closed, seconds) in sorted(streams.items()):
+            lines.append(f'wiezen_stream_duration_seconds_sum{_labels(endpoint=endpoint)} {seconds:.6f}')
+            lines.append(f'wiezen_stream_duration_seconds_count{_labels(endpoint=endpoint)} {closed}')
+        return '\n'.join(lines) + '\n'
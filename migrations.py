@@ -0,0 +1,183 @@
+"""Versioned schema migrations for existing databases.
+
+``db.create_all()`` only creates missing tables, so anything added to an
+existing table (indexes, columns) needs a migration step here. The applied
+version is stored in SQLite's ``PRAGMA user_version``; every step must be
+idempotent because a fresh database gets the full schema from ``create_all``
+and then runs all steps once to record the version.
+"""
+from sqlalchemy import inspect
+
+from models import (db, ArchivedGame, Game, GameSnapshot, MiserieParticipation, Person, Player, Round, RoundEvent,
+                    Score, PlayerStanding, PlayerStat, PlayerContractStat, PlayerTrumpStat)
+import people
+import round_log
+import stats
+from scoring import MISERIE_CONTRACTS
+
+
+def _add_lookup_indexes(connection):
+    """Indexes for the latest-score, rounds-per-game and active-game lookups."""
+    for model in (Game, Round, Score):
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _backfill_player_standings(connection):
+    """Seed standings from each player's score in their highest-numbered round."""
+    PlayerStanding.__table__.create(bind=connection, checkfirst=True)
+    connection.exec_driver_sql("""
+        INSERT INTO player_standing (player_id, total)
+        SELECT p.id, COALESCE((
+            SELECT s.current_total FROM score s JOIN round r ON r.id = s.round_id
+            WHERE s.player_id = p.id
+            ORDER BY r.round_number DESC, s.id DESC LIMIT 1
+        ), 0)
+        FROM player p
+        WHERE p.id NOT IN (SELECT player_id FROM player_standing)
+    """)
+
+
+def _add_player_game_index(connection):
+    """Players are looked up per table now that several games run at once."""
+    for index in Player.__table__.indexes:
+        # ix_player_person_id comes with its column in step 5
+        if index.name == 'ix_player_game_id':
+            index.create(bind=connection, checkfirst=True)
+
+
+def _add_miserie_participations(connection):
+    """Move the JSON ``round.miserie_participants`` into ``miserie_participation`` rows.
+
+    Steps 4 and 6 read the participations, so they run this first on
+    databases from before the table. Once the column is dropped this does
+    nothing; SQLite before 3.35 cannot drop it and keeps it unused.
+    """
+    MiserieParticipation.__table__.create(bind=connection, checkfirst=True)
+    if 'miserie_participants' not in {column['name'] for column in inspect(connection).get_columns('round')}:
+        return
+    miserie = ', '.join(f"'{contract}'" for contract in MISERIE_CONTRACTS)
+    # A participant stored without a result scored as lost
+    connection.exec_driver_sql(f"""
+        INSERT OR IGNORE INTO miserie_participation (round_id, player_id, result)
+        SELECT r.id, p.id, COALESCE(j.value, 'Verloren')
+        FROM round r, json_each(r.miserie_participants) j
+        JOIN player p ON p.id = CAST(j.key AS INTEGER)
+        WHERE r.contract_type IN ({miserie}) AND r.miserie_participants IS NOT NULL
+    """)
+    if connection.dialect.server_version_info >= (3, 35, 0):
+        connection.exec_driver_sql('ALTER TABLE round DROP COLUMN miserie_participants')
+
+
+def _add_player_stats(connection):
+    """Create the cross-game statistics tables and fill them from the existing rounds.
+
+    The statistics are kept per person, so this runs step 5 first on
+    databases from before the person table.
+    """
+    _add_miserie_participations(connection)
+    _add_people(connection)
+    for model in (PlayerStat, PlayerContractStat, PlayerTrumpStat):
+        model.__table__.create(bind=connection, checkfirst=True)
+    stats.rebuild(connection)
+
+
+def _add_people(connection):
+    """Create the person table and link every existing seat to a person."""
+    Person.__table__.create(bind=connection, checkfirst=True)
+    if 'person_id' not in {column['name'] for column in inspect(connection).get_columns('player')}:
+        connection.exec_driver_sql('ALTER TABLE player ADD COLUMN person_id INTEGER REFERENCES person (id)')
+    for index in Player.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+    people.link_seats(connection)
+
+
+def _add_round_log(connection):
+    """Create the event log and start it for every existing game from its current rounds."""
+    _add_miserie_participations(connection)
+    for model in (RoundEvent, GameSnapshot):
+        model.__table__.create(bind=connection, checkfirst=True)
+    round_log.log_existing_games(connection)
+
+
+def _add_game_version(connection):
+    """Add the per-game version the scoreboard ETags are derived from."""
+    if 'version' not in {column['name'] for column in inspect(connection).get_columns('game')}:
+        connection.exec_driver_sql('ALTER TABLE game ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+
+def _add_round_version(connection):
+    """Add the per-round version the history row cache is keyed on."""
+    if 'version' not in {column['name'] for column in inspect(connection).get_columns('round')}:
+        connection.exec_driver_sql('ALTER TABLE round ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+
+def _add_archive_index(connection):
+    """Create the index of games moved to the season archives."""
+    ArchivedGame.__table__.create(bind=connection, checkfirst=True)
+
+
+def _key_stats_by_person(connection):
+    """Key the statistics tables by ``person_id`` instead of the normalized name.
+
+    Each row moves to the person whose ``name_key`` equals its old
+    ``player_key``; step 5 gave every name that ever had a seat a person.
+    """
+    for model in (PlayerStat, PlayerContractStat, PlayerTrumpStat):
+        table = model.__table__.name
+        columns = [column['name'] for column in inspect(connection).get_columns(table)]
+        if 'player_key' not in columns:
+            continue
+        # The display name is the person's now
+        kept = [column for column in columns if column not in ('player_key', 'name')]
+        connection.exec_driver_sql(f'ALTER TABLE {table} RENAME TO {table}_by_name')
+        model.__table__.create(bind=connection)
+        connection.exec_driver_sql(f"""
+            INSERT INTO {table} (person_id, {', '.join(kept)})
+            SELECT p.id, {', '.join('s.' + column for column in kept)}
+            FROM {table}_by_name s JOIN person p ON p.name_key = s.player_key
+        """)
+        connection.exec_driver_sql(f'DROP TABLE {table}_by_name')
+
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS = [
+    (1, 'Add indexes for hot lookup paths', _add_lookup_indexes),
+    (2, 'Add player_standing running totals', _backfill_player_standings),
+    (3, 'Add player lookup index per table', _add_player_game_index),
+    (4, 'Add cross-game player statistics', _add_player_stats),
+    (5, 'Add people linked to their seats in every game', _add_people),
+    (6, 'Add the round event log with snapshots', _add_round_log),
+    (7, 'Add Game.version for conditional GETs', _add_game_version),
+    (8, 'Add Round.version for the history row cache', _add_round_version),
+    (9, 'Move Miserie participants from JSON into miserie_participation', _add_miserie_participations),
+    (10, 'Add the archived game index', _add_archive_index),
+    (11, 'Key the player statistics by person', _key_stats_by_person),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection):
+    return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def upgrade(engine):
+    """Apply all pending migrations to ``engine``; returns the versions applied."""
+    applied = []
+    with engine.begin() as connection:
+        current = get_schema_version(connection)
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(connection)
+            # PRAGMA does not accept bound parameters; version is an int from MIGRATIONS
+            connection.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+            applied.append(version)
+    return applied
+
+
+def init_schema():
+    """Create missing tables and bring the schema up to date. Needs an app context."""
+    db.create_all()
+    return upgrade(db.engine)
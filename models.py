@@ -4,20 +4,46 @@ from datetime import datetime
 db = SQLAlchemy()
 
 class Game(db.Model):
+    __table_args__ = (
+        # Only the active games (one per table) are ever looked up by flag
+        db.Index('ix_game_is_active', 'is_active', sqlite_where=db.text('is_active = 1')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Bumped by every round change; the ETag of the scoreboard and round endpoints
+    version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     players = db.relationship('Player', backref='game', lazy=True)
     rounds = db.relationship('Round', backref='game', lazy=True)
     config = db.relationship('ContractConfig', backref='game', uselist=False, lazy=True)
 
+class Person(db.Model):
+    """One real person across games; every seat (``Player``) links to one (see ``people.py``)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # as last entered
+    name_key = db.Column(db.String(50), nullable=False, unique=True)  # normalized name
+    seats = db.relationship('Player', backref='person', lazy=True)
+
 class Player(db.Model):
+    __table_args__ = (
+        # Players of one table
+        db.Index('ix_player_game_id', 'game_id'),
+        # Seats of one person across games
+        db.Index('ix_player_person_id', 'person_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True)
     scores = db.relationship('Score', backref='player', lazy=True)
 
 class Round(db.Model):
+    __table_args__ = (
+        db.Index('ix_round_game_id_round_number', 'game_id', 'round_number'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
     round_number = db.Column(db.Integer, nullable=False)
@@ -30,12 +56,32 @@ class Round(db.Model):
     sitter_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
     main_player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
     partner_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True) # Partner for 'Vraag'
-    miserie_participants = db.Column(db.Text, nullable=True)  # JSON: {player_id: result} for multi-player Miserie
+    # Bumped when the round is edited or renumbered; keys its cached history row
+    version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     scores = db.relationship('Score', backref='round', lazy=True)
+    # Who played a (multi-player) Miserie round and how it went for each
+    miserie_participations = db.relationship('MiserieParticipation', lazy=True, cascade='all, delete-orphan')
+
+class MiserieParticipation(db.Model):
+    """One player's outcome in a Miserie round."""
+    __table_args__ = (
+        # Miserie rounds of one player, for statistics
+        db.Index('ix_miserie_participation_player_id', 'player_id'),
+    )
+
+    round_id = db.Column(db.Integer, db.ForeignKey('round.id'), primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), primary_key=True)
+    result = db.Column(db.String(50), nullable=False)  # 'Gewonnen' or 'Verloren'
 
 class Score(db.Model):
+    __table_args__ = (
+        # Latest score per player: filter on player_id, order by id desc
+        db.Index('ix_score_player_id_id', 'player_id', 'id'),
+        db.Index('ix_score_round_id', 'round_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     round_id = db.Column(db.Integer, db.ForeignKey('round.id'), nullable=False)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
@@ -65,3 +111,61 @@ class ContractConfig(db.Model):
     troel_tricks_lost_max = db.Column(db.Integer, default=8, nullable=False)
     abondance_tricks_won_max = db.Column(db.Integer, default=4, nullable=False)
     abondance_tricks_lost_max = db.Column(db.Integer, default=9, nullable=False)
+
+class PlayerStanding(db.Model):
+    """Current running total per player, updated in the same transaction as every round change."""
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+
+class PlayerStat(db.Model):
+    """Cross-game totals per person, kept up to date with every round change (see ``stats.py``)."""
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    rounds = db.Column(db.Integer, default=0, nullable=False)  # rounds played, not sitting out
+    points = db.Column(db.Integer, default=0, nullable=False)
+
+class PlayerContractStat(db.Model):
+    """Contracts a person declared (or played Miserie in) and how many were won."""
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    contract = db.Column(db.String(50), primary_key=True)
+    played = db.Column(db.Integer, default=0, nullable=False)
+    won = db.Column(db.Integer, default=0, nullable=False)
+
+class PlayerTrumpStat(db.Model):
+    """Trump suits a person chose as main player."""
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    trump_suit = db.Column(db.String(20), primary_key=True)
+    rounds = db.Column(db.Integer, default=0, nullable=False)
+
+class RoundEvent(db.Model):
+    """Append-only log of everything that happened to a game's rounds (see ``round_log.py``)."""
+    __table_args__ = (
+        db.Index('ix_round_event_game_id_seq', 'game_id', 'seq', unique=True),
+        # The event that entered a round, for standings as of that round
+        db.Index('ix_round_event_round_id', 'round_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # 1, 2, ... per game
+    kind = db.Column(db.String(20), nullable=False)  # config_applied, round_added, round_edited, round_deleted
+    round_id = db.Column(db.Integer, nullable=True)  # no foreign key: deleted rounds stay in the log
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GameSnapshot(db.Model):
+    """A game's state as replayed up to event ``seq``, stored every ``round_log.SNAPSHOT_INTERVAL`` events."""
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.Text, nullable=False)  # JSON
+
+class ArchivedGame(db.Model):
+    """Index of a game whose rounds, scores and event log moved to the season archive (see ``archive.py``)."""
+    __table_args__ = (
+        db.Index('ix_archived_game_season_date', 'season', 'date'),
+    )
+
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), primary_key=True)
+    season = db.Column(db.String(10), nullable=False)  # names the archive file
+    date = db.Column(db.DateTime, nullable=True)
+    players = db.Column(db.Text, nullable=False)  # JSON list of names, in seat order
+    rounds = db.Column(db.Integer, nullable=False)
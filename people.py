@@ -0,0 +1,64 @@
+"""One identity per real person across games.
+
+``Player`` rows are seats at one game; each links to a ``Person`` found by
+its normalized name (``player_key``), which has a unique index. Questions
+about a person ("every game Jan played") are then an indexed join on
+``Player.person_id`` instead of matching names over every seat, and the
+setup screen can suggest names with a range scan on the same index.
+"""
+from models import db, Person
+
+SUGGESTION_LIMIT = 10
+
+# The spelling entered last becomes the display name
+_UPSERT = ('INSERT INTO person (name, name_key) VALUES (?, ?) '
+           'ON CONFLICT (name_key) DO UPDATE SET name = excluded.name')
+
+
+def player_key(name):
+    """Case- and whitespace-insensitive identity of a player name."""
+    return ' '.join(name.split()).casefold()
+
+
+def person_ids(names, connection=None):
+    """``{player_key: person_id}`` for ``names``, creating missing people.
+
+    Runs on the session (commit left to the caller) unless a ``connection``
+    is given.
+    """
+    names_by_key = {player_key(name): name for name in names}
+    if not names_by_key:
+        return {}
+    connection = connection or db.session.connection()
+    connection.exec_driver_sql(_UPSERT, [(name, key) for key, name in names_by_key.items()])
+    placeholders = ', '.join('?' * len(names_by_key))
+    return dict(connection.exec_driver_sql(
+        f'SELECT name_key, id FROM person WHERE name_key IN ({placeholders})', tuple(names_by_key)
+    ).all())
+
+
+def link_seats(connection):
+    """Give every seat without a person one, in a single pass; returns the number linked."""
+    seats = connection.exec_driver_sql('SELECT id, name FROM player WHERE person_id IS NULL ORDER BY id').all()
+    if not seats:
+        return 0
+    connection.exec_driver_sql(_UPSERT, [(name, player_key(name)) for _, name in seats])
+    person_of = dict(connection.exec_driver_sql('SELECT name_key, id FROM person').all())
+    connection.exec_driver_sql(
+        'UPDATE player SET person_id = ? WHERE id = ?',
+        [(person_of[player_key(name)], seat_id) for seat_id, name in seats]
+    )
+    return len(seats)
+
+
+def suggest(prefix, limit=SUGGESTION_LIMIT):
+    """People whose normalized name starts with ``prefix``, alphabetically."""
+    key = player_key(prefix)
+    if not key:
+        return []
+    # A range on name_key instead of LIKE, so SQLite can use the unique index
+    return (Person.query
+            .filter(Person.name_key >= key, Person.name_key < key + '\U0010ffff')
+            .order_by(Person.name_key)
+            .limit(limit)
+            .all())
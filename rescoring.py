@@ -0,0 +1,240 @@
+"""Vectorized re-scoring of the full round history under alternative configs.
+
+Rounds are loaded once as columnar NumPy arrays (one entry per stored round,
+seats indexed 0-4 by player id within each game) and scored for N candidate
+``ContractConfig`` sets at once. Nothing is written back to the database, so
+this is safe to run against a live ``wiezen.db``.
+
+Example::
+
+    with app.app_context():
+        columns = load_round_columns()
+    result = rescore(columns, [ContractConfig(), ContractConfig(solo_points=15)])
+    result.final_totals  # shape (2, num_games, MAX_SEATS)
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from models import db, ContractConfig, MiserieParticipation, Player, Round
+
+MAX_SEATS = 5
+
+# Contract codes used in the ``contract`` column
+CONTRACT_CODES = ('Vraag', 'Troel', 'Abondance', 'Solo', 'Miserie', 'Grote Miserie')
+VRAAG, TROEL, ABONDANCE, SOLO, MISERIE, GROTE_MISERIE = range(len(CONTRACT_CODES))
+
+# Point columns of the config matrix; Vraag is split on has_partner
+POINT_FIELDS = (
+    'vraag_partner_points', 'vraag_solo_points', 'troel_points', 'abondance_points',
+    'solo_points', 'miserie_points', 'grote_miserie_points',
+)
+
+# (won max, lost max) per contract code; None means no extra tricks allowed
+TRICK_LIMIT_FIELDS = (
+    ('vraag_solo_tricks_won_max', 'vraag_solo_tricks_lost_max'),
+    ('troel_tricks_won_max', 'troel_tricks_lost_max'),
+    ('abondance_tricks_won_max', 'abondance_tricks_lost_max'),
+    None,
+    None,
+    None,
+)
+VRAAG_PARTNER_LIMIT_FIELDS = ('vraag_partner_tricks_won_max', 'vraag_partner_tricks_lost_max')
+
+RoundColumns = namedtuple('RoundColumns', [
+    'game_ids',       # (G,) game id per game index
+    'seat_players',   # (G, MAX_SEATS) player id per seat, -1 for empty seats
+    'game_index',     # (R,) game index of each round
+    'contract',       # (R,) contract code, -1 for unknown contracts
+    'won',            # (R,) result == 'Gewonnen'
+    'tricks',         # (R,) extra tricks
+    'main',           # (R,) seat of the main player, -1 if none
+    'partner',        # (R,) seat of the partner, -1 if none
+    'sitter',         # (R,) seat of the sitter, -1 if none
+    'miserie_won',    # (R, MAX_SEATS) Miserie participants that won
+    'miserie_lost',   # (R, MAX_SEATS) Miserie participants that lost
+])
+
+RescoreResult = namedtuple('RescoreResult', [
+    'deltas',        # (N, R, MAX_SEATS) points change per round
+    'totals',        # (N, R, MAX_SEATS) running total within each game
+    'final_totals',  # (N, G, MAX_SEATS) standings after the last round of each game
+    'violations',    # (N, R) rounds whose extra tricks exceed the config's limits
+])
+
+
+def load_round_columns():
+    """Load every stored round into ``RoundColumns``. Needs an app context."""
+    seat_of = {}
+    game_ids = []
+    seat_rows = []
+    for game_id, player_id in db.session.query(Player.game_id, Player.id).order_by(Player.game_id, Player.id):
+        if not game_ids or game_ids[-1] != game_id:
+            game_ids.append(game_id)
+            seat_rows.append([])
+        seat_of[player_id] = len(seat_rows[-1])
+        seat_rows[-1].append(player_id)
+
+    seat_players = np.full((len(game_ids), MAX_SEATS), -1, dtype=np.int64)
+    for g, seats in enumerate(seat_rows):
+        seat_players[g, :len(seats)] = seats
+    game_pos = {game_id: g for g, game_id in enumerate(game_ids)}
+
+    rows = db.session.query(
+        Round.id, Round.game_id, Round.contract_type, Round.result, Round.tricks, Round.main_player_id,
+        Round.partner_id, Round.sitter_id
+    ).filter(Round.game_id.in_(game_ids)).order_by(Round.game_id, Round.round_number).all()
+
+    count = len(rows)
+    columns = RoundColumns(
+        game_ids=np.array(game_ids, dtype=np.int64),
+        seat_players=seat_players,
+        game_index=np.empty(count, dtype=np.int32),
+        contract=np.empty(count, dtype=np.int8),
+        won=np.empty(count, dtype=bool),
+        tricks=np.empty(count, dtype=np.int32),
+        main=np.empty(count, dtype=np.int8),
+        partner=np.empty(count, dtype=np.int8),
+        sitter=np.empty(count, dtype=np.int8),
+        miserie_won=np.zeros((count, MAX_SEATS), dtype=bool),
+        miserie_lost=np.zeros((count, MAX_SEATS), dtype=bool),
+    )
+    codes = {name: code for code, name in enumerate(CONTRACT_CODES)}
+    index_of = {}
+    for i, (round_id, game_id, contract, result, tricks, main_id, partner_id, sitter_id) in enumerate(rows):
+        index_of[round_id] = i
+        columns.game_index[i] = game_pos[game_id]
+        columns.contract[i] = codes.get(contract, -1)
+        columns.won[i] = result == 'Gewonnen'
+        columns.tricks[i] = tricks or 0
+        columns.main[i] = seat_of.get(main_id, -1)
+        columns.partner[i] = seat_of.get(partner_id, -1)
+        columns.sitter[i] = seat_of.get(sitter_id, -1)
+
+    # All Miserie outcomes in one query instead of per round
+    participations = db.session.query(
+        MiserieParticipation.round_id, MiserieParticipation.player_id, MiserieParticipation.result
+    ).join(Round, Round.id == MiserieParticipation.round_id).filter(
+        Round.game_id.in_(game_ids), Round.contract_type.in_(('Miserie', 'Grote Miserie'))
+    )
+    for round_id, player_id, p_result in participations:
+        seat = seat_of.get(player_id)
+        if seat is not None:
+            mask = columns.miserie_won if p_result == 'Gewonnen' else columns.miserie_lost
+            mask[index_of[round_id], seat] = True
+    return columns
+
+
+def _config_values(config, field):
+    value = getattr(config, field, None)
+    if value is None:
+        # Unsaved ContractConfig instances do not have their column defaults yet
+        value = ContractConfig.__table__.c[field].default.arg
+    return value
+
+
+def config_matrix(configs):
+    """Return an ``(N, len(POINT_FIELDS))`` array of contract points."""
+    return np.array([[_config_values(c, f) for f in POINT_FIELDS] for c in configs], dtype=np.int64)
+
+
+def _limit_matrix(configs):
+    """Return ``(N, contract, won)`` trick limits and the Vraag-with-partner limits."""
+    limits = np.zeros((len(configs), len(CONTRACT_CODES), 2), dtype=np.int64)
+    partner_limits = np.zeros((len(configs), 2), dtype=np.int64)
+    for n, config in enumerate(configs):
+        for code, fields in enumerate(TRICK_LIMIT_FIELDS):
+            if fields:
+                # Column 1 holds the "won" limit so it can be indexed by the won flag
+                limits[n, code, 1] = _config_values(config, fields[0])
+                limits[n, code, 0] = _config_values(config, fields[1])
+        partner_limits[n, 1] = _config_values(config, VRAAG_PARTNER_LIMIT_FIELDS[0])
+        partner_limits[n, 0] = _config_values(config, VRAAG_PARTNER_LIMIT_FIELDS[1])
+    return limits, partner_limits
+
+
+def rescore(columns, configs):
+    """Score every round in ``columns`` under each of ``configs`` at once."""
+    points = config_matrix(configs)
+    seat_count = (columns.seat_players >= 0).sum(axis=1)[columns.game_index]
+    seats = np.arange(MAX_SEATS)
+
+    has_partner = columns.partner >= 0
+    active = (seats[None, :] < seat_count[:, None]) & (seats[None, :] != columns.sitter[:, None])
+    is_main = seats[None, :] == columns.main[:, None]
+    is_partner = has_partner[:, None] & (seats[None, :] == columns.partner[:, None])
+
+    # Column of the config matrix used by each round (-1 scores nothing)
+    point_column = np.select(
+        [
+            (columns.contract == VRAAG) & has_partner,
+            columns.contract == VRAAG,
+            columns.contract == TROEL,
+            columns.contract == ABONDANCE,
+            columns.contract == SOLO,
+            columns.contract == MISERIE,
+            columns.contract == GROTE_MISERIE,
+        ],
+        np.arange(len(POINT_FIELDS)),
+        default=-1,
+    )
+    base = np.where(point_column >= 0, points[:, np.maximum(point_column, 0)], 0)  # (N, R)
+
+    # Standard contracts: 2v2 with a partner, otherwise 1v3
+    signed = np.where(columns.won, 1, -1) * (base + columns.tricks)
+    seat_factor = np.where(
+        has_partner[:, None],
+        np.where(is_main | is_partner, 1, -1),
+        np.where(is_main, 3, -1),
+    ) * active
+    standard = signed[:, :, None] * seat_factor[None, :, :]
+
+    # Miserie: every participant settles separately with each active opponent
+    sign = columns.miserie_won.astype(np.int64) - columns.miserie_lost.astype(np.int64)
+    opponents = active.sum(axis=1) - 1
+    active_sum = (sign * active).sum(axis=1)
+    miserie_factor = sign * opponents[:, None] - active * (active_sum[:, None] - sign * active)
+    miserie = base[:, :, None] * miserie_factor[None, :, :]
+
+    is_miserie = (columns.contract == MISERIE) | (columns.contract == GROTE_MISERIE)
+    deltas = np.where(is_miserie[None, :, None], miserie, standard)
+
+    # Running totals restart at the first round of every game
+    totals = np.cumsum(deltas, axis=1)
+    final_totals = np.zeros((len(configs), len(columns.game_ids), MAX_SEATS), dtype=np.int64)
+    if len(columns.game_index):
+        new_game = np.r_[True, columns.game_index[1:] != columns.game_index[:-1]]
+        starts = np.flatnonzero(new_game)
+        offsets = np.zeros((len(configs), len(starts), MAX_SEATS), dtype=totals.dtype)
+        offsets[:, 1:, :] = totals[:, starts[1:] - 1, :]
+        totals -= offsets[:, np.cumsum(new_game) - 1, :]
+
+        ends = np.r_[starts[1:] - 1, len(new_game) - 1]
+        final_totals[:, columns.game_index[ends], :] = totals[:, ends, :]
+
+    return RescoreResult(deltas, totals, final_totals, _violations(columns, configs, has_partner))
+
+
+def _violations(columns, configs, has_partner):
+    limits, partner_limits = _limit_matrix(configs)
+    won = columns.won.astype(np.int64)
+    contract = np.maximum(columns.contract, 0)
+    limit = np.where(
+        (columns.contract == VRAAG) & has_partner,
+        partner_limits[:, won],
+        limits[:, contract, won],
+    )
+    return columns.tricks[None, :] > limit
+
+
+def standings(columns, result, config_index=0):
+    """Return ``{game_id: {player_id: total}}`` for one of the scored configs."""
+    final = result.final_totals[config_index]
+    return {
+        int(game_id): {
+            int(pid): int(total)
+            for pid, total in zip(columns.seat_players[g], final[g])
+            if pid >= 0
+        }
+        for g, game_id in enumerate(columns.game_ids)
+    }
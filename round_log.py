@@ -0,0 +1,252 @@
+"""Event-sourced log of every change to a game's rounds.
+
+``Score`` rows are derived data: an edit or delete rewrites them and the
+values a round had before are gone. Every change is therefore also appended
+to ``RoundEvent`` with the full round values, as an audit trail:
+
+``config_applied``  the game's ``ContractConfig`` values and seats (first event)
+``round_added``     ``{'round': ...}``
+``round_edited``    ``{'before': ..., 'round': ...}``
+``round_deleted``   ``{'round': ...}`` as it was
+
+Replaying a game's events through the scoring engine gives its totals
+(``GameState``). Every ``SNAPSHOT_INTERVAL`` events the replayed state is
+stored in ``GameSnapshot``, so the standings as of any event (or as they
+stood right after a round was entered) cost one snapshot read plus at most
+``SNAPSHOT_INTERVAL`` events instead of a replay of the whole game.
+"""
+import json
+from datetime import datetime
+from itertools import groupby
+from types import SimpleNamespace
+
+from models import db, ContractConfig, GameSnapshot, MiserieParticipation, Round, RoundEvent
+from scoring import RoundRecord, compile_config, record_from_round, score_round
+
+SNAPSHOT_INTERVAL = 100
+KINDS = ('config_applied', 'round_added', 'round_edited', 'round_deleted')
+
+# ContractConfig values as stored in config_applied events
+DEFAULT_CONFIG = {
+    column.name: column.default.arg
+    for column in ContractConfig.__table__.columns
+    if column.default is not None
+}
+
+
+def round_payload(round_id, round_number, record, trump_suit, dealer_id):
+    """Event form of a round; ``record`` is a ``RoundRecord``."""
+    return {
+        'id': round_id,
+        'round_number': round_number,
+        'contract': record.contract,
+        'result': record.result,
+        'tricks': record.tricks,
+        'trump_suit': trump_suit,
+        'dealer_id': dealer_id,
+        'sitter_id': record.sitter_id,
+        'main_player_id': record.main_player_id,
+        'partner_id': record.partner_id,
+        'miserie': {str(pid): result for pid, result in record.miserie.items()} if record.miserie is not None else None,
+    }
+
+
+def stored_round_payload(round_obj, participations=None):
+    """``round_payload`` of a stored ``Round`` (or any look-alike); see ``record_from_round``."""
+    return round_payload(round_obj.id, round_obj.round_number, record_from_round(round_obj, participations),
+                         round_obj.trump_suit, round_obj.dealer_id)
+
+
+def config_payload(config, player_ids):
+    """``config_applied`` payload for a ``ContractConfig`` (or look-alike) and the seats of the game."""
+    return {'config': {field: getattr(config, field) for field in DEFAULT_CONFIG}, 'players': list(player_ids)}
+
+
+def _record(payload):
+    miserie = payload['miserie']
+    return RoundRecord(
+        contract=payload['contract'],
+        result=payload['result'],
+        tricks=payload['tricks'],
+        main_player_id=payload['main_player_id'],
+        partner_id=payload['partner_id'],
+        sitter_id=payload['sitter_id'],
+        miserie={int(pid): result for pid, result in miserie.items()} if miserie is not None else None,
+    )
+
+
+class GameState:
+    """A game as replayed up to event ``seq``: its config, seats, number of rounds and totals.
+
+    Events carry whole rounds (an edit also the round before it), so the
+    totals follow from each event alone and the state stays small however
+    many rounds were played. ``config_applied`` starts a game's log; it
+    applies to the rounds logged after it.
+    """
+
+    def __init__(self, seq=0, config=None, players=(), rounds=0, totals=None):
+        self.seq = seq
+        self.config = dict(config or DEFAULT_CONFIG)
+        self.players = list(players)
+        self.rounds = rounds
+        self.totals = dict(totals) if totals is not None else {pid: 0 for pid in self.players}
+        self._rules = compile_config(SimpleNamespace(**self.config))
+
+    def _add_round(self, payload, sign=1):
+        for pid, change in score_round(_record(payload), self._rules, self.players).items():
+            self.totals[pid] = self.totals.get(pid, 0) + sign * change
+        self.rounds += sign
+
+    def apply(self, seq, kind, payload):
+        """Advance the state by one event."""
+        if kind == 'config_applied':
+            self.config, self.players = dict(payload['config']), list(payload['players'])
+            self._rules = compile_config(SimpleNamespace(**self.config))
+            for pid in self.players:
+                self.totals.setdefault(pid, 0)
+        elif kind == 'round_added':
+            self._add_round(payload['round'])
+        elif kind == 'round_edited':
+            self._add_round(payload['before'], -1)
+            self._add_round(payload['round'])
+        elif kind == 'round_deleted':
+            self._add_round(payload['round'], -1)
+        else:
+            raise ValueError(f'Onbekend event: {kind}')
+        self.seq = seq
+
+    def to_json(self):
+        return json.dumps({'config': self.config, 'players': self.players, 'rounds': self.rounds,
+                           'totals': self.totals})
+
+    @classmethod
+    def from_json(cls, seq, text):
+        data = json.loads(text)
+        totals = {int(pid): total for pid, total in data['totals'].items()}
+        return cls(seq, data['config'], data['players'], data['rounds'], totals)
+
+
+def log_event(game_id, kind, payload):
+    """Append an event to a game's log and snapshot every ``SNAPSHOT_INTERVAL`` events.
+
+    Runs on the session in the caller's transaction (commit left to the
+    caller), after its other writes so SQLite's write lock already
+    serializes the sequence numbers. Returns the event's ``seq``.
+    """
+    seq = (db.session.query(db.func.max(RoundEvent.seq)).filter(RoundEvent.game_id == game_id).scalar() or 0) + 1
+    db.session.execute(db.insert(RoundEvent).values(
+        game_id=game_id,
+        seq=seq,
+        kind=kind,
+        round_id=payload['round']['id'] if 'round' in payload else None,
+        payload=json.dumps(payload),
+    ))
+    if seq % SNAPSHOT_INTERVAL == 0:
+        db.session.execute(db.insert(GameSnapshot).values(game_id=game_id, seq=seq, state=replay(game_id).to_json()))
+    return seq
+
+
+def log_game(connection, game_id, config, rounds, timestamp):
+    """Log a whole game at once: ``config_applied`` plus a ``round_added`` per round payload.
+
+    For the importer and the migration; events and snapshots are built in
+    memory and written with one executemany each.
+    """
+    state = GameState()
+    events, snapshots = [], []
+    stamp = timestamp.isoformat(sep=' ')
+    for seq, (kind, payload) in enumerate(
+        [('config_applied', config)] + [('round_added', {'round': r}) for r in rounds], 1
+    ):
+        state.apply(seq, kind, payload)
+        events.append((game_id, seq, kind, payload['round']['id'] if 'round' in payload else None,
+                       json.dumps(payload), stamp))
+        if seq % SNAPSHOT_INTERVAL == 0:
+            snapshots.append((game_id, seq, state.to_json()))
+    connection.exec_driver_sql(
+        'INSERT INTO round_event (game_id, seq, kind, round_id, payload, timestamp) VALUES (?, ?, ?, ?, ?, ?)', events
+    )
+    if snapshots:
+        connection.exec_driver_sql('INSERT INTO game_snapshot (game_id, seq, state) VALUES (?, ?, ?)', snapshots)
+
+
+# The round columns the log is started from; later columns (``version``) are added by later migrations
+_LOGGED_ROUND_COLUMNS = (
+    Round.id, Round.game_id, Round.round_number, Round.contract_type, Round.result, Round.tricks, Round.trump_suit,
+    Round.dealer_id, Round.sitter_id, Round.main_player_id, Round.partner_id,
+)
+
+
+def log_existing_games(connection):
+    """Start the log of every game that has none, from its current rounds; returns the number of games.
+
+    What happened before the log existed is unknown, so each game starts
+    with its config and its rounds as they are now.
+    """
+    logged = {game_id for game_id, in connection.exec_driver_sql('SELECT DISTINCT game_id FROM round_event')}
+    configs = {row.game_id: row for row in connection.execute(ContractConfig.__table__.select())}
+    players = {}
+    for game_id, player_id in connection.exec_driver_sql('SELECT game_id, id FROM player ORDER BY game_id, id'):
+        players.setdefault(game_id, []).append(player_id)
+    participations = {}
+    for row in connection.execute(MiserieParticipation.__table__.select()):
+        participations.setdefault(row.round_id, []).append(row)
+    rounds = {
+        game_id: [stored_round_payload(r, participations.get(r.id, ())) for r in game_rounds]
+        for game_id, game_rounds in groupby(
+            connection.execute(db.select(*_LOGGED_ROUND_COLUMNS).order_by(Round.game_id, Round.round_number)),
+            key=lambda r: r.game_id,
+        )
+    }
+
+    count = 0
+    for game_id, date in connection.exec_driver_sql('SELECT id, date FROM game ORDER BY id'):
+        if game_id in logged:
+            continue
+        config = configs.get(game_id) or SimpleNamespace(**DEFAULT_CONFIG)
+        log_game(connection, game_id, config_payload(config, players.get(game_id, [])), rounds.get(game_id, []),
+                 datetime.fromisoformat(date) if isinstance(date, str) else (date or datetime.utcnow()))
+        count += 1
+    return count
+
+
+def replay(game_id, seq=None):
+    """``GameState`` of a game after event ``seq`` (default: the latest), from the nearest snapshot."""
+    snapshots = db.session.query(GameSnapshot.seq, GameSnapshot.state).filter(GameSnapshot.game_id == game_id)
+    events = db.session.query(RoundEvent.seq, RoundEvent.kind, RoundEvent.payload).filter(RoundEvent.game_id == game_id)
+    if seq is not None:
+        snapshots = snapshots.filter(GameSnapshot.seq <= seq)
+        events = events.filter(RoundEvent.seq <= seq)
+    snapshot = snapshots.order_by(GameSnapshot.seq.desc()).first()
+    state = GameState.from_json(*snapshot) if snapshot else GameState()
+    for event_seq, kind, payload in events.filter(RoundEvent.seq > state.seq).order_by(RoundEvent.seq):
+        state.apply(event_seq, kind, json.loads(payload))
+    return state
+
+
+def round_entered_seq(game_id, round_number):
+    """``seq`` of the event that entered the game's current round ``round_number``, or None."""
+    round_id = db.session.query(Round.id).filter(
+        Round.game_id == game_id, Round.round_number == round_number
+    ).scalar()
+    if round_id is None:
+        return None
+    # SQLite hands a deleted last round's id to the next round: the latest event is the current round's
+    return db.session.query(RoundEvent.seq).filter(
+        RoundEvent.game_id == game_id, RoundEvent.round_id == round_id, RoundEvent.kind == 'round_added'
+    ).order_by(RoundEvent.seq.desc()).limit(1).scalar()
+
+
+def game_events(game_id, after=0, limit=100):
+    """The audit trail of a game: events after ``after``, oldest first, as dicts."""
+    rows = (RoundEvent.query
+            .filter(RoundEvent.game_id == game_id, RoundEvent.seq > after)
+            .order_by(RoundEvent.seq)
+            .limit(limit))
+    return [{
+        'seq': event.seq,
+        'kind': event.kind,
+        'round_id': event.round_id,
+        'payload': json.loads(event.payload),
+        'timestamp': event.timestamp.isoformat() if event.timestamp else None,
+    } for event in rows]
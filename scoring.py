@@ -0,0 +1,174 @@
+"""Pure scoring engine for Wiezen rounds.
+
+Nothing in this module touches the database: a round is described by a compact
+``RoundRecord`` and scored against any object exposing the ``ContractConfig``
+attributes. Routes, recalculation and batch jobs all share the same rules.
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+CONTRACTS = ('Vraag', 'Troel', 'Abondance', 'Solo', 'Miserie', 'Grote Miserie')
+MISERIE_CONTRACTS = ('Miserie', 'Grote Miserie')
+
+# contract, result ('Gewonnen'/'Verloren'), tricks, main_player_id, partner_id,
+# sitter_id and miserie ({player_id: result} for multi-player Miserie).
+RoundRecord = namedtuple(
+    'RoundRecord',
+    ['contract', 'result', 'tricks', 'main_player_id', 'partner_id', 'sitter_id', 'miserie'],
+    defaults=(0, None, None, None, None),
+)
+
+
+def get_contract_points(config, contract_type, has_partner=False):
+    """Get points for a specific contract type."""
+    if contract_type == 'Vraag':
+        return config.vraag_partner_points if has_partner else config.vraag_solo_points
+    elif contract_type == 'Troel':
+        return config.troel_points
+    elif contract_type == 'Abondance':
+        return config.abondance_points
+    elif contract_type == 'Solo':
+        return config.solo_points
+    elif contract_type == 'Miserie':
+        return config.miserie_points
+    elif contract_type == 'Grote Miserie':
+        return config.grote_miserie_points
+    return 0
+
+
+def get_trick_limits(config, contract_type, result, has_partner=False):
+    """Get trick limits for a specific contract type and result."""
+    if contract_type == 'Vraag':
+        if has_partner:
+            return config.vraag_partner_tricks_won_max if result == 'Gewonnen' else config.vraag_partner_tricks_lost_max
+        else:
+            return config.vraag_solo_tricks_won_max if result == 'Gewonnen' else config.vraag_solo_tricks_lost_max
+    elif contract_type == 'Troel':
+        return config.troel_tricks_won_max if result == 'Gewonnen' else config.troel_tricks_lost_max
+    elif contract_type == 'Abondance':
+        return config.abondance_tricks_won_max if result == 'Gewonnen' else config.abondance_tricks_lost_max
+    return 0
+
+
+# Points and maximum extra tricks for one (contract, won, has_partner) combination
+Rule = namedtuple('Rule', ['points', 'trick_limit'])
+NO_RULE = Rule(0, 0)
+
+
+def compile_config(config):
+    """Compile a config into an immutable ``{(contract, won, has_partner): Rule}`` table."""
+    return MappingProxyType({
+        (contract, won, has_partner): Rule(
+            get_contract_points(config, contract, has_partner),
+            get_trick_limits(config, contract, 'Gewonnen' if won else 'Verloren', has_partner),
+        )
+        for contract in CONTRACTS
+        for won in (True, False)
+        for has_partner in (True, False)
+    })
+
+
+def lookup_rule(rules, contract, won, has_partner=False):
+    return rules.get((contract, won, has_partner), NO_RULE)
+
+
+TRUMP_CONTRACTS = ('Vraag', 'Troel', 'Abondance', 'Solo')
+
+
+def validate_round(rules, contract, result, tricks, main_player_id=None, partner_id=None, trump_suit=None):
+    """Return the error message for an invalid round, or None if it may be scored."""
+    # Validation: Partner cannot be Main Player
+    if partner_id and partner_id == main_player_id:
+        return "Error: Speler en partner mogen niet dezelfde persoon zijn."
+
+    # Validation: Extra Tricks Limit (using configurable limits)
+    if contract in ['Vraag', 'Troel', 'Abondance']:
+        limit = lookup_rule(rules, contract, result == 'Gewonnen', bool(partner_id)).trick_limit
+        if tricks > limit:
+            return f"Error: Maximaal {limit} extra slagen bij {contract} ({result})."
+
+    if contract in ['Miserie', 'Grote Miserie', 'Solo'] and tricks > 0:
+        return f"Error: Geen extra slagen toegestaan bij {contract}."
+
+    # Validation: Troel must have a partner
+    if contract == 'Troel' and not partner_id:
+        return "Error: Bij Troel moet er altijd een partner gekozen worden."
+
+    # Validation: Trump is mandatory for non-Miserie contracts
+    if contract in TRUMP_CONTRACTS and not trump_suit:
+        return "Error: Kies een troefkleur (Harten, Ruiten, Klaveren of Schoppen)."
+    return None
+
+
+def score_round(record, config, player_ids):
+    """Return ``{player_id: points_change}`` for one round.
+
+    ``config`` is a compiled rule table or anything ``compile_config`` accepts.
+    ``player_ids`` lists every seat at the table, including the sitter.
+    """
+    rules = config if isinstance(config, Mapping) else compile_config(config)
+    changes = {pid: 0 for pid in player_ids}
+    sitter_id = record.sitter_id
+    active_ids = [pid for pid in player_ids if pid != sitter_id]
+
+    if record.contract in MISERIE_CONTRACTS:
+        # Each participant settles separately with every other active player
+        base_val = lookup_rule(rules, record.contract, True).points
+        opponents = len(active_ids) - 1
+        for player_id, p_result in (record.miserie or {}).items():
+            sign = 1 if p_result == 'Gewonnen' else -1
+            changes[player_id] += sign * base_val * opponents
+            for pid in active_ids:
+                if pid != player_id:
+                    changes[pid] -= sign * base_val
+        return changes
+
+    has_partner = bool(record.partner_id)
+    won = record.result == 'Gewonnen'
+    points = lookup_rule(rules, record.contract, won, has_partner).points + (record.tricks or 0)
+    total_change = points if won else -points
+
+    for pid in active_ids:
+        if has_partner:
+            change = total_change if pid in (record.main_player_id, record.partner_id) else -total_change
+        else:  # 1 vs 3
+            change = total_change * 3 if pid == record.main_player_id else -total_change
+        changes[pid] = change
+    return changes
+
+
+def score_rounds(records, config, player_ids, baseline=None):
+    """Score a sequence of rounds, yielding ``(changes, totals)`` per round."""
+    rules = config if isinstance(config, Mapping) else compile_config(config)
+    totals = {pid: 0 for pid in player_ids}
+    if baseline:
+        totals.update(baseline)
+    for record in records:
+        changes = score_round(record, rules, player_ids)
+        for pid, change in changes.items():
+            totals[pid] += change
+        yield changes, dict(totals)
+
+
+def record_from_round(round_obj, participations=None):
+    """Build a ``RoundRecord`` from a stored ``Round`` (or any look-alike).
+
+    ``participations`` are the round's Miserie outcomes (anything with
+    ``player_id`` and ``result``), for callers that loaded them for many rounds
+    at once; by default the round's ``miserie_participations`` are read.
+    """
+    miserie = None
+    if round_obj.contract_type in MISERIE_CONTRACTS:
+        if participations is None:
+            participations = round_obj.miserie_participations
+        miserie = {p.player_id: p.result for p in participations} or None
+    return RoundRecord(
+        contract=round_obj.contract_type,
+        result=round_obj.result,
+        tricks=round_obj.tricks or 0,
+        main_player_id=round_obj.main_player_id,
+        partner_id=round_obj.partner_id,
+        sitter_id=round_obj.sitter_id,
+        miserie=miserie,
+    )
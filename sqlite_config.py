@@ -0,0 +1,55 @@
+"""SQLite connection tuning, applied to every new DBAPI connection.
+
+The defaults suit several tablets posting rounds while others reload the
+scoreboard: WAL lets readers keep going while a round is written, and the
+busy timeout makes a second writer wait for the lock instead of failing with
+``database is locked``. Every pragma can be overridden with an environment
+variable; an empty value leaves SQLite's own default in place.
+"""
+import os
+import re
+
+from sqlalchemy import event
+
+# pragma: (environment variable, default); busy_timeout first so the
+# journal_mode switch already waits for a lock held by another process
+PRAGMA_SETTINGS = {
+    'busy_timeout': ('WIEZEN_SQLITE_BUSY_TIMEOUT_MS', '5000'),
+    'journal_mode': ('WIEZEN_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': ('WIEZEN_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': ('WIEZEN_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    'cache_size': ('WIEZEN_SQLITE_CACHE_SIZE', '-20000'),  # negative: KiB
+}
+
+# PRAGMA does not accept bound parameters, so values are checked instead
+_PRAGMA_VALUE = re.compile(r'-?\w+')
+
+
+def sqlite_pragmas(environ=None):
+    """Return ``{pragma: value}`` from the environment and the defaults."""
+    environ = os.environ if environ is None else environ
+    pragmas = {}
+    for name, (variable, default) in PRAGMA_SETTINGS.items():
+        value = environ.get(variable, default).strip()
+        if not value:
+            continue
+        if not _PRAGMA_VALUE.fullmatch(value):
+            raise ValueError(f'Ongeldige waarde voor {variable}: {value!r}')
+        pragmas[name] = value
+    return pragmas
+
+
+def install_pragmas(engine, pragmas=None):
+    """Run the pragmas on every connection ``engine`` opens; no-op for other databases."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
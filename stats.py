@@ -0,0 +1,216 @@
+"""Cross-game player statistics in aggregate tables.
+
+Statistics are kept per ``Person`` (see ``people.py``): "Jan" at
+Tuesday's table and "jan " at Friday's are seats of the same person, and
+the display name is the person's.
+
+Every round contributes a fixed set of increments (rounds played, points,
+contracts played/won, trump choices). Round changes apply the difference
+between a round's contribution before and after, with upserts in the same
+transaction as their score writes. Reading the statistics therefore only
+touches the aggregate rows. ``rebuild()`` recomputes the tables from
+``Round``/``Score`` in bulk::
+
+    flask --app app rebuild-stats
+"""
+from collections import Counter
+
+from models import db, Person, PlayerStat, PlayerContractStat, PlayerTrumpStat
+from scoring import CONTRACTS, MISERIE_CONTRACTS, record_from_round
+
+WON = 'Gewonnen'
+
+# Upserts adding to the counters; driver-level executemany, like the importer's bulk inserts
+_UPSERTS = {
+    'player': (
+        'INSERT INTO player_stat (person_id, rounds, points) VALUES (?, ?, ?) '
+        'ON CONFLICT (person_id) DO UPDATE SET '
+        'rounds = rounds + excluded.rounds, points = points + excluded.points'
+    ),
+    'contract': (
+        'INSERT INTO player_contract_stat (person_id, contract, played, won) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT (person_id, contract) DO UPDATE SET '
+        'played = played + excluded.played, won = won + excluded.won'
+    ),
+    'trump': (
+        'INSERT INTO player_trump_stat (person_id, trump_suit, rounds) VALUES (?, ?, ?) '
+        'ON CONFLICT (person_id, trump_suit) DO UPDATE SET rounds = rounds + excluded.rounds'
+    ),
+}
+
+
+def round_contribution(record, trump_suit, points, keys, contribution=None):
+    """Increments one round adds to the statistics.
+
+    ``record`` is a ``RoundRecord``, ``points`` the round's ``{player_id:
+    points_change}`` and ``keys`` maps player ids to person ids. Returns a
+    ``Counter`` keyed by ``('player', person_id, field)``, ``('contract',
+    person_id, contract, field)`` and ``('trump', person_id, suit)``; pass
+    ``contribution`` to add to an existing one (as the importer does for a
+    whole game).
+    """
+    if contribution is None:
+        contribution = Counter()
+    for player_id, change in points.items():
+        if player_id == record.sitter_id:
+            continue
+        key = keys[player_id]
+        contribution['player', key, 'rounds'] += 1
+        contribution['player', key, 'points'] += change
+
+    if record.contract in MISERIE_CONTRACTS:
+        # Old Miserie rounds without participant data count for nobody
+        declarers = (record.miserie or {}).items()
+    else:
+        declarers = [(player_id, record.result) for player_id in (record.main_player_id, record.partner_id)
+                     if player_id is not None]
+    for player_id, result in declarers:
+        key = keys[player_id]
+        contribution['contract', key, record.contract, 'played'] += 1
+        contribution['contract', key, record.contract, 'won'] += result == WON
+
+    if trump_suit and record.main_player_id is not None:
+        contribution['trump', keys[record.main_player_id], trump_suit] += 1
+    return contribution
+
+
+def person_keys(players):
+    """``{player_id: person_id}`` of a game's players."""
+    return {player.id: player.person_id for player in players}
+
+
+def stored_round_contribution(round_obj, points, players):
+    """``round_contribution`` of a stored ``Round`` with the given points."""
+    return round_contribution(record_from_round(round_obj), round_obj.trump_suit, points, person_keys(players))
+
+
+def difference(before, after):
+    """Increments that turn contribution ``before`` into ``after`` (may be negative)."""
+    changes = Counter(after)
+    changes.subtract(before)
+    return changes
+
+
+def apply_changes(changes, connection=None):
+    """Add ``changes`` to the aggregate tables; commit is left to the caller.
+
+    Runs on the session unless a ``connection`` is given.
+    """
+    rows = {'player': {}, 'contract': {}, 'trump': {}}
+    for key, amount in changes.items():
+        if not amount:
+            continue
+        if key[0] == 'player':
+            _, person_id, field = key
+            row = rows['player'].setdefault(person_id, [person_id, 0, 0])
+            row[1 if field == 'rounds' else 2] += amount
+        elif key[0] == 'contract':
+            _, person_id, contract, field = key
+            row = rows['contract'].setdefault((person_id, contract), [person_id, contract, 0, 0])
+            row[2 if field == 'played' else 3] += amount
+        else:
+            _, person_id, suit = key
+            rows['trump'][person_id, suit] = [person_id, suit, amount]
+
+    connection = connection or db.session.connection()
+    for table, table_rows in rows.items():
+        if table_rows:
+            connection.exec_driver_sql(_UPSERTS[table], [tuple(row) for row in table_rows.values()])
+
+
+def apply_round_change(before, after):
+    """Apply the change of one round from contribution ``before`` to ``after``."""
+    apply_changes(difference(before, after))
+
+
+def rebuild(connection=None):
+    """Recompute all statistics from the rounds and scores; returns the number of people.
+
+    Aggregates per player id in SQL and folds the seats of one person in
+    Python, through the same ``Player.person_id`` as the incremental path.
+    Runs on the session (commit left to the caller) unless a ``connection``
+    is given, as in the schema migration.
+    """
+    connection = connection or db.session.connection()
+    person_of = dict(connection.exec_driver_sql('SELECT id, person_id FROM player').all())
+    miserie = ', '.join(f"'{contract}'" for contract in MISERIE_CONTRACTS)
+    changes = Counter()
+
+    for player_id, rounds, points in connection.exec_driver_sql("""
+        SELECT s.player_id, count(*), sum(s.points_change)
+        FROM score s JOIN round r ON r.id = s.round_id
+        WHERE r.sitter_id IS NULL OR r.sitter_id != s.player_id
+        GROUP BY s.player_id
+    """):
+        changes['player', person_of[player_id], 'rounds'] += rounds
+        changes['player', person_of[player_id], 'points'] += points
+
+    for player_id, contract, played, won in connection.exec_driver_sql(f"""
+        SELECT player_id, contract_type, count(*), sum(result = '{WON}') FROM (
+            SELECT main_player_id AS player_id, contract_type, result FROM round
+            WHERE main_player_id IS NOT NULL AND contract_type NOT IN ({miserie})
+            UNION ALL
+            SELECT partner_id, contract_type, result FROM round
+            WHERE partner_id IS NOT NULL AND contract_type NOT IN ({miserie})
+            UNION ALL
+            SELECT m.player_id, r.contract_type, m.result
+            FROM miserie_participation m JOIN round r ON r.id = m.round_id
+            WHERE r.contract_type IN ({miserie})
+        )
+        GROUP BY player_id, contract_type
+    """):
+        changes['contract', person_of[player_id], contract, 'played'] += played
+        changes['contract', person_of[player_id], contract, 'won'] += won
+
+    for player_id, suit, rounds in connection.exec_driver_sql("""
+        SELECT main_player_id, trump_suit, count(*) FROM round
+        WHERE main_player_id IS NOT NULL AND trump_suit IS NOT NULL
+        GROUP BY main_player_id, trump_suit
+    """):
+        changes['trump', person_of[player_id], suit] += rounds
+
+    for model in (PlayerStat, PlayerContractStat, PlayerTrumpStat):
+        connection.execute(model.__table__.delete())
+    apply_changes(changes, connection)
+    return len({key[1] for key in changes if key[0] == 'player'})
+
+
+def _rate(won, played):
+    return round(won / played, 3) if played else None
+
+
+def player_stats():
+    """Statistics of every person who played a round, by name.
+
+    Three reads of the aggregate tables, however many rounds were played.
+    """
+    contracts, trumps = {}, {}
+    for row in PlayerContractStat.query.filter(PlayerContractStat.played > 0):
+        contracts.setdefault(row.person_id, {})[row.contract] = (row.played, row.won)
+    for row in PlayerTrumpStat.query.filter(PlayerTrumpStat.rounds > 0):
+        trumps.setdefault(row.person_id, {})[row.trump_suit] = row.rounds
+
+    result = []
+    for row, name in (db.session.query(PlayerStat, Person.name)
+                      .join(Person, Person.id == PlayerStat.person_id)
+                      .filter(PlayerStat.rounds > 0)
+                      .order_by(Person.name_key)):
+        played = contracts.get(row.person_id, {})
+        suits = trumps.get(row.person_id, {})
+        miserie_played = sum(played.get(contract, (0, 0))[0] for contract in MISERIE_CONTRACTS)
+        miserie_won = sum(played.get(contract, (0, 0))[1] for contract in MISERIE_CONTRACTS)
+        result.append({
+            'name': name,
+            'rounds': row.rounds,
+            'points': row.points,
+            'average_points': round(row.points / row.rounds, 2),
+            'contracts': {
+                contract: {'played': played[contract][0], 'won': played[contract][1],
+                           'win_rate': _rate(played[contract][1], played[contract][0])}
+                for contract in CONTRACTS if contract in played
+            },
+            'miserie': {'played': miserie_played, 'won': miserie_won, 'success_rate': _rate(miserie_won, miserie_played)},
+            'trumps': dict(sorted(suits.items(), key=lambda item: -item[1])),
+            'favourite_trump': max(suits, key=suits.get) if suits else None,
+        })
+    return result
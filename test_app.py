@@ -1,10 +1,14 @@
 import unittest
-from app import app, db, Game, Player, Score, Round
+from sqlalchemy import event
+from app import (create_app, db, Game, Player, Score, Round, PlayerStanding, ContractConfig,
+                 recalculate_scores_from_round, get_rules, HISTORY_PAGE_SIZE)
+from models import RoundEvent
+from round_log import replay
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
 
 class WiezenTestCase(unittest.TestCase):
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.app = app.test_client()
         with app.app_context():
             db.create_all()
@@ -219,6 +223,460 @@ class WiezenTestCase(unittest.TestCase):
         response = self.app.post('/round/add', data=data, follow_redirects=True)
         self.assertEqual(response.status_code, 200)
 
+    def test_edit_round_recalculates(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            players = {p.name: p.id for p in game.players}
+
+        self.app.post('/round/add', data={
+            'contract': 'Solo', 'main_player': players['Jan'], 'result': 'Gewonnen',
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+        self.app.post('/round/add', data={
+            'contract': 'Vraag', 'main_player': players['Piet'], 'partner_id': players['Joris'],
+            'result': 'Gewonnen', 'trump_suit': 'ruiten', 'tricks': '1'
+        })
+
+        with app.app_context():
+            first_round = Round.query.filter_by(game_id=game.id, round_number=1).first()
+            first_round_id = first_round.id
+
+        # Jan lost the Solo instead: -39 for Jan, +13 for the others
+        response = self.app.post(f'/round/update/{first_round_id}', data={
+            'contract': 'Solo', 'main_player': players['Jan'], 'result': 'Verloren',
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+        self.assertEqual(response.status_code, 302)
+
+        with app.app_context():
+            totals = {
+                name: Score.query.filter_by(player_id=pid).order_by(Score.id.desc()).first().current_total
+                for name, pid in players.items()
+            }
+        self.assertEqual(totals, {'Jan': -42, 'Piet': 16, 'Joris': 16, 'Korneel': 10})
+
+    def count_index_queries(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.app.get('/')
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_index_query_count_is_constant(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            jan_id = next(p.id for p in game.players if p.name == 'Jan')
+        solo = {'contract': 'Solo', 'main_player': jan_id, 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+
+        for _ in range(2):
+            self.app.post('/round/add', data=solo)
+        few_rounds = self.count_index_queries()
+
+        for _ in range(30):
+            self.app.post('/round/add', data=solo)
+        many_rounds = self.count_index_queries()
+
+        self.assertEqual(few_rounds, many_rounds)
+
+    def test_standings_follow_round_changes(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            players = {p.name: p.id for p in game.players}
+
+        def standings():
+            with app.app_context():
+                rows = PlayerStanding.query.filter(PlayerStanding.player_id.in_(players.values()))
+                by_id = {row.player_id: row.total for row in rows}
+            return {name: by_id[pid] for name, pid in players.items()}
+
+        self.assertEqual(standings(), {'Jan': 0, 'Piet': 0, 'Joris': 0, 'Korneel': 0})
+
+        for main in ('Jan', 'Piet', 'Joris'):
+            self.app.post('/round/add', data={
+                'contract': 'Solo', 'main_player': players[main], 'result': 'Gewonnen',
+                'trump_suit': 'harten', 'tricks': '0'
+            })
+        self.assertEqual(standings(), {'Jan': 13, 'Piet': 13, 'Joris': 13, 'Korneel': -39})
+
+        with app.app_context():
+            round_ids = [r.id for r in Round.query.filter_by(game_id=game.id).order_by(Round.round_number)]
+
+        # Delete Piet's Solo
+        self.app.post(f'/round/delete/{round_ids[1]}')
+        self.assertEqual(standings(), {'Jan': 26, 'Piet': -26, 'Joris': 26, 'Korneel': -26})
+
+        # Jan's Solo was lost instead
+        self.app.post(f'/round/update/{round_ids[0]}', data={
+            'contract': 'Solo', 'main_player': players['Jan'], 'result': 'Verloren',
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+        self.assertEqual(standings(), {'Jan': -52, 'Piet': 0, 'Joris': 52, 'Korneel': 0})
+
+        # Undo Joris' Solo
+        self.app.post('/round/undo')
+        self.assertEqual(standings(), {'Jan': -39, 'Piet': 13, 'Joris': 13, 'Korneel': 13})
+
+    def test_incremental_recalculation_matches_full_replay(self):
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            ids = sorted(p.id for p in game.players)
+
+        rounds = [
+            {'contract': 'Vraag', 'main_player': ids[1], 'partner_id': ids[2], 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '1'},
+            {'contract': 'Abondance', 'main_player': ids[0], 'result': 'Verloren', 'trump_suit': 'ruiten', 'tricks': '2'},
+            {'contract': 'Solo', 'main_player': ids[3], 'result': 'Gewonnen', 'trump_suit': 'klaveren', 'tricks': '0'},
+            {'contract': 'Troel', 'main_player': ids[0], 'partner_id': ids[4], 'result': 'Verloren', 'trump_suit': 'schoppen', 'tricks': '0'},
+            {'contract': 'Vraag', 'main_player': ids[2], 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '3'},
+        ]
+        for data in rounds:
+            self.app.post('/round/add', data=data)
+
+        def snapshot():
+            with app.app_context():
+                return sorted(
+                    (s.id, r.round_number, s.player_id, s.points_change, s.current_total)
+                    for s, r in db.session.query(Score, Round).join(Round, Score.round_id == Round.id)
+                    .filter(Round.game_id == game.id)
+                )
+
+        with app.app_context():
+            round_ids = [r.id for r in Round.query.filter_by(game_id=game.id).order_by(Round.round_number)]
+        original_ids = {row[0] for row in snapshot()}
+
+        self.app.post(f'/round/update/{round_ids[1]}', data={
+            'contract': 'Abondance', 'main_player': ids[2], 'result': 'Gewonnen', 'trump_suit': 'ruiten', 'tricks': '1'
+        })
+        self.app.post(f'/round/delete/{round_ids[0]}')
+        incremental = snapshot()
+
+        with app.app_context():
+            recalculate_scores_from_round(game.id, 1)
+        full = snapshot()
+
+        # Same totals as a full replay, without rewriting later rows
+        self.assertEqual([row[1:] for row in incremental], [row[1:] for row in full])
+        self.assertEqual(len(incremental), 4 * 5)
+        self.assertLessEqual({row[0] for row in incremental}, original_ids)
+
+    def test_edit_with_incomplete_scores_replays(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            players = {p.name: p.id for p in game.players}
+        for main in ('Jan', 'Piet'):
+            self.app.post('/round/add', data={
+                'contract': 'Solo', 'main_player': players[main], 'result': 'Gewonnen',
+                'trump_suit': 'harten', 'tricks': '0'
+            })
+        with app.app_context():
+            first, second = Round.query.filter_by(game_id=game.id).order_by(Round.round_number).all()
+            first_id = first.id
+            # Korneel's score of round 1 went missing; dealer and sitter stay as stored
+            rotation = [(r.dealer_id, r.sitter_id) for r in (first, second)]
+            Score.query.filter_by(round_id=first_id, player_id=players['Korneel']).delete()
+            db.session.commit()
+
+        self.app.post(f'/round/update/{first_id}', data={
+            'contract': 'Solo', 'main_player': players['Jan'], 'result': 'Verloren',
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+
+        with app.app_context():
+            rounds = Round.query.filter_by(game_id=game.id).order_by(Round.round_number).all()
+            self.assertEqual([(r.dealer_id, r.sitter_id) for r in rounds], rotation)
+            self.assertEqual(Score.query.filter_by(round_id=first_id).count(), 4)
+            standings = {row.player_id: row.total for row in PlayerStanding.query.filter(
+                PlayerStanding.player_id.in_(players.values()))}
+        self.assertEqual(standings, {players['Jan']: -39 - 13, players['Piet']: 13 + 39,
+                                     players['Joris']: 13 - 13, players['Korneel']: 13 - 13})
+
+    def test_batch_delete_and_undo(self):
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            ids = sorted(p.id for p in game.players)
+        table = f'/table/{game.id}'
+        as_json = {'Accept': 'application/json'}
+        for number in range(8):
+            main = ids[number % 5]
+            self.app.post(f'{table}/round/add', data={
+                'contract': ('Solo', 'Abondance')[number % 2], 'main_player': main,
+                'result': ('Gewonnen', 'Verloren')[number % 3 == 0], 'trump_suit': 'harten', 'tricks': '0'
+            })
+
+        def state():
+            with app.app_context():
+                rounds = Round.query.filter_by(game_id=game.id).order_by(Round.round_number).all()
+                scores = sorted(
+                    (r.round_number, s.player_id, s.points_change, s.current_total)
+                    for s, r in db.session.query(Score, Round).join(Round, Score.round_id == Round.id)
+                    .filter(Round.game_id == game.id)
+                )
+                standings = {s.player_id: s.total for s in PlayerStanding.query.filter(PlayerStanding.player_id.in_(ids))}
+                return [(r.round_number, r.id) for r in rounds], scores, standings
+
+        def full_replay():
+            with app.app_context():
+                recalculate_scores_from_round(game.id, 1)
+            return state()
+
+        rounds, _, _ = state()
+        round_ids = [round_id for _, round_id in rounds]
+
+        # Rounds 2, 3 and 6 in one request; later rounds close the gaps
+        response = self.app.post(f'{table}/rounds/delete', headers=as_json,
+                                 data={'round_id': [round_ids[5], round_ids[1], round_ids[2]]})
+        data = response.get_json()
+        self.assertEqual(data['round_ids'], [round_ids[1], round_ids[2], round_ids[5]])
+        self.assertEqual((data['round_id'], data['round_number']), (round_ids[1], 2))
+        batch = state()
+        self.assertEqual(batch[0], list(enumerate([round_ids[0], round_ids[3], round_ids[4]] + round_ids[6:], 1)))
+        self.assertEqual(batch, full_replay())
+        self.assertEqual(data['totals'], {str(pid): total for pid, total in batch[2].items()})
+        with app.app_context():
+            self.assertEqual(replay(game.id).totals, batch[2])
+            self.assertEqual(RoundEvent.query.filter_by(game_id=game.id, kind='round_deleted').count(), 3)
+
+        # Unknown rounds and bad input leave the game alone
+        for url, form, status in ((f'{table}/rounds/delete', {'round_id': [round_ids[0], 9999]}, 404),
+                                  (f'{table}/rounds/delete', {'round_id': 'x'}, 400),
+                                  (f'{table}/rounds/delete', {}, 400),
+                                  (f'{table}/round/undo', {'count': '0'}, 400)):
+            self.assertEqual(self.app.post(url, data=form, headers=as_json).status_code, status)
+        self.assertEqual(state(), batch)
+
+        # Incomplete scores: one recalculation from the earliest deleted round
+        with app.app_context():
+            Score.query.filter_by(round_id=round_ids[3], player_id=ids[0]).delete()
+            db.session.commit()
+        self.app.post(f'{table}/rounds/delete', data={'round_id': [round_ids[3], round_ids[6]]})
+        after = state()
+        self.assertEqual([round_id for _, round_id in after[0]], [round_ids[0], round_ids[4], round_ids[7]])
+        self.assertEqual(after, full_replay())
+
+        # Undo the last two rounds at once
+        data = self.app.post(f'{table}/round/undo', data={'count': '2'}, headers=as_json).get_json()
+        self.assertEqual(data['round_ids'], [round_ids[4], round_ids[7]])
+        undone = state()
+        self.assertEqual(undone[0], [(1, round_ids[0])])
+        self.assertEqual(undone, full_replay())
+        with app.app_context():
+            self.assertEqual(replay(game.id).totals, undone[2])
+
+    def test_round_history_pages(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            jan_id = next(p.id for p in game.players if p.name == 'Jan')
+        solo = {'contract': 'Solo', 'main_player': jan_id, 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+        for _ in range(HISTORY_PAGE_SIZE + 5):
+            self.app.post('/round/add', data=solo)
+
+        # The scoreboard only renders the latest page
+        html = self.app.get('/').get_data(as_text=True)
+        self.assertEqual(html.count('data-round-id='), HISTORY_PAGE_SIZE)
+        self.assertIn('data-next-before="6"', html)
+
+        page = self.app.get(f'/game/{game.id}/rounds?before=6&limit=3').get_json()
+        self.assertEqual([r['round_number'] for r in page['rounds']], [5, 4, 3])
+        self.assertEqual(page['next_before'], 3)
+        self.assertEqual(page['rounds'][0]['scores'][str(jan_id)], 39)
+        self.assertIn('data-round-id="%d"' % page['rounds'][0]['id'], page['rounds'][0]['html'])
+
+        page = self.app.get(f'/game/{game.id}/rounds?before=3').get_json()
+        self.assertEqual([r['round_number'] for r in page['rounds']], [2, 1])
+        self.assertIsNone(page['next_before'])
+        self.assertEqual(self.app.get('/game/999/rounds').status_code, 404)
+
+    def test_concurrent_tables(self):
+        first = self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel']})
+        second = self.app.post('/game/start', data={'player_name': ['An', 'Bert', 'Cas', 'Dirk']})
+        with app.app_context():
+            first_game, second_game = Game.query.order_by(Game.id).all()
+            self.assertTrue(first_game.is_active and second_game.is_active)
+            jan_id = next(p.id for p in first_game.players if p.name == 'Jan')
+            bert_id = next(p.id for p in second_game.players if p.name == 'Bert')
+        self.assertTrue(first.location.endswith(f'/table/{first_game.id}'))
+        self.assertTrue(second.location.endswith(f'/table/{second_game.id}'))
+
+        solo = {'contract': 'Solo', 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+        self.app.post(f'/table/{first_game.id}/round/add', data=dict(solo, main_player=jan_id))
+        self.app.post(f'/table/{second_game.id}/round/add', data=dict(solo, main_player=bert_id))
+        self.app.post(f'/table/{second_game.id}/round/add', data=dict(solo, main_player=bert_id))
+
+        with app.app_context():
+            self.assertEqual(db.session.get(PlayerStanding, jan_id).total, 39)
+            self.assertEqual(db.session.get(PlayerStanding, bert_id).total, 78)
+            second_rounds = Round.query.filter_by(game_id=second_game.id).order_by(Round.round_number).all()
+            self.assertEqual([r.round_number for r in second_rounds], [1, 2])
+
+        # The bare URL lists both tables; each table page only shows its own players
+        lobby = self.app.get('/').get_data(as_text=True)
+        self.assertIn(f'/table/{first_game.id}', lobby)
+        self.assertIn(f'/table/{second_game.id}', lobby)
+        self.assertNotIn('Bert', self.app.get(f'/table/{first_game.id}').get_data(as_text=True))
+
+        # A round cannot be changed through another table
+        self.app.post(f'/table/{first_game.id}/round/delete/{second_rounds[0].id}')
+        with app.app_context():
+            self.assertEqual(Round.query.filter_by(game_id=second_game.id).count(), 2)
+
+        self.app.post(f'/table/{first_game.id}/end')
+        with app.app_context():
+            self.assertFalse(db.session.get(Game, first_game.id).is_active)
+            self.assertTrue(db.session.get(Game, second_game.id).is_active)
+        self.assertEqual(self.app.get(f'/table/{first_game.id}').status_code, 302)
+
+    def test_json_round_changes(self):
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']})
+        with app.app_context():
+            game = Game.query.first()
+            ids = {p.name: p.id for p in game.players}
+        table = f'/table/{game.id}'
+        as_json = {'Accept': 'application/json'}
+        solo = {'contract': 'Solo', 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+
+        # Jan deals and sits out round 1; Piet plays a Solo against the other three
+        response = self.app.post(f'{table}/round/add', data=dict(solo, main_player=ids['Piet']), headers=as_json)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['round']['round_number'], 1)
+        self.assertEqual(data['round']['scores'], {str(ids['Piet']): 39, str(ids['Joris']): -13,
+                                                   str(ids['Korneel']): -13, str(ids['Mieke']): -13, str(ids['Jan']): 0})
+        self.assertEqual(data['totals'][str(ids['Piet'])], 39)
+        self.assertEqual((data['dealer_id'], data['sitter_id']), (ids['Piet'], ids['Piet']))
+        self.assertIn('<tr data-round-id', data['round']['html'])
+        first_round = data['round']['id']
+
+        response = self.app.post(f'{table}/round/add', data=dict(solo, main_player=ids['Jan']), headers=as_json)
+        self.assertEqual(response.get_json()['totals'][str(ids['Jan'])], 39)
+
+        response = self.app.post(f'{table}/round/update/{first_round}', headers=as_json,
+                                 data=dict(solo, main_player=ids['Piet'], result='Verloren'))
+        data = response.get_json()
+        self.assertEqual(data['round']['scores'][str(ids['Piet'])], -39)
+        self.assertEqual(data['totals'][str(ids['Piet'])], -39)
+
+        # Invalid rounds and unknown rounds are reported as JSON errors
+        response = self.app.post(f'{table}/round/add', data=dict(solo, main_player=ids['Joris'], tricks='3'), headers=as_json)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.get_json()['error'].startswith('Error:'))
+        self.assertEqual(self.app.post(f'{table}/round/delete/9999', headers=as_json).status_code, 404)
+
+        data = self.app.post(f'{table}/round/delete/{first_round}', headers=as_json).get_json()
+        self.assertEqual((data['round_id'], data['round_number']), (first_round, 1))
+        self.assertEqual(data['totals'][str(ids['Jan'])], 39)
+        self.assertEqual(data['sitter_id'], ids['Piet'])
+
+        data = self.app.post(f'{table}/round/undo', headers=as_json).get_json()
+        self.assertEqual(set(data['totals'].values()), {0})
+        self.assertEqual(data['dealer_id'], ids['Jan'])
+        self.assertEqual(self.app.post(f'{table}/round/undo', headers=as_json).status_code, 400)
+
+        # Form posts keep redirecting to the table
+        response = self.app.post(f'{table}/round/add', data=dict(solo, main_player=ids['Piet']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_conditional_get(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game = Game.query.first()
+            jan_id = next(p.id for p in game.players if p.name == 'Jan')
+        table = f'/table/{game.id}'
+        solo = {'contract': 'Solo', 'main_player': jan_id, 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'}
+        self.app.post(f'{table}/round/add', data=solo)
+        with app.app_context():
+            round_id = Round.query.filter_by(game_id=game.id).one().id
+
+        urls = ['/', table, f'/round/edit/{round_id}', f'/game/{game.id}/rounds', f'/game/{game.id}/events',
+                f'/game/{game.id}/standings']
+        etags = {}
+        for url in urls:
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+            etags[url] = response.headers['ETag']
+            self.assertFalse(etags[url].startswith('W/'))
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            for url in urls:
+                response = self.app.get(url, headers={'If-None-Match': etags[url]})
+                self.assertEqual(response.status_code, 304, url)
+                self.assertEqual(response.headers['ETag'], etags[url])
+                self.assertEqual(response.data, b'')
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        # Only the game (and for the edit form, the round) was looked up
+        self.assertFalse([s for s in statements if 'FROM score' in s or 'FROM player' in s])
+
+        # Every round change bumps the version and with it every tag
+        self.app.post(f'{table}/round/update/{round_id}', data=dict(solo, result='Verloren'))
+        self.app.post(f'{table}/round/add', data=solo)
+        self.app.post(f'{table}/round/undo')
+        with app.app_context():
+            self.assertEqual(db.session.get(Game, game.id).version, 4)
+        for url in urls:
+            response = self.app.get(url, headers={'If-None-Match': etags[url]})
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response.headers['ETag'], etags[url])
+
+    def test_rules_cache(self):
+        self.app.post('/game/start', follow_redirects=True)
+        with app.app_context():
+            game_id = Game.query.order_by(Game.id.desc()).first().id
+            self.assertEqual(get_rules(game_id)[('Solo', True, False)].points, 13)
+
+            statements = []
+
+            def record(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                rules = get_rules(game_id)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            self.assertEqual(statements, [])
+            with self.assertRaises(TypeError):
+                rules[('Solo', True, False)] = None
+
+            # Writing the config drops the cached table
+            ContractConfig.query.filter_by(game_id=game_id).first().solo_points = 15
+            db.session.commit()
+            self.assertEqual(get_rules(game_id)[('Solo', True, False)].points, 15)
+
+        # Another app (and database) in the same process has its own cache
+        other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        with other.app_context():
+            db.create_all()
+            db.session.add(Game(id=game_id, config=ContractConfig(solo_points=20)))
+            db.session.commit()
+            self.assertEqual(get_rules(game_id)[('Solo', True, False)].points, 20)
+            db.session.remove()
+        with app.app_context():
+            self.assertEqual(get_rules(game_id)[('Solo', True, False)].points, 15)
+
     def test_db_recovery(self):
         # Ensure we are using a file-based DB for this test, or skip if memory
         # app.config['SQLALCHEMY_DATABASE_URI'] is set to memory in setUp
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from app import create_app, db, Game
+from archive import archive_games, restore_game
+from models import ArchivedGame, Round
+from round_log import replay
+from test_round_log import stored_totals
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+TABLES = ('round', 'score', 'miserie_participation', 'round_event', 'game_snapshot')
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.tmp = tempfile.TemporaryDirectory()
+        app.config['ARCHIVE_DIR'] = self.tmp.name
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.tmp.cleanup()
+
+    def play(self, names, started, rounds=4, end=True):
+        """A game with a Miserie round, an edit and a delete; ends it and dates it ``started``."""
+        self.app.post('/game/start', data={'player_name': names})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            game_id, ids = game.id, [p.id for p in sorted(game.players, key=lambda p: p.id)]
+        table = f'/table/{game_id}'
+        self.app.post(f'{table}/round/add', data={
+            'contract': 'Miserie', 'result': 'Gewonnen', 'tricks': '0',
+            f'miserie_play_{ids[0]}': '1', f'miserie_result_{ids[0]}': 'Gewonnen',
+            f'miserie_play_{ids[1]}': '1', f'miserie_result_{ids[1]}': 'Verloren',
+        })
+        for number in range(rounds - 1):
+            self.app.post(f'{table}/round/add', data={
+                'contract': 'Solo', 'main_player': ids[number % 4], 'result': 'Gewonnen',
+                'trump_suit': 'harten', 'tricks': '0'
+            })
+        with app.app_context():
+            first, second = [r.id for r in Round.query.filter_by(game_id=game_id).order_by(Round.round_number)][1:3]
+        self.app.post(f'{table}/round/update/{first}', data={
+            'contract': 'Abondance', 'main_player': ids[2], 'result': 'Verloren', 'trump_suit': 'ruiten', 'tricks': '1'
+        })
+        self.app.post(f'{table}/round/delete/{second}')
+        if end:
+            self.app.post(f'{table}/end')
+        with app.app_context():
+            db.session.get(Game, game_id).date = started
+            db.session.commit()
+        return game_id
+
+    def rows(self, game_id):
+        """Every archived table's rows of a game, as stored."""
+        connection = db.session.connection()
+        rounds = 'SELECT id FROM round WHERE game_id = ?'
+        return {
+            'round': connection.exec_driver_sql('SELECT * FROM round WHERE game_id = ? ORDER BY id', (game_id,)).all(),
+            'score': connection.exec_driver_sql(
+                f'SELECT * FROM score WHERE round_id IN ({rounds}) ORDER BY id', (game_id,)).all(),
+            'miserie_participation': connection.exec_driver_sql(
+                f'SELECT * FROM miserie_participation WHERE round_id IN ({rounds}) ORDER BY round_id, player_id',
+                (game_id,)).all(),
+            'round_event': connection.exec_driver_sql(
+                'SELECT * FROM round_event WHERE game_id = ? ORDER BY seq', (game_id,)).all(),
+            'game_snapshot': connection.exec_driver_sql(
+                'SELECT * FROM game_snapshot WHERE game_id = ? ORDER BY seq', (game_id,)).all(),
+        }
+
+    def test_archive_list_and_restore(self):
+        old = self.play(['Jan', 'Piet', 'Joris', 'Korneel'], datetime(2023, 3, 1))
+        older_season = self.play(['An', 'Bert', 'Cas', 'Dirk'], datetime(2024, 2, 1))
+        recent = self.play(['Jan', 'Piet', 'Joris', 'Korneel'], datetime(2025, 6, 1))
+        active = self.play(['Eva', 'Fien', 'Gust', 'Hans'], datetime(2023, 1, 1), end=False)
+        etags = [self.app.get(f'/game/{old}/rounds').headers['ETag']]
+        with app.app_context():
+            before = {game_id: self.rows(game_id) for game_id in (old, older_season, recent, active)}
+            self.assertTrue(before[old]['miserie_participation'] and before[old]['round_event'])
+
+            self.assertEqual(archive_games(datetime(2025, 1, 1), self.tmp.name), [old, older_season])
+            self.assertEqual(archive_games(datetime(2025, 1, 1), self.tmp.name), [])
+            for game_id in (old, older_season):
+                self.assertEqual(self.rows(game_id), {table: [] for table in TABLES})
+            for game_id in (recent, active):
+                self.assertEqual(self.rows(game_id), before[game_id])
+            self.assertEqual(sorted(os.listdir(self.tmp.name)), ['2023.ndjson.gz', '2024.ndjson.gz'])
+
+        # Clients holding the rounds from before the move do not get a 304
+        archived = self.app.get(f'/game/{old}/rounds', headers={'If-None-Match': etags[0]})
+        self.assertEqual((archived.status_code, archived.get_json()['rounds']), (200, []))
+        etags.append(archived.headers['ETag'])
+
+        listed = self.app.get('/archive').get_json()['games']
+        self.assertEqual([(g['game_id'], g['season'], g['rounds']) for g in listed],
+                         [(old, '2023', 3), (older_season, '2024', 3)])
+        self.assertEqual(listed[0]['players'], ['Jan', 'Piet', 'Joris', 'Korneel'])
+        season = self.app.get('/archive?season=2024').get_json()['games']
+        self.assertEqual([g['game_id'] for g in season], [older_season])
+
+        response = self.app.post(f'/archive/{old}/restore')
+        self.assertEqual(response.get_json(), {'game_id': old})
+        self.assertEqual(self.app.post(f'/archive/{old}/restore').status_code, 404)
+        with app.app_context():
+            self.assertEqual(self.rows(old), before[old])
+            self.assertEqual(replay(old).totals, stored_totals(old))
+            self.assertIsNone(db.session.get(ArchivedGame, old))
+        self.assertEqual(os.listdir(self.tmp.name), ['2024.ndjson.gz'])
+        restored = self.app.get(f'/game/{old}/rounds', headers={'If-None-Match': etags[1]})
+        self.assertEqual((restored.status_code, len(restored.get_json()['rounds'])), (200, 3))
+        self.assertNotIn(restored.headers['ETag'], etags)
+
+    def test_restore_after_ids_were_reused(self):
+        finished = self.play(['Jan', 'Piet', 'Joris', 'Korneel'], datetime(2023, 3, 1))
+        with app.app_context():
+            archived = self.rows(finished)
+            archive_games(datetime(2024, 1, 1), self.tmp.name)
+        # The archived rounds had the highest ids: SQLite hands them out again
+        active = self.play(['An', 'Bert', 'Cas', 'Dirk'], datetime(2024, 2, 1), end=False)
+        with app.app_context():
+            reused = {row.id for row in self.rows(active)['round']} & {row.id for row in archived['round']}
+            self.assertTrue(reused)
+
+            restore_game(finished, self.tmp.name)
+            restored = self.rows(finished)
+            self.assertEqual(len(restored['round']), len(archived['round']))
+            self.assertFalse({row.id for row in restored['round']} & {row.id for row in self.rows(active)['round']})
+            # Scores, participations and events moved along with their round
+            self.assertEqual({row.round_id for row in restored['score']}, {row.id for row in restored['round']})
+            self.assertLessEqual({row.round_id for row in restored['miserie_participation']},
+                                 {row.id for row in restored['round']})
+            added = {row.round_id for row in restored['round_event'] if row.kind == 'round_added'}
+            self.assertLessEqual({row.id for row in restored['round']}, added)
+            def points(rows):
+                return [(row.player_id, row.points_change, row.current_total) for row in rows]
+            self.assertEqual(points(restored['score']), points(archived['score']))
+            self.assertEqual(replay(finished).totals, stored_totals(finished))
+            self.assertEqual(replay(active).totals, stored_totals(active))
+
+
+if __name__ == '__main__':
+    unittest.main()
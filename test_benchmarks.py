@@ -0,0 +1,56 @@
+import io
+import unittest
+from collections import Counter
+
+from app import create_app, db
+from benchmarks.bench_rounds import compare
+from benchmarks.generator import edit_session, generate_games, to_jsonl
+from importer import import_games
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+class GeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_generated_games_are_valid(self):
+        rows = list(generate_games(7, 6, 200))
+        self.assertEqual(rows, list(generate_games(7, 6, 200)))
+        self.assertEqual({len(row['players']) for row in rows}, {4, 5})
+        contracts = Counter(row['contract'] for row in rows)
+        self.assertGreater(contracts['Vraag'], contracts['Solo'])
+        self.assertTrue(any(len(row['miserie']) > 1 for row in rows))
+
+        # Every round passes the same validation as /round/add
+        with app.app_context():
+            summary = import_games(io.StringIO(to_jsonl(rows)), 'jsonl')
+        self.assertEqual(summary['rounds'], 1200)
+
+    def test_edit_session(self):
+        operations = list(edit_session(3, 500, ['Jan', 'Piet', 'Joris', 'Korneel']))
+        kinds = Counter(operation[0] for operation in operations)
+        self.assertGreater(kinds['edit'], 0)
+        self.assertGreater(kinds['delete'], 0)
+        played = 0
+        for operation in operations:
+            if operation[0] == 'add':
+                played += 1
+            else:
+                self.assertTrue(1 <= operation[1] <= played)
+                played -= operation[0] == 'delete'
+
+    def test_compare_thresholds(self):
+        baseline = {'index': {'10': 5.0, '10000': 50.0}}
+        self.assertEqual(compare({'index': {'10': 6.5, '10000': 60.0}}, baseline), [])
+        self.assertEqual(compare({'index': {'10': 5.0, '10000': 70.0}}, baseline), [('index', '10000', 50.0, 70.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,12 @@ Manual verification test for configurable contract points.
 This script tests the core functionality without running the full Flask app.
 """
 
-from app import app, db, Game, Player, Round, Score, ContractConfig
+from app import create_app, db, Game, Player, Round, Score, ContractConfig
 from app import get_contract_config, get_contract_points, get_trick_limits
 
+# An in-memory database, so running this never creates wiezen.db
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
 def test_config_creation():
     """Test that default config is created with new game."""
     with app.app_context():
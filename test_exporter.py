@@ -0,0 +1,116 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from app import create_app, db, Game, Player, PlayerStanding
+from archive import ArchiveError, archive_games
+from exporter import archived_game_ids, export_lines, iter_rounds
+from importer import import_games
+from test_importer import CSV_SHEET
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+class ExporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            self.games = import_games(io.StringIO(CSV_SHEET), 'csv')['games']
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_iter_rounds(self):
+        with app.app_context():
+            # A batch size of 2 forces the merged streams across several batches
+            records = list(iter_rounds(batch_size=2))
+        self.assertEqual([(r['game'], r['round_number']) for r in records],
+                         [(self.games[0], 1), (self.games[0], 2), (self.games[0], 3),
+                          (self.games[1], 1), (self.games[1], 2)])
+        first, _, miserie, solo, _ = records
+        self.assertEqual(first['players'], ['Jan', 'Piet', 'Joris', 'Korneel'])
+        jan, piet, joris, korneel = first['player_ids']
+        self.assertEqual((first['main_player'], first['partner'], first['dealer']), ('Jan', 'Piet', 'Jan'))
+        self.assertEqual(first['points'], {jan: 4, piet: 4, joris: -4, korneel: -4})
+        self.assertEqual(miserie['miserie'], {'Jan': 'Gewonnen', 'Piet': 'Verloren'})
+        self.assertEqual(miserie['totals'], {jan: 50, piet: -54, joris: 2, korneel: 2})
+        self.assertEqual((solo['sitter'], solo['points'][solo['player_ids'][0]]), ('An', 0))
+
+    def test_players_with_the_same_name(self):
+        self.app.post('/game/start', data={'player_name': ['Mieke', 'Tom', 'Mieke', 'Wout']})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            game_id, ids = game.id, [p.id for p in sorted(game.players, key=lambda p: p.id)]
+        self.app.post(f'/table/{game_id}/round/add', data={
+            'contract': 'Solo', 'main_player': ids[0], 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'
+        })
+        with app.app_context():
+            record, = iter_rounds(player='Wout')
+            line = json.loads(''.join(export_lines('ndjson', player='Wout')))
+        self.assertEqual((record['players'], record['player_ids']), (['Mieke', 'Tom', 'Mieke', 'Wout'], ids))
+        # Both Miekes keep their own points
+        self.assertEqual(record['points'], {ids[0]: 39, ids[1]: -13, ids[2]: -13, ids[3]: -13})
+        self.assertEqual(line['totals'], {str(ids[0]): 39, str(ids[1]): -13, str(ids[2]): -13, str(ids[3]): -13})
+
+    def test_filters(self):
+        with app.app_context():
+            self.assertEqual({r['game'] for r in iter_rounds(player='bert')}, {self.games[1]})
+            self.assertEqual({r['game'] for r in iter_rounds(date_from=date(2024, 1, 5), date_to=date(2024, 1, 5))},
+                             {self.games[0]})
+            self.assertEqual(list(iter_rounds(date_from=date(2025, 1, 1))), [])
+
+    def test_archived_games(self):
+        with app.app_context(), tempfile.TemporaryDirectory() as directory:
+            before = list(iter_rounds())
+            self.assertEqual(archive_games(datetime(2024, 1, 6), directory), [self.games[0]])
+            # Left out by default, but reported
+            self.assertEqual({r['game'] for r in iter_rounds()}, {self.games[1]})
+            self.assertEqual(archived_game_ids(), [self.games[0]])
+            self.assertEqual(archived_game_ids(player='Bert'), [])
+
+            # Read back from the season file, after the games still in the database
+            records = list(iter_rounds(archive_dir=directory))
+            self.assertEqual(records, before[3:] + before[:3])
+            self.assertEqual(list(iter_rounds(player='Bert', archive_dir=directory)), before[3:])
+            app.config['ARCHIVE_DIR'] = directory
+            self.assertEqual(self.app.get('/export').get_data(as_text=True).count('\n'), 2)
+            self.assertEqual(self.app.get('/export?archived=1').get_data(as_text=True).count('\n'), 5)
+
+            os.remove(os.path.join(directory, '2024.ndjson.gz'))
+            with self.assertRaises(ArchiveError):
+                list(iter_rounds(archive_dir=directory))
+
+    def test_csv_export_can_be_imported_again(self):
+        with app.app_context():
+            sheet = ''.join(export_lines('csv'))
+            reimported = import_games(io.StringIO(sheet), 'csv')['games']
+            totals = [
+                dict(db.session.query(Player.name, PlayerStanding.total).join(
+                    PlayerStanding, PlayerStanding.player_id == Player.id
+                ).filter(Player.game_id == game_id))
+                for game_id in self.games + reimported
+            ]
+        self.assertEqual(totals[:2], totals[2:])
+
+    def test_export_endpoint(self):
+        response = self.app.get('/export?player=Jan')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(lines), 3)
+
+        response = self.app.get('/export?format=csv&from=2024-01-06')
+        self.assertEqual(response.get_data(as_text=True).count('\n'), 3)
+
+        self.assertEqual(self.app.get('/export?from=gisteren').status_code, 400)
+        self.assertEqual(self.app.get('/export?format=xml').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+from app import create_app, db, Game, Round, Score, recalculate_scores_from_round
+from fragments import FragmentCache, _size
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+def row(round_id, html='<tr></tr>'):
+    return {'id': round_id, 'scores': {1: 0}, 'html': html}
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    def test_lru_within_budget(self):
+        cache = FragmentCache(budget=3 * _size(row(1)))
+        for round_id in (1, 2, 3):
+            cache.put(round_id, 0, row(round_id))
+        self.assertIsNotNone(cache.get(1, 0))  # 2 is now the least recently used
+        cache.put(4, 0, row(4))
+
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.size, cache.budget)
+        self.assertIsNone(cache.get(2, 0))
+        self.assertIsNotNone(cache.get(3, 0))
+
+        # Other versions miss; invalidated and oversized rows are not kept
+        self.assertIsNone(cache.get(1, 1))
+        cache.invalidate([1, 99])
+        self.assertIsNone(cache.get(1, 0))
+        cache.put(5, 0, row(5, 'x' * cache.budget))
+        self.assertIsNone(cache.get(5, 0))
+        self.assertEqual(cache.size, sum(_size(row(i)) for i in (3, 4)))
+
+
+class HistoryRowCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.cache = app.extensions['fragments']
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel']})
+        with app.app_context():
+            game = Game.query.first()
+            self.game_id, self.ids = game.id, {p.name: p.id for p in game.players}
+        self.table = f'/table/{self.game_id}'
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, contract='Solo', player='Jan', result='Gewonnen'):
+        self.app.post(f'{self.table}/round/add', data={
+            'contract': contract, 'main_player': self.ids[player], 'result': result,
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+
+    def rows(self):
+        """``{round_number: html}`` and how many rows were rendered for it."""
+        misses = self.cache.misses
+        page = self.app.get(f'/game/{self.game_id}/rounds?limit=100').get_json()
+        return {r['round_number']: r['html'] for r in page['rounds']}, self.cache.misses - misses
+
+    def round_id(self, number):
+        with app.app_context():
+            return Round.query.filter_by(game_id=self.game_id, round_number=number).one().id
+
+    def test_only_changed_rows_are_rendered(self):
+        for _ in range(5):
+            self.add()
+        self.cache.clear()
+        cold, rendered = self.rows()
+        self.assertEqual(rendered, 5)
+        warm, rendered = self.rows()
+        self.assertEqual((warm, rendered), (cold, 0))
+        self.assertEqual(self.app.get('/').get_data(as_text=True).count('data-round-id='), 5)
+        self.assertEqual(self.rows()[1], 0)
+
+        self.app.post(f'{self.table}/round/update/{self.round_id(2)}', data={
+            'contract': 'Abondance', 'main_player': self.ids['Piet'], 'result': 'Verloren',
+            'trump_suit': 'ruiten', 'tricks': '0'
+        })
+        edited, rendered = self.rows()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Abondance', edited[2])
+        self.assertEqual({n: edited[n] for n in (1, 3, 4, 5)}, {n: cold[n] for n in (1, 3, 4, 5)})
+
+        # Deleting round 3 renumbers (and re-renders) only rounds 4 and 5
+        self.app.post(f'{self.table}/round/delete/{self.round_id(3)}')
+        deleted, rendered = self.rows()
+        self.assertEqual(rendered, 2)
+        self.assertEqual(sorted(deleted), [1, 2, 3, 4])
+        self.assertIn('<td>#3</td>', deleted[3])
+
+        # Cached rows are the rows a cold cache renders
+        self.cache.clear()
+        self.assertEqual(self.rows()[0], deleted)
+
+    def test_reused_round_id_is_not_served_stale(self):
+        self.add()
+        self.add('Solo', 'Jan')
+        self.rows()
+        last_id = self.round_id(2)
+        self.app.post(f'{self.table}/round/undo')
+        self.add('Abondance', 'Piet', 'Verloren')
+
+        self.assertEqual(self.round_id(2), last_id)  # SQLite hands out the id again
+        rows, rendered = self.rows()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Abondance', rows[2])
+
+    def test_recalculation_rerenders_its_rounds(self):
+        for _ in range(3):
+            self.add()
+        with app.app_context():
+            # Scores from a half-finished write, as the recalculation fallback finds them
+            db.session.execute(db.update(Score).where(
+                Score.round_id.in_([self.round_id(2), self.round_id(3)])
+            ).values(points_change=Score.points_change + 100))
+            db.session.commit()
+        broken, _ = self.rows()
+
+        with app.app_context():
+            recalculate_scores_from_round(self.game_id, 2)
+        fixed, rendered = self.rows()
+        self.assertEqual(rendered, 2)
+        self.assertNotEqual(fixed[3], broken[3])
+        self.cache.clear()
+        self.assertEqual(self.rows()[0], fixed)
+
+    def test_one_table_listener_for_all_apps(self):
+        listeners = len(Round.__table__.dispatch.after_create)
+        create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.assertEqual(len(Round.__table__.dispatch.after_create), listeners)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import json
+import unittest
+
+from app import create_app, db, Game, Player, Round, Score, PlayerStanding
+from importer import ScoreSheetError, import_games
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+CSV_SHEET = """game,date,players,contract,result,tricks,trump_suit,main_player,partner,miserie
+a,2024-01-05,Jan;Piet;Joris;Korneel,Vraag,Gewonnen,2,harten,Jan,Piet,
+a,,Jan;Piet;Joris;Korneel,Abondance,Verloren,1,klaveren,Piet,,
+a,,Jan;Piet;Joris;Korneel,Miserie,,0,,,,Jan:Gewonnen;Piet:Verloren
+b,2024-01-12,An;Bert;Cas;Dirk;Els,Solo,Gewonnen,0,schoppen,Bert,,
+b,,An;Bert;Cas;Dirk;Els,Grote Miserie,,,,,,An:Verloren
+"""
+
+
+class ImporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def totals(self, game_id):
+        rows = db.session.query(Player.name, PlayerStanding.total).join(
+            PlayerStanding, PlayerStanding.player_id == Player.id
+        ).filter(Player.game_id == game_id)
+        return dict(rows)
+
+    def test_import_csv(self):
+        with app.app_context():
+            summary = import_games(io.StringIO(CSV_SHEET), 'csv')
+            self.assertEqual(summary['rounds'], 5)
+            first, second = summary['games']
+
+            # Same totals as test_game_flow after its Vraag, Abondance and Miserie rounds
+            self.assertEqual(self.totals(first), {'Jan': 50, 'Piet': -54, 'Joris': 2, 'Korneel': 2})
+            # Round 1: An sits out, Bert wins Solo. Round 2: Bert sits out, An loses Grote Miserie
+            self.assertEqual(self.totals(second), {'An': -60, 'Bert': 39, 'Cas': 7, 'Dirk': 7, 'Els': 7})
+
+            game = db.session.get(Game, second)
+            self.assertFalse(game.is_active)
+            self.assertEqual(game.date.year, 2024)
+            rounds = Round.query.filter_by(game_id=second).order_by(Round.round_number).all()
+            self.assertEqual([r.sitter_id for r in rounds], [p.id for p in sorted(game.players, key=lambda p: p.id)][:2])
+            last_scores = {s.player_id: s.current_total for s in rounds[-1].scores}
+            self.assertEqual(sorted(last_scores.values()), sorted(self.totals(second).values()))
+
+    def test_import_jsonl(self):
+        lines = [
+            {'game': 1, 'players': ['Jan', 'Piet', 'Joris', 'Korneel'], 'contract': 'Troel', 'result': 'Gewonnen',
+             'trump_suit': 'Harten', 'main_player': 'Joris', 'partner': 'Korneel'},
+            {'game': 1, 'players': ['Jan', 'Piet', 'Joris', 'Korneel'], 'contract': 'Miserie',
+             'miserie': {'Jan': 'Gewonnen'}},
+        ]
+        with app.app_context():
+            summary = import_games(io.StringIO('\n'.join(json.dumps(line) for line in lines)), 'jsonl')
+            self.assertEqual(self.totals(summary['games'][0]), {'Jan': 28, 'Piet': -12, 'Joris': -8, 'Korneel': -8})
+
+    def test_invalid_row_keeps_earlier_games(self):
+        sheet = CSV_SHEET + "c,,Jan;Piet;Joris;Korneel,Abondance,Gewonnen,7,harten,Jan,,\n"
+        with app.app_context():
+            with self.assertRaises(ScoreSheetError) as ctx:
+                import_games(io.StringIO(sheet), 'csv')
+            self.assertEqual(ctx.exception.line, 7)
+            self.assertIn('Maximaal 4 extra slagen', str(ctx.exception))
+            self.assertEqual(len(ctx.exception.summary['games']), 2)
+            self.assertEqual(Game.query.count(), 2)
+            self.assertEqual(Score.query.count(), 4 * 3 + 5 * 2)
+
+    def test_upload_endpoint(self):
+        response = self.app.post('/import', data={
+            'file': (io.BytesIO(CSV_SHEET.encode('utf-8')), 'avond.csv')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['rounds'], 5)
+
+        response = self.app.post('/import', data={
+            'file': (io.BytesIO(b'x'), 'avond.xlsx')
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import json
+import threading
+import unittest
+
+from app import create_app, db, Game
+from live import Broadcaster, StreamLimitReached
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+def parse_events(text):
+    """``[(id, event, data)]`` of the events in a chunk of SSE text."""
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class LiveScoreboardTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+        self.app.post('/game/start')
+        with app.app_context():
+            game = Game.query.first()
+            self.game_id = game.id
+            self.players = {p.name: p.id for p in game.players}
+        self.table = f'/table/{self.game_id}'
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_solo(self, player, result='Gewonnen'):
+        self.app.post(f'{self.table}/round/add', data={
+            'contract': 'Solo', 'main_player': self.players[player], 'result': result,
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+
+    def open_stream(self, **params):
+        response = self.app.get(f'/game/{self.game_id}/live', query_string=params, buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertTrue(next(chunks).startswith(b'retry:'))
+        return response, chunks
+
+    def test_round_changes_are_pushed(self):
+        response, chunks = self.open_stream()
+        try:
+            self.add_solo('Jan')
+            [(first_id, name, data)] = parse_events(next(chunks).decode())
+            self.assertEqual(name, 'round_added')
+            self.assertEqual(data['round']['round_number'], 1)
+            self.assertIn(f'data-round-id="{data["round"]["id"]}"', data['round']['html'])
+            self.assertEqual(data['totals'][str(self.players['Jan'])], 39)
+            self.assertEqual(data['dealer_id'], self.players['Piet'])
+            round_id = data['round']['id']
+
+            self.app.post(f'{self.table}/round/update/{round_id}', data={
+                'contract': 'Solo', 'main_player': self.players['Jan'], 'result': 'Verloren',
+                'trump_suit': 'harten', 'tricks': '0'
+            })
+            [(_, name, data)] = parse_events(next(chunks).decode())
+            self.assertEqual(name, 'round_updated')
+            self.assertEqual(data['round']['id'], round_id)
+            self.assertEqual(data['totals'][str(self.players['Jan'])], -39)
+
+            self.add_solo('Piet')
+            next(chunks)
+            self.app.post(f'{self.table}/round/delete/{round_id}')
+            [(_, name, data)] = parse_events(next(chunks).decode())
+            self.assertEqual((name, data['round_id'], data['round_number']), ('round_deleted', round_id, 1))
+            self.assertEqual(data['totals'][str(self.players['Jan'])], -13)
+            self.assertEqual(data['dealer_id'], self.players['Piet'])
+
+            self.app.post(f'{self.table}/round/undo')
+            [(last_id, name, data)] = parse_events(next(chunks).decode())
+            self.assertEqual(name, 'round_deleted')
+            self.assertEqual(set(data['totals'].values()), {0})
+            self.assertEqual(last_id, first_id + 4)
+        finally:
+            response.close()
+
+    def test_page_replays_changes_since_render(self):
+        response, chunks = self.open_stream()
+        try:
+            page = self.app.get(self.table).get_data(as_text=True)
+            self.assertIn('let lastAppliedEventId = 0;', page)
+            self.add_solo('Jan')
+            self.add_solo('Piet')
+        finally:
+            response.close()
+
+        # A page rendered before both rounds gets them when its stream connects
+        response, chunks = self.open_stream(last_event_id=0)
+        try:
+            events = parse_events(next(chunks).decode())
+            self.assertEqual([(event_id, name) for event_id, name, _ in events], [(1, 'round_added'), (2, 'round_added')])
+        finally:
+            response.close()
+
+    def test_unwatched_changes_reset_stale_pages(self):
+        # Nobody is listening: no payload is built, and older cursors must reload
+        self.add_solo('Jan')
+        response, chunks = self.open_stream(last_event_id=0)
+        try:
+            [(_, name, _)] = parse_events(next(chunks).decode())
+            self.assertEqual(name, 'reset')
+        finally:
+            response.close()
+
+
+    def test_streams_over_the_limit_get_503(self):
+        live = app.extensions['live']
+        limit, live.max_streams = live.max_streams, 1
+        try:
+            response, _ = self.open_stream()
+            refused = self.app.get(f'/game/{self.game_id}/live')
+            self.assertEqual((refused.status_code, refused.headers['Retry-After']), (503, '3'))
+            response.close()
+            response, _ = self.open_stream()
+            response.close()
+            self.assertEqual(live.open_streams, 0)
+        finally:
+            live.max_streams = limit
+
+
+class BroadcasterTestCase(unittest.TestCase):
+    def test_fan_out_to_idle_streams(self):
+        broadcaster = Broadcaster(heartbeat=5, max_streams=None)
+        builds = []
+        streams = [broadcaster.stream(1) for _ in range(200)]
+        for stream in streams:
+            next(stream)  # retry field
+
+        received = []
+        def read(stream):
+            received.append(next(stream))
+        readers = [threading.Thread(target=read, args=(stream,)) for stream in streams]
+        for reader in readers:
+            reader.start()
+        broadcaster.publish(1, 'round_added', lambda: builds.append(1) or {'round': 7})
+        for reader in readers:
+            reader.join(5)
+
+        # The payload is built and serialized once for every listener
+        self.assertEqual(builds, [1])
+        self.assertEqual(received, ['id: 1\nevent: round_added\ndata: {"round": 7}\n\n'] * 200)
+        for stream in streams:
+            stream.close()
+        self.assertEqual(broadcaster._channel(1).subscribers, 0)
+
+    def test_stream_limit(self):
+        broadcaster = Broadcaster(max_streams=2)
+        first, second = broadcaster.stream(1), broadcaster.stream(2)
+        with self.assertRaises(StreamLimitReached):
+            broadcaster.stream(1)
+        # Closed before its first chunk was sent: the slot is freed all the same
+        first.close()
+        third = broadcaster.stream(1)
+        next(third)
+        self.assertEqual(broadcaster._channel(1).subscribers, 1)
+        second.close()
+        third.close()
+        self.assertEqual((broadcaster.open_streams, broadcaster._channel(1).subscribers), (0, 0))
+
+    def test_heartbeat_and_backlog(self):
+        broadcaster = Broadcaster(backlog_size=2, heartbeat=0.01)
+        stream = broadcaster.stream(1)
+        next(stream)
+        self.assertEqual(next(stream), ': keepalive\n\n')
+        for number in range(3):
+            broadcaster.publish(1, 'round_added', lambda: {'n': number})
+        # Event 1 fell out of the backlog: a client at cursor 0 must reload
+        late = broadcaster.stream(1, 0)
+        next(late)
+        self.assertEqual(parse_events(next(late))[0][1], 'reset')
+        caught_up = broadcaster.stream(1, 1)
+        next(caught_up)
+        self.assertEqual([event[0] for event in parse_events(next(caught_up))], [2, 3])
+        stream.close()
+        caught_up.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
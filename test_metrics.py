@@ -0,0 +1,86 @@
+import re
+import unittest
+
+from app import create_app, db, Game
+from metrics import Metrics
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+def sample(text, name, **labels):
+    """Value of one sample in Prometheus text output, or None."""
+    wanted = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{name}\{{{re.escape(wanted)}\}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        app.extensions['metrics'].__init__()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_scrape(self):
+        self.app.post('/game/start')
+        with app.app_context():
+            game = Game.query.first()
+            jan_id = next(p.id for p in game.players if p.name == 'Jan')
+        for _ in range(3):
+            self.app.post(f'/table/{game.id}/round/add', data={
+                'contract': 'Solo', 'main_player': jan_id, 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'
+            })
+        self.app.get(f'/table/{game.id}')
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_count', endpoint='add_round'), 3)
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_bucket', endpoint='add_round', le='+Inf'), 3)
+        self.assertEqual(sample(text, 'wiezen_requests_total', endpoint='add_round', method='POST', status='302'), 3)
+        self.assertEqual(sample(text, 'wiezen_requests_total', endpoint='index', method='GET', status='200'), 1)
+        self.assertGreater(sample(text, 'wiezen_sql_statements_total', endpoint='add_round'), 3)
+        self.assertGreater(sample(text, 'wiezen_sql_duration_seconds_total', endpoint='index'), 0)
+        # The scrape itself is recorded after its body is rendered
+        self.assertIsNone(sample(text, 'wiezen_request_duration_seconds_count', endpoint='metrics'))
+
+    def test_event_streams_are_timed_apart(self):
+        self.app.post('/game/start')
+        with app.app_context():
+            game_id = Game.query.first().id
+        response = self.app.get(f'/game/{game_id}/live', buffered=False)
+        next(response.response)  # retry field
+        text = self.app.get('/metrics').get_data(as_text=True)
+        self.assertEqual(sample(text, 'wiezen_streams_open', endpoint='live_scoreboard'), 1)
+        response.close()
+
+        text = self.app.get('/metrics').get_data(as_text=True)
+        self.assertIsNone(sample(text, 'wiezen_request_duration_seconds_count', endpoint='live_scoreboard'))
+        self.assertEqual(
+            sample(text, 'wiezen_requests_total', endpoint='live_scoreboard', method='GET', status='200'), 1)
+        self.assertEqual(sample(text, 'wiezen_streams_open', endpoint='live_scoreboard'), 0)
+        self.assertEqual(sample(text, 'wiezen_stream_duration_seconds_count', endpoint='live_scoreboard'), 1)
+        self.assertGreater(sample(text, 'wiezen_stream_duration_seconds_sum', endpoint='live_scoreboard'), 0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe('index', 'GET', 200, 0.05, statements=4, sql_seconds=0.01)
+        metrics.observe('index', 'GET', 200, 0.5)
+        metrics.observe('index', 'GET', 200, 3.0)
+        text = metrics.render()
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_bucket', endpoint='index', le='0.1'), 1)
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_bucket', endpoint='index', le='1.0'), 2)
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_bucket', endpoint='index', le='+Inf'), 3)
+        self.assertEqual(sample(text, 'wiezen_request_duration_seconds_sum', endpoint='index'), 3.55)
+        self.assertEqual(sample(text, 'wiezen_sql_statements_total', endpoint='index'), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
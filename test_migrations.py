@@ -0,0 +1,308 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import MetaData, create_engine, inspect
+
+from migrations import upgrade, get_schema_version, LATEST_VERSION
+from models import (MiserieParticipation, Person, PlayerStanding, PlayerStat, PlayerContractStat, PlayerTrumpStat,
+                    RoundEvent)
+from round_log import GameState
+
+
+# The schema every database had before the first migration (the baseline models' create_all)
+BASELINE_SCHEMA = """
+CREATE TABLE game (
+    id INTEGER NOT NULL,
+    date DATETIME,
+    is_active BOOLEAN,
+    PRIMARY KEY (id)
+);
+CREATE TABLE player (
+    id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    game_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(game_id) REFERENCES game (id)
+);
+CREATE TABLE contract_config (
+    id INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    vraag_partner_points INTEGER NOT NULL,
+    vraag_solo_points INTEGER NOT NULL,
+    troel_points INTEGER NOT NULL,
+    abondance_points INTEGER NOT NULL,
+    solo_points INTEGER NOT NULL,
+    miserie_points INTEGER NOT NULL,
+    grote_miserie_points INTEGER NOT NULL,
+    vraag_partner_tricks_won_max INTEGER NOT NULL,
+    vraag_partner_tricks_lost_max INTEGER NOT NULL,
+    vraag_solo_tricks_won_max INTEGER NOT NULL,
+    vraag_solo_tricks_lost_max INTEGER NOT NULL,
+    troel_tricks_won_max INTEGER NOT NULL,
+    troel_tricks_lost_max INTEGER NOT NULL,
+    abondance_tricks_won_max INTEGER NOT NULL,
+    abondance_tricks_lost_max INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (game_id),
+    FOREIGN KEY(game_id) REFERENCES game (id)
+);
+CREATE TABLE round (
+    id INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    round_number INTEGER NOT NULL,
+    contract_type VARCHAR(50) NOT NULL,
+    result VARCHAR(50) NOT NULL,
+    trump_suit VARCHAR(20),
+    tricks INTEGER,
+    dealer_id INTEGER NOT NULL,
+    sitter_id INTEGER,
+    main_player_id INTEGER,
+    partner_id INTEGER,
+    miserie_participants TEXT,
+    timestamp DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(game_id) REFERENCES game (id),
+    FOREIGN KEY(dealer_id) REFERENCES player (id),
+    FOREIGN KEY(sitter_id) REFERENCES player (id),
+    FOREIGN KEY(main_player_id) REFERENCES player (id),
+    FOREIGN KEY(partner_id) REFERENCES player (id)
+);
+CREATE TABLE score (
+    id INTEGER NOT NULL,
+    round_id INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    points_change INTEGER NOT NULL,
+    current_total INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(round_id) REFERENCES round (id),
+    FOREIGN KEY(player_id) REFERENCES player (id)
+);
+"""
+
+
+class MigrationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine('sqlite:///' + os.path.join(self.tmp.name, 'old.db'))
+        # A database created before the first migration
+        with self.engine.begin() as connection:
+            for statement in BASELINE_SCHEMA.split(';'):
+                if statement.strip():
+                    connection.exec_driver_sql(statement)
+        self.old = MetaData()
+        self.old.reflect(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def index_names(self, table):
+        return {index['name'] for index in inspect(self.engine).get_indexes(table)}
+
+    def test_upgrade_adds_indexes(self):
+        self.assertEqual(self.index_names('score'), set())
+
+        self.assertEqual(upgrade(self.engine), list(range(1, LATEST_VERSION + 1)))
+
+        self.assertEqual(self.index_names('score'), {'ix_score_player_id_id', 'ix_score_round_id'})
+        self.assertEqual(self.index_names('round'), {'ix_round_game_id_round_number'})
+        self.assertEqual(self.index_names('game'), {'ix_game_is_active'})
+        self.assertEqual(self.index_names('player'), {'ix_player_game_id', 'ix_player_person_id'})
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), LATEST_VERSION)
+            plan = connection.exec_driver_sql(
+                'EXPLAIN QUERY PLAN SELECT * FROM score WHERE player_id = 1 ORDER BY id DESC LIMIT 1'
+            ).all()
+        self.assertIn('ix_score_player_id_id', plan[0][-1])
+
+    def test_backfill_player_standings(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}])
+            self.insert(connection, 'player', [{'id': 1, 'name': 'Jan', 'game_id': 1},
+                                                           {'id': 2, 'name': 'Piet', 'game_id': 1}])
+            self.insert(connection, 'round', [
+                {'id': 1, 'game_id': 1, 'round_number': 2, 'contract_type': 'Solo', 'result': 'Gewonnen', 'dealer_id': 1},
+                {'id': 2, 'game_id': 1, 'round_number': 1, 'contract_type': 'Solo', 'result': 'Gewonnen', 'dealer_id': 1},
+            ])
+            # Score ids out of round order: the total of round 2 must win
+            self.insert(connection, 'score', [
+                {'id': 1, 'round_id': 1, 'player_id': 1, 'points_change': 5, 'current_total': 12},
+                {'id': 2, 'round_id': 2, 'player_id': 1, 'points_change': 7, 'current_total': 7},
+            ])
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            rows = connection.execute(PlayerStanding.__table__.select().order_by('player_id')).all()
+        self.assertEqual([tuple(r) for r in rows], [(1, 12), (2, 0)])
+
+    def insert(self, connection, table, rows):
+        """Insert ``rows`` into ``table`` as it was in the old schema."""
+        connection.execute(self.old.tables[table].insert(), rows)
+
+    def set_miserie_json(self, connection, participants):
+        """Fill the JSON column from before ``miserie_participation``, with ``{round_id: json}``."""
+        for round_id, text in participants.items():
+            connection.exec_driver_sql('UPDATE round SET miserie_participants = ? WHERE id = ?', (text, round_id))
+
+    def test_backfill_player_stats(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}, {'id': 2}])
+            self.insert(connection, 'player', [
+                {'id': 1, 'name': 'Jan', 'game_id': 1}, {'id': 2, 'name': 'Piet', 'game_id': 1},
+                {'id': 3, 'name': 'JAN', 'game_id': 2},
+            ])
+            self.insert(connection, 'round', [
+                {'id': 1, 'game_id': 1, 'round_number': 1, 'contract_type': 'Solo', 'result': 'Gewonnen',
+                 'trump_suit': 'ruiten', 'main_player_id': 1, 'dealer_id': 1},
+                {'id': 2, 'game_id': 2, 'round_number': 1, 'contract_type': 'Miserie', 'result': 'Gewonnen',
+                 'trump_suit': None, 'main_player_id': None, 'dealer_id': 3},
+            ])
+            self.set_miserie_json(connection, {2: '{"3": "Gewonnen"}'})
+            self.insert(connection, 'score', [
+                {'round_id': 1, 'player_id': 1, 'points_change': 39, 'current_total': 39},
+                {'round_id': 1, 'player_id': 2, 'points_change': -13, 'current_total': -13},
+                {'round_id': 2, 'player_id': 3, 'points_change': 30, 'current_total': 30},
+            ])
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            jan, piet = (connection.exec_driver_sql('SELECT id FROM person WHERE name_key = ?', (key,)).scalar()
+                         for key in ('jan', 'piet'))
+            players = connection.execute(PlayerStat.__table__.select().order_by('rounds')).all()
+            contracts = connection.execute(PlayerContractStat.__table__.select().order_by('contract')).all()
+        self.assertEqual([tuple(r) for r in players], [(piet, 1, -13), (jan, 2, 69)])
+        self.assertEqual([tuple(r) for r in contracts], [(jan, 'Miserie', 1, 1), (jan, 'Solo', 1, 1)])
+
+    def test_key_player_stats_by_person(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}])
+            self.insert(connection, 'player', [{'id': 1, 'name': 'Jan', 'game_id': 1},
+                                               {'id': 2, 'name': 'Piet', 'game_id': 1}])
+        upgrade(self.engine)
+        # The statistics tables as steps 4 to 10 left them, keyed by normalized name
+        with self.engine.begin() as connection:
+            for table in ('player_stat', 'player_contract_stat', 'player_trump_stat'):
+                connection.exec_driver_sql(f'DROP TABLE {table}')
+            connection.exec_driver_sql(
+                'CREATE TABLE player_stat (player_key VARCHAR(50) NOT NULL, name VARCHAR(50) NOT NULL, '
+                'rounds INTEGER NOT NULL, points INTEGER NOT NULL, PRIMARY KEY (player_key))'
+            )
+            connection.exec_driver_sql(
+                'CREATE TABLE player_contract_stat (player_key VARCHAR(50) NOT NULL, contract VARCHAR(50) NOT NULL, '
+                'played INTEGER NOT NULL, won INTEGER NOT NULL, PRIMARY KEY (player_key, contract))'
+            )
+            connection.exec_driver_sql(
+                'CREATE TABLE player_trump_stat (player_key VARCHAR(50) NOT NULL, trump_suit VARCHAR(20) NOT NULL, '
+                'rounds INTEGER NOT NULL, PRIMARY KEY (player_key, trump_suit))'
+            )
+            connection.exec_driver_sql("INSERT INTO player_stat VALUES ('jan', 'JAN', 12, 40), ('piet', 'Piet', 12, -40)")
+            connection.exec_driver_sql("INSERT INTO player_contract_stat VALUES ('jan', 'Solo', 2, 1)")
+            connection.exec_driver_sql("INSERT INTO player_trump_stat VALUES ('piet', 'harten', 3)")
+            connection.exec_driver_sql('PRAGMA user_version = 10')
+
+        self.assertEqual(upgrade(self.engine), [11])
+
+        with self.engine.connect() as connection:
+            jan, piet = (connection.exec_driver_sql('SELECT id FROM person WHERE name_key = ?', (key,)).scalar()
+                         for key in ('jan', 'piet'))
+            players = connection.execute(PlayerStat.__table__.select().order_by('points')).all()
+            contracts = connection.execute(PlayerContractStat.__table__.select()).all()
+            trumps = connection.execute(PlayerTrumpStat.__table__.select()).all()
+        self.assertEqual([tuple(r) for r in players], [(piet, 12, -40), (jan, 12, 40)])
+        self.assertEqual([tuple(r) for r in contracts], [(jan, 'Solo', 2, 1)])
+        self.assertEqual([tuple(r) for r in trumps], [(piet, 'harten', 3)])
+        self.assertEqual({c['name'] for c in inspect(self.engine).get_columns('player_stat')},
+                         {'person_id', 'rounds', 'points'})
+
+    def test_backfill_people(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}, {'id': 2}])
+            self.insert(connection, 'player', [
+                {'id': 1, 'name': 'Jan', 'game_id': 1}, {'id': 2, 'name': 'Piet', 'game_id': 1},
+                {'id': 3, 'name': ' JAN ', 'game_id': 2},
+            ])
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            people = connection.execute(Person.__table__.select().order_by('name_key')).all()
+            seats = connection.exec_driver_sql('SELECT id, person_id FROM player ORDER BY id').all()
+        self.assertEqual([(p.name, p.name_key) for p in people], [(' JAN ', 'jan'), ('Piet', 'piet')])
+        jan, piet = (p.id for p in people)
+        self.assertEqual([tuple(s) for s in seats], [(1, jan), (2, piet), (3, jan)])
+        self.assertIn('ix_player_person_id', self.index_names('player'))
+
+    def test_backfill_round_log(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}])
+            self.insert(connection, 'player', [
+                {'id': pid, 'name': name, 'game_id': 1} for pid, name in enumerate(['Jan', 'Piet', 'Joris', 'Korneel'], 1)
+            ])
+            self.insert(connection, 'round', [
+                {'id': 7, 'game_id': 1, 'round_number': 2, 'contract_type': 'Abondance', 'result': 'Verloren',
+                 'main_player_id': 2, 'dealer_id': 2},
+                {'id': 5, 'game_id': 1, 'round_number': 1, 'contract_type': 'Solo', 'result': 'Gewonnen',
+                 'main_player_id': 1, 'dealer_id': 1},
+            ])
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            events = connection.execute(RoundEvent.__table__.select().order_by(RoundEvent.seq)).all()
+        self.assertEqual([(e.seq, e.kind, e.round_id) for e in events],
+                         [(1, 'config_applied', None), (2, 'round_added', 5), (3, 'round_added', 7)])
+        state = GameState()
+        for event in events:
+            state.apply(event.seq, event.kind, json.loads(event.payload))
+        # Default config: Solo won 13 from each opponent, Abondance lost 5 to each
+        self.assertEqual(state.totals, {1: 39 + 5, 2: -13 - 15, 3: -13 + 5, 4: -13 + 5})
+
+    def test_convert_miserie_participants(self):
+        with self.engine.begin() as connection:
+            self.insert(connection, 'game', [{'id': 1}])
+            self.insert(connection, 'player', [
+                {'id': pid, 'name': name, 'game_id': 1} for pid, name in enumerate(['Jan', 'Piet', 'Joris', 'Korneel'], 1)
+            ])
+            self.insert(connection, 'round', [
+                {'id': 1, 'game_id': 1, 'round_number': 1, 'contract_type': 'Miserie', 'result': 'Gewonnen',
+                 'dealer_id': 1},
+                {'id': 2, 'game_id': 1, 'round_number': 2, 'contract_type': 'Grote Miserie', 'result': 'Gewonnen',
+                 'dealer_id': 2},
+                {'id': 3, 'game_id': 1, 'round_number': 3, 'contract_type': 'Miserie', 'result': 'Gewonnen',
+                 'dealer_id': 3},
+                {'id': 4, 'game_id': 1, 'round_number': 4, 'contract_type': 'Solo', 'result': 'Gewonnen',
+                 'main_player_id': 4, 'dealer_id': 4},
+            ])
+            self.set_miserie_json(connection, {
+                1: '{"1": "Gewonnen", "2": "Verloren"}',
+                2: '{"3": null, "9": "Gewonnen"}',  # no result scored as lost; player 9 does not exist
+                3: '{}',
+                4: '{"1": "Gewonnen"}',  # not a Miserie round: never scored
+            })
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as connection:
+            participations = connection.execute(
+                MiserieParticipation.__table__.select().order_by('round_id', 'player_id')
+            ).all()
+            events = connection.execute(RoundEvent.__table__.select().order_by(RoundEvent.seq)).all()
+        self.assertEqual([tuple(p) for p in participations], [(1, 1, 'Gewonnen'), (1, 2, 'Verloren'), (2, 3, 'Verloren')])
+        if self.engine.dialect.server_version_info >= (3, 35, 0):
+            self.assertNotIn('miserie_participants', {c['name'] for c in inspect(self.engine).get_columns('round')})
+        # The event log, backfilled in an earlier step, already saw the converted rows
+        self.assertEqual(json.loads(events[1].payload)['round']['miserie'], {'1': 'Gewonnen', '2': 'Verloren'})
+        self.assertEqual(json.loads(events[2].payload)['round']['miserie'], {'3': 'Verloren'})
+        self.assertIsNone(json.loads(events[3].payload)['round']['miserie'])
+
+    def test_upgrade_is_idempotent(self):
+        upgrade(self.engine)
+        self.assertEqual(upgrade(self.engine), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
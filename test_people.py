@@ -0,0 +1,59 @@
+import io
+import unittest
+
+from app import create_app, db, Game
+from importer import import_games
+from models import Person, Player
+from people import player_key, suggest
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+class PeopleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_player_key(self):
+        self.assertEqual(player_key('  Jan  de  Smet '), 'jan de smet')
+        self.assertEqual(player_key('ÉLISE'), player_key('élise'))
+
+    def test_seats_link_to_one_person(self):
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Piet', 'Joris', 'Korneel']})
+        self.app.post('/game/start', data={'player_name': [' JAN', 'An', 'Bert', 'Cas']})
+        with app.app_context():
+            import_games(io.StringIO(
+                '{"game": 1, "players": ["jan", "Piet", "Joris", "Korneel"], "contract": "Solo", '
+                '"result": "Gewonnen", "main_player": "jan", "trump_suit": "harten"}\n'
+            ), 'jsonl')
+            jan = Person.query.filter_by(name_key='jan').one()
+            self.assertEqual(len(jan.seats), 3)
+            self.assertEqual(jan.name, 'jan')  # the last spelling entered
+            self.assertEqual(Person.query.count(), 7)
+            self.assertEqual(Player.query.filter(Player.person_id.is_(None)).count(), 0)
+            self.assertEqual(Game.query.join(Player).filter(Player.person_id == jan.id).count(), 3)
+
+    def test_suggest(self):
+        self.app.post('/game/start', data={'player_name': ['Jan', 'Janneke', 'Joris', 'Korneel', 'jana']})
+
+        data = self.app.get('/people/suggest?q=JAN').get_json()
+        self.assertEqual([p['name'] for p in data['people']], ['Jan', 'jana', 'Janneke'])
+        self.assertEqual(self.app.get('/people/suggest?q=x').get_json(), {'people': []})
+        self.assertEqual(self.app.get('/people/suggest?q=%20').get_json(), {'people': []})
+
+        with app.app_context():
+            self.assertEqual(len(suggest('j', limit=2)), 2)
+            plan = db.session.connection().exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM person WHERE name_key >= 'jan' AND name_key < 'jao'"
+            ).all()
+        self.assertIn('sqlite_autoindex_person_1', plan[0][-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from app import create_app, db, Game, Player, Round
+from models import MiserieParticipation
+from rescoring import load_round_columns, rescore, standings
+from scoring import score_rounds, record_from_round
+from test_scoring import DEFAULTS
+
+CONTRACTS = ['Vraag', 'Troel', 'Abondance', 'Solo', 'Miserie', 'Grote Miserie']
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+class RescoreTestCase(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _create_game(self, rng, num_players, num_rounds):
+        game = Game(is_active=False)
+        db.session.add(game)
+        db.session.flush()
+        players = [Player(name=f'P{i}', game_id=game.id) for i in range(num_players)]
+        db.session.add_all(players)
+        db.session.flush()
+        ids = [p.id for p in players]
+        for number in range(1, num_rounds + 1):
+            dealer_id = ids[(number - 1) % num_players]
+            sitter_id = dealer_id if num_players == 5 else None
+            active = [pid for pid in ids if pid != sitter_id]
+            contract = rng.choice(CONTRACTS)
+            main_id, partner_id = rng.sample(active, 2)
+            if contract == 'Vraag' and rng.random() < 0.5 or contract in ('Abondance', 'Solo'):
+                partner_id = None
+            participants = []
+            if contract in ('Miserie', 'Grote Miserie'):
+                chosen = rng.sample(active, rng.randint(1, 3))
+                participants = [
+                    MiserieParticipation(player_id=pid, result=rng.choice(['Gewonnen', 'Verloren'])) for pid in chosen
+                ]
+            db.session.add(Round(
+                game_id=game.id, round_number=number, contract_type=contract,
+                result=rng.choice(['Gewonnen', 'Verloren']), tricks=rng.randint(0, 4),
+                dealer_id=dealer_id, sitter_id=sitter_id, main_player_id=main_id,
+                partner_id=partner_id, miserie_participations=participants
+            ))
+        db.session.commit()
+        return game.id, ids
+
+    def test_matches_scalar_engine(self):
+        rng = random.Random(7)
+        configs = [DEFAULTS, SimpleNamespace(**dict(vars(DEFAULTS), solo_points=15, miserie_points=12))]
+        with app.app_context():
+            games = [self._create_game(rng, n, 40) for n in (4, 5, 4)]
+            columns = load_round_columns()
+            expected = []
+            for config in configs:
+                per_game = {}
+                for game_id, ids in games:
+                    rounds = Round.query.filter_by(game_id=game_id).order_by(Round.round_number).all()
+                    totals = {}
+                    for _, totals in score_rounds([record_from_round(r) for r in rounds], config, ids):
+                        pass
+                    per_game[game_id] = totals
+                expected.append(per_game)
+
+        result = rescore(columns, configs)
+        self.assertEqual(result.deltas.shape, (2, 120, 5))
+        for index, per_game in enumerate(expected):
+            self.assertEqual(standings(columns, result, index), per_game)
+        self.assertFalse((result.totals.sum(axis=2)).any())
+
+    def test_violations(self):
+        stricter = SimpleNamespace(**dict(vars(DEFAULTS), abondance_tricks_won_max=1))
+        with app.app_context():
+            game_id, ids = self._create_game(random.Random(1), 4, 0)
+            db.session.add(Round(
+                game_id=game_id, round_number=1, contract_type='Abondance', result='Gewonnen',
+                tricks=3, dealer_id=ids[0], main_player_id=ids[1]
+            ))
+            db.session.commit()
+            columns = load_round_columns()
+
+        result = rescore(columns, [DEFAULTS, stricter])
+        self.assertEqual(result.violations.tolist(), [[False], [True]])
+        self.assertEqual(result.final_totals[0, 0].tolist(), [-8, 24, -8, -8, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
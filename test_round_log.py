@@ -0,0 +1,158 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+import round_log
+from app import create_app, db, Game
+from benchmarks.generator import edit_session, generate_games, to_form, to_jsonl
+from importer import import_games
+from models import GameSnapshot, PlayerStanding, Round, RoundEvent
+from round_log import GameState, replay
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+def full_replay(game_id, seq=None):
+    """Replay from the first event, ignoring snapshots."""
+    state = GameState()
+    for event in RoundEvent.query.filter_by(game_id=game_id).order_by(RoundEvent.seq):
+        if seq is not None and event.seq > seq:
+            break
+        state.apply(event.seq, event.kind, json.loads(event.payload))
+    return state
+
+
+def stored_totals(game_id):
+    game = db.session.get(Game, game_id)
+    return {s.player_id: s.total for s in PlayerStanding.query.filter(
+        PlayerStanding.player_id.in_([p.id for p in game.players])
+    )}
+
+
+class RoundLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def start(self, names):
+        self.app.post('/game/start', data={'player_name': names})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            return game.id, {p.name: p.id for p in game.players}
+
+    def test_audit_trail_and_standings_as_of(self):
+        game_id, ids = self.start(['Jan', 'Piet', 'Joris', 'Korneel'])
+        table = f'/table/{game_id}'
+        for contract in ('Solo', 'Abondance', 'Solo'):
+            self.app.post(f'{table}/round/add', data={
+                'contract': contract, 'main_player': ids['Jan'], 'result': 'Gewonnen',
+                'trump_suit': 'harten', 'tricks': '0'
+            })
+        with app.app_context():
+            first, second, _ = Round.query.filter_by(game_id=game_id).order_by(Round.round_number).all()
+        before_edit = self.app.get(f'/game/{game_id}/standings').get_json()
+        self.app.post(f'{table}/round/update/{first.id}', data={
+            'contract': 'Solo', 'main_player': ids['Piet'], 'result': 'Verloren', 'trump_suit': 'ruiten', 'tricks': '0'
+        })
+        self.app.post(f'{table}/round/delete/{second.id}')
+
+        events = self.app.get(f'/game/{game_id}/events').get_json()['events']
+        self.assertEqual([e['kind'] for e in events], [
+            'config_applied', 'round_added', 'round_added', 'round_added', 'round_edited', 'round_deleted'
+        ])
+        # The original values survive the edit and the delete
+        edited = events[4]['payload']
+        self.assertEqual((edited['before']['main_player_id'], edited['before']['result']), (ids['Jan'], 'Gewonnen'))
+        self.assertEqual((edited['round']['main_player_id'], edited['round']['result']), (ids['Piet'], 'Verloren'))
+        self.assertEqual(events[5]['payload']['round']['contract'], 'Abondance')
+        self.assertEqual([e['seq'] for e in self.app.get(f'/game/{game_id}/events?after=4').get_json()['events']], [5, 6])
+
+        # As the board stood after the third round was added, before the edit
+        as_of = self.app.get(f'/game/{game_id}/standings?event=4').get_json()
+        self.assertEqual(as_of, before_edit)
+        self.assertEqual(as_of['totals'][str(ids['Jan'])], 39 + 15 + 39)
+
+        # Right after round 1 was entered; the deleted round's successor is round 2 now
+        entered = self.app.get(f'/game/{game_id}/standings?round=1').get_json()
+        self.assertEqual((entered['event'], entered['rounds']), (2, 1))
+        self.assertEqual(entered['totals'], {str(ids['Jan']): 39, str(ids['Piet']): -13,
+                                             str(ids['Joris']): -13, str(ids['Korneel']): -13})
+        self.assertEqual(self.app.get(f'/game/{game_id}/standings?round=2').get_json(), before_edit)
+
+        latest = self.app.get(f'/game/{game_id}/standings').get_json()
+        with app.app_context():
+            self.assertEqual((latest['event'], latest['rounds']), (6, 2))
+            self.assertEqual(latest['totals'], {str(pid): total for pid, total in stored_totals(game_id).items()})
+        self.assertEqual(self.app.get(f'/game/{game_id}/standings?round=3').status_code, 404)
+        self.assertEqual(self.app.get('/game/999/standings').status_code, 404)
+
+    def test_standings_of_a_round_entered_again(self):
+        game_id, ids = self.start(['Jan', 'Piet', 'Joris', 'Korneel'])
+        table = f'/table/{game_id}'
+        self.app.post(f'{table}/round/add', data={
+            'contract': 'Solo', 'main_player': ids['Jan'], 'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '0'
+        })
+        self.app.post(f'{table}/round/undo')
+        self.app.post(f'{table}/round/add', data={
+            'contract': 'Abondance', 'main_player': ids['Piet'], 'result': 'Verloren', 'trump_suit': 'ruiten',
+            'tricks': '0'
+        })
+        with app.app_context():
+            added = RoundEvent.query.filter_by(game_id=game_id, kind='round_added').order_by(RoundEvent.seq).all()
+        self.assertEqual(added[0].round_id, added[1].round_id)  # SQLite hands out the id again
+
+        entered = self.app.get(f'/game/{game_id}/standings?round=1').get_json()
+        self.assertEqual((entered['event'], entered['rounds']), (added[1].seq, 1))
+        self.assertEqual(entered['totals'], {str(ids['Jan']): 5, str(ids['Piet']): -15,
+                                             str(ids['Joris']): 5, str(ids['Korneel']): 5})
+
+    def test_snapshots_replay_like_the_full_log(self):
+        names = ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']
+        game_id, ids = self.start(names)
+        table = f'/table/{game_id}'
+        with mock.patch.object(round_log, 'SNAPSHOT_INTERVAL', 7):
+            for operation in edit_session(5, 60, names, edit_rate=0.15, delete_rate=0.1):
+                if operation[0] == 'add':
+                    self.app.post(f'{table}/round/add', data=to_form(operation[1], ids))
+                    continue
+                with app.app_context():
+                    round_id = Round.query.filter_by(game_id=game_id, round_number=operation[1]).one().id
+                if operation[0] == 'edit':
+                    self.app.post(f'{table}/round/update/{round_id}', data=to_form(operation[2], ids))
+                else:
+                    self.app.post(f'{table}/round/delete/{round_id}')
+
+        with app.app_context():
+            last_seq = RoundEvent.query.filter_by(game_id=game_id).count()
+            self.assertEqual(GameSnapshot.query.filter_by(game_id=game_id).count(), last_seq // 7)
+            for seq in range(1, last_seq + 1):
+                state, expected = replay(game_id, seq), full_replay(game_id, seq)
+                self.assertEqual((state.seq, state.rounds, state.totals),
+                                 (expected.seq, expected.rounds, expected.totals))
+
+            # The replayed state matches the scores written by the routes
+            state = replay(game_id)
+            self.assertEqual(state.totals, stored_totals(game_id))
+            self.assertEqual(state.rounds, Round.query.filter_by(game_id=game_id).count())
+            kinds = {kind for kind, in db.session.query(RoundEvent.kind).filter_by(game_id=game_id)}
+            self.assertEqual(kinds, set(round_log.KINDS))
+
+    def test_imported_games_are_logged(self):
+        with app.app_context(), mock.patch.object(round_log, 'SNAPSHOT_INTERVAL', 10):
+            games = import_games(io.StringIO(to_jsonl(generate_games(2, 2, 25))), 'jsonl')['games']
+            for game_id in games:
+                self.assertEqual(RoundEvent.query.filter_by(game_id=game_id).count(), 26)
+                self.assertEqual(GameSnapshot.query.filter_by(game_id=game_id).count(), 2)
+                self.assertEqual(replay(game_id).totals, stored_totals(game_id))
+                self.assertEqual(replay(game_id, 12).totals, full_replay(game_id, 12).totals)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+
+from scoring import RoundRecord, score_round, score_rounds, record_from_round
+
+# Same values as the ContractConfig column defaults
+DEFAULTS = SimpleNamespace(
+    vraag_partner_points=2, vraag_solo_points=2, troel_points=2, abondance_points=5,
+    solo_points=13, miserie_points=10, grote_miserie_points=20,
+    vraag_partner_tricks_won_max=5, vraag_partner_tricks_lost_max=8,
+    vraag_solo_tricks_won_max=5, vraag_solo_tricks_lost_max=8,
+    troel_tricks_won_max=5, troel_tricks_lost_max=8,
+    abondance_tricks_won_max=4, abondance_tricks_lost_max=9,
+)
+
+PLAYERS = [1, 2, 3, 4]
+
+
+class ScoreRoundTestCase(unittest.TestCase):
+    def test_vraag_with_partner(self):
+        record = RoundRecord('Vraag', 'Gewonnen', 2, main_player_id=1, partner_id=2)
+        self.assertEqual(score_round(record, DEFAULTS, PLAYERS), {1: 4, 2: 4, 3: -4, 4: -4})
+
+    def test_abondance_lost(self):
+        record = RoundRecord('Abondance', 'Verloren', 1, main_player_id=2)
+        self.assertEqual(score_round(record, DEFAULTS, PLAYERS), {1: 6, 2: -18, 3: 6, 4: 6})
+
+    def test_solo_uses_config(self):
+        config = SimpleNamespace(**dict(vars(DEFAULTS), solo_points=15))
+        record = RoundRecord('Solo', 'Gewonnen', 0, main_player_id=3)
+        self.assertEqual(score_round(record, config, PLAYERS), {1: -15, 2: -15, 3: 45, 4: -15})
+
+    def test_multi_player_miserie(self):
+        record = RoundRecord('Miserie', 'Gewonnen', miserie={1: 'Gewonnen', 2: 'Verloren'})
+        self.assertEqual(score_round(record, DEFAULTS, PLAYERS), {1: 40, 2: -40, 3: 0, 4: 0})
+
+    def test_sitter_scores_zero(self):
+        players = [1, 2, 3, 4, 5]
+        record = RoundRecord('Solo', 'Verloren', 0, main_player_id=1, sitter_id=5)
+        self.assertEqual(score_round(record, DEFAULTS, players), {1: -39, 2: 13, 3: 13, 4: 13, 5: 0})
+
+        record = RoundRecord('Grote Miserie', 'Gewonnen', sitter_id=5, miserie={2: 'Gewonnen'})
+        self.assertEqual(score_round(record, DEFAULTS, players), {1: -20, 2: 60, 3: -20, 4: -20, 5: 0})
+
+    def test_rounds_are_zero_sum(self):
+        records = [
+            RoundRecord('Vraag', 'Verloren', 3, main_player_id=4),
+            RoundRecord('Troel', 'Gewonnen', 1, main_player_id=1, partner_id=3),
+            RoundRecord('Miserie', 'Gewonnen', miserie={1: 'Verloren', 3: 'Verloren', 4: 'Gewonnen'}),
+        ]
+        for changes, totals in score_rounds(records, DEFAULTS, PLAYERS):
+            self.assertEqual(sum(changes.values()), 0)
+            self.assertEqual(sum(totals.values()), 0)
+
+    def test_record_from_round(self):
+        round_obj = SimpleNamespace(
+            contract_type='Miserie', result='Gewonnen', tricks=None, main_player_id=1,
+            partner_id=None, sitter_id=None,
+            miserie_participations=[SimpleNamespace(player_id=1, result='Gewonnen')]
+        )
+        record = record_from_round(round_obj)
+        self.assertEqual(record.miserie, {1: 'Gewonnen'})
+        self.assertEqual(record.tricks, 0)
+        # Participations loaded for many rounds at once are passed in
+        self.assertIsNone(record_from_round(round_obj, []).miserie)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+import unittest
+
+from sqlalchemy import create_engine
+
+from sqlite_config import install_pragmas, sqlite_pragmas
+
+
+class SqlitePragmaTestCase(unittest.TestCase):
+    def test_environment_overrides(self):
+        pragmas = sqlite_pragmas({'WIEZEN_SQLITE_SYNCHRONOUS': 'FULL', 'WIEZEN_SQLITE_MMAP_SIZE': ''})
+        self.assertEqual(pragmas['synchronous'], 'FULL')
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+        self.assertNotIn('mmap_size', pragmas)
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({'WIEZEN_SQLITE_CACHE_SIZE': '1; DROP TABLE game'})
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class ConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engines = []
+        self.engine = self.database('club.db')
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.dispose()
+        self.tmp.cleanup()
+
+    def database(self, name, journal_mode='WAL'):
+        engine = create_engine('sqlite:///' + os.path.join(self.tmp.name, name))
+        install_pragmas(engine, sqlite_pragmas({'WIEZEN_SQLITE_JOURNAL_MODE': journal_mode}))
+        with engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE score (id INTEGER PRIMARY KEY, points INTEGER)')
+            connection.exec_driver_sql('INSERT INTO score (points) VALUES (1)')
+        self.engines.append(engine)
+        return engine
+
+    def read_latencies(self, connection, count, pause=0.0):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            connection.exec_driver_sql('SELECT count(*), sum(points) FROM score').all()
+            connection.rollback()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(pause)
+        return latencies
+
+    def contended_read_latencies(self, engine, count):
+        """Read latencies while a writer holds an exclusive lock for 20 ms out of every 30."""
+        stop = threading.Event()
+        errors = []
+
+        def write():
+            try:
+                with engine.connect() as connection:
+                    while not stop.is_set():
+                        connection.exec_driver_sql('BEGIN EXCLUSIVE')
+                        connection.exec_driver_sql('INSERT INTO score (points) VALUES (1)')
+                        time.sleep(0.02)
+                        connection.commit()
+                        # A gap, so a waiting reader gets its turn under a rollback journal
+                        time.sleep(0.01)
+            except Exception as exc:  # surfaced in the main thread
+                errors.append(exc)
+
+        # Connected (and its pragmas run) before the writers start
+        reader = engine.connect()
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            time.sleep(0.05)
+            # Spread over the writers' turns instead of all landing in one gap
+            latencies = self.read_latencies(reader, count, pause=0.002)
+        finally:
+            reader.close()
+            stop.set()
+            writer.join()
+        self.assertEqual(errors, [])
+        return latencies
+
+    def test_pragmas_are_applied(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+            self.assertEqual(connection.exec_driver_sql('PRAGMA busy_timeout').scalar(), 5000)
+
+    def test_reads_do_not_wait_for_writers(self):
+        with self.engine.connect() as connection:
+            idle = statistics.median(self.read_latencies(connection, 200))
+        wal = self.contended_read_latencies(self.engine, 100)
+        # Control on the same machine: under a rollback journal readers wait for the writers
+        rollback = self.contended_read_latencies(self.database('rollback.db', 'DELETE'), 50)
+        self.assertGreater(percentile(rollback, 0.9), 0.005)
+
+        # Compared with the control and the idle reads, not with a fixed bound on the slowest read
+        self.assertLess(percentile(wal, 0.9), percentile(rollback, 0.9) / 10)
+        self.assertLess(statistics.median(wal), max(idle * 20, 0.002))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import io
+import unittest
+
+from app import create_app, db, Game
+from benchmarks.generator import edit_session, generate_games, to_form, to_jsonl
+from importer import import_games
+from models import Player, Round, PlayerStat, PlayerContractStat, PlayerTrumpStat
+from stats import player_stats, rebuild
+
+app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+
+def snapshot():
+    """Every non-zero aggregate row, for comparing incremental and rebuilt tables."""
+    rows = set()
+    for model, fields in ((PlayerStat, ('rounds', 'points')),
+                          (PlayerContractStat, ('played', 'won')),
+                          (PlayerTrumpStat, ('rounds',))):
+        for row in model.query:
+            values = tuple(getattr(row, field) for field in fields)
+            if any(values):
+                rows.add((model.__name__,) + tuple(
+                    getattr(row, column.name) for column in model.__table__.primary_key
+                ) + values)
+    return rows
+
+
+class StatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def start(self, names):
+        self.app.post('/game/start', data={'player_name': names})
+        with app.app_context():
+            game = Game.query.order_by(Game.id.desc()).first()
+            return game.id, {p.name: p.id for p in game.players}
+
+    def test_stats_follow_round_changes(self):
+        game_id, ids = self.start(['Jan', 'Piet', 'Joris', 'Korneel'])
+        table = f'/table/{game_id}'
+        self.app.post(f'{table}/round/add', data={
+            'contract': 'Vraag', 'main_player': ids['Jan'], 'partner_id': ids['Piet'],
+            'result': 'Gewonnen', 'trump_suit': 'harten', 'tricks': '1'
+        })
+        self.app.post(f'{table}/round/add', data={
+            'contract': 'Miserie', 'main_player': ids['Jan'], 'result': 'Gewonnen', 'tricks': '0',
+            f'miserie_play_{ids["Jan"]}': 'on', f'miserie_result_{ids["Jan"]}': 'Verloren',
+            f'miserie_play_{ids["Joris"]}': 'on', f'miserie_result_{ids["Joris"]}': 'Gewonnen',
+        })
+        # The same person at a second table, spelled differently
+        second_id, second_ids = self.start([' jan', 'An', 'Bert', 'Cas'])
+        self.app.post(f'/table/{second_id}/round/add', data={
+            'contract': 'Solo', 'main_player': second_ids[' jan'], 'result': 'Verloren',
+            'trump_suit': 'harten', 'tricks': '0'
+        })
+
+        with app.app_context():
+            jan = next(p for p in player_stats() if p['name'] == ' jan')
+            # Both seats count for the one person they link to
+            person_id = db.session.get(Player, ids['Jan']).person_id
+            self.assertEqual(db.session.get(Player, second_ids[' jan']).person_id, person_id)
+            self.assertEqual(db.session.get(PlayerStat, person_id).rounds, 3)
+        self.assertEqual(jan['rounds'], 3)
+        self.assertEqual(jan['points'], 3 - 30 - 10 - 39)
+        self.assertEqual(jan['contracts']['Vraag'], {'played': 1, 'won': 1, 'win_rate': 1.0})
+        self.assertEqual(jan['contracts']['Solo'], {'played': 1, 'won': 0, 'win_rate': 0.0})
+        self.assertEqual(jan['miserie'], {'played': 1, 'won': 0, 'success_rate': 0.0})
+        self.assertEqual((jan['favourite_trump'], jan['trumps']), ('harten', {'harten': 2}))
+
+        # Edit the Vraag into a lost Abondance, delete the Miserie, undo the Solo
+        with app.app_context():
+            first, second = Round.query.filter_by(game_id=game_id).order_by(Round.round_number).all()
+        self.app.post(f'{table}/round/update/{first.id}', data={
+            'contract': 'Abondance', 'main_player': ids['Jan'], 'result': 'Verloren',
+            'trump_suit': 'schoppen', 'tricks': '0'
+        })
+        self.app.post(f'{table}/round/delete/{second.id}')
+        self.app.post(f'/table/{second_id}/round/undo')
+
+        data = self.app.get('/stats.json').get_json()
+        jan = next(p for p in data['players'] if p['name'] == ' jan')
+        self.assertEqual((jan['rounds'], jan['points']), (1, -15))
+        self.assertEqual(list(jan['contracts']), ['Abondance'])
+        self.assertEqual(jan['miserie']['played'], 0)
+        self.assertEqual(jan['trumps'], {'schoppen': 1})
+        self.assertNotIn('An', [p['name'] for p in data['players']])
+
+        page = self.app.get('/stats')
+        self.assertEqual(page.status_code, 200)
+        self.assertIn('Abondance', page.get_data(as_text=True))
+
+    def test_incremental_matches_rebuild(self):
+        # A seeded night of adds, edits and deletes at a 5-player table, plus imported games
+        names = ['Jan', 'Piet', 'Joris', 'Korneel', 'Mieke']
+        game_id, ids = self.start(names)
+        table = f'/table/{game_id}'
+        for operation in edit_session(11, 150, names, edit_rate=0.1, delete_rate=0.05):
+            if operation[0] == 'add':
+                self.app.post(f'{table}/round/add', data=to_form(operation[1], ids))
+                continue
+            with app.app_context():
+                round_id = Round.query.filter_by(game_id=game_id, round_number=operation[1]).one().id
+            if operation[0] == 'edit':
+                self.app.post(f'{table}/round/update/{round_id}', data=to_form(operation[2], ids))
+            else:
+                self.app.post(f'{table}/round/delete/{round_id}')
+        with app.app_context():
+            import_games(io.StringIO(to_jsonl(generate_games(5, 3, 40))), 'jsonl')
+            incremental = snapshot()
+            self.assertEqual(rebuild(), 5)
+            db.session.commit()
+            self.assertEqual(snapshot(), incremental)
+
+
+if __name__ == '__main__':
+    unittest.main()